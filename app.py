@@ -4,14 +4,9 @@ Main application entry point for the Llama RAG chatbot.
 import os
 import sys
 import argparse
-import streamlit as st
 
 # Add project root to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from huggingface_hub import login
-import os
-from src.chatbot import LlamaRagChatbot
-from utils.helpers import setup_rag_pipeline, time_function
 import config
 
 def setup_cli_app():
@@ -22,6 +17,10 @@ def setup_cli_app():
                        help="Output language (default: bahasa_indonesia)")
     args = parser.parse_args()
     
+    # Heavy imports are deferred until after argument parsing, and the LLM
+    # stack is only loaded when the interactive mode actually starts
+    from utils.helpers import print_streamed_response, setup_rag_pipeline
+    
     # Set up the RAG pipeline
     success, message, vectorstore = setup_rag_pipeline()
     print(message)
@@ -34,6 +33,7 @@ def setup_cli_app():
         sys.exit(0)
     
     # Initialize the chatbot
+    from src.chatbot import LlamaRagChatbot
     chatbot = LlamaRagChatbot(vectorstore)
     
     # Set language
@@ -71,15 +71,17 @@ def setup_cli_app():
         
         # Process the query
         print(processing_msg)
-        result = time_function(chatbot.process_query)(user_input)
-        
-        # Print the response
-        print(f"{bot_prefix}{result['response']}")
+        # Print the response as it is generated
+        result = print_streamed_response(chatbot.stream_query(user_input), prefix=bot_prefix)
         print(retrieved_msg.format(n=result['num_docs_retrieved']))
 
 
 def setup_streamlit_app():
     """Set up Streamlit web application."""
+    import streamlit as st
+    from src.chatbot import LlamaRagChatbot
+    from utils.helpers import setup_rag_pipeline
+    
     st.set_page_config(
         page_title="Binky",
         page_icon="🦙",
@@ -154,18 +156,25 @@ def setup_streamlit_app():
         
         # Generate a response
         with st.chat_message("assistant"):
-            with st.spinner(processing_text):
-                result = st.session_state.chatbot.process_query(prompt)
-                response = result["response"]
+            caption = st.empty()
+            placeholder = st.empty()
+            placeholder.markdown(f"_{processing_text}_")
+            response = ""
                 
-                # Display relevant document info
-                if result["num_docs_retrieved"] > 0:
+            for event in st.session_state.chatbot.stream_query(prompt):
+                if event["event"] == "start" and event["num_docs_retrieved"] > 0:
+                    # Display relevant document info
                     if language_code == "bahasa_indonesia":
-                        st.caption(f"*Ditemukan {result['num_docs_retrieved']} dokumen yang relevan*")
+                        caption.caption(f"*Ditemukan {event['num_docs_retrieved']} dokumen yang relevan*")
                     else:
-                        st.caption(f"*Found {result['num_docs_retrieved']} relevant documents*")
+                        caption.caption(f"*Found {event['num_docs_retrieved']} relevant documents*")
+                elif event["event"] == "token":
+                    response += event["text"]
+                    placeholder.markdown(response + "▌")
+                elif event["event"] == "end":
+                    response = event["response"]
                 
-                st.markdown(response)
+            placeholder.markdown(response)
         
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -1,13 +1,24 @@
 import sys
 import os
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from utils.helpers import setup_rag_pipeline
+from utils.helpers import process_memory, setup_rag_pipeline
 from src.chatbot import LlamaRagChatbot
+from src.embedding import get_embedding_model
+from src.executor import RagStages
+from src.model_pool import DeadlineExceeded, ModelPool, ModelPoolBusy
+from src.options import QueryOptions
+from src.warmup import prefetch_files, startup_paths
 import config
 
 app = FastAPI(title="Binky RAG Chatbot API")
@@ -21,10 +32,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Settings shared by the request formats
+class OptionsRequest(BaseModel):
+    language: str = "bahasa_indonesia"
+    # Chat session whose history the queries are added to
+    session_id: Optional[str] = None
+    # Per-request retrieval and generation settings, from config when not given;
+    # answers can be made shorter but not longer than MAX_NEW_TOKENS
+    top_k: Optional[int] = Field(None, ge=1, le=20)
+    temperature: Optional[float] = Field(None, ge=0.0, le=2.0)
+    top_p: Optional[float] = Field(None, gt=0.0, le=1.0)
+    max_new_tokens: Optional[int] = Field(None, ge=1, le=config.MAX_NEW_TOKENS)
+
 # Request format
-class QueryRequest(BaseModel):
+class QueryRequest(OptionsRequest):
     query: str
-    language: str = "bahasa_indonesia"
+    # Seconds the client is willing to wait for generation to start
+    deadline_seconds: Optional[float] = None
+
+# Batch request format
+class BatchRequest(OptionsRequest):
+    queries: List[str] = Field(..., min_length=1, max_length=config.MAX_BATCH_QUERIES)
 
 # Response format
 class ChatResponse(BaseModel):
@@ -32,29 +60,268 @@ class ChatResponse(BaseModel):
     num_docs_retrieved: int
     has_relevant_context: bool
 
-# Global chatbot instance
+# Retrieval-only request format
+class RetrieveRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = Field(None, ge=1, le=50)
+
+# A retrieved chunk with its score and source metadata
+class RetrievedChunk(BaseModel):
+    content: str
+    score: float
+    metadata: dict
+
+# Retrieval-only response format; scores are distances for the "l2" metric
+class RetrieveResponse(BaseModel):
+    query: str
+    metric: str
+    results: List[RetrievedChunk]
+    embed_ms: float
+    search_ms: float
+
+# Global chatbot instance and its awaitable stages, set once startup has finished
 chatbot: LlamaRagChatbot = None
+stages: RagStages = None
+
+# Startup steps reported by /ready, in order
+startup_steps = {
+    name: {"ready": False, "seconds": None}
+    for name in ("prefetch", "index", "embedding", "model", "warmup")
+}
+startup_error: Optional[str] = None
+# Index of this worker process when served by backend/prefork.py
+worker_id: Optional[int] = None
 
 @app.on_event("startup")
 def startup_event():
-    global chatbot
-    print("[INIT] Setting up RAG pipeline...")
-    success, message, vectorstore = setup_rag_pipeline()
-    if not success:
-        raise RuntimeError(f"[ERROR] {message}")
-    chatbot = LlamaRagChatbot(vectorstore)
-    chatbot.set_language(config.OUTPUT_LANGUAGE)
-    print("[READY] Chatbot initialized.")
+    # Prefork workers are forked with the chatbot already loaded
+    if chatbot is not None:
+        return
+    # Loading runs in the background, so /live answers while the models load
+    threading.Thread(target=_load_chatbot, name="startup", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if stages is not None:
+        stages.shutdown()
+
+@contextmanager
+def _startup_step(name: str):
+    """Time a startup step and mark it ready when it finishes."""
+    start_time = time.time()
+    yield startup_steps[name]
+    startup_steps[name]["seconds"] = round(time.time() - start_time, 3)
+    startup_steps[name]["ready"] = True
+
+def _load_chatbot(background_save: bool = True):
+    """
+    Load the index, embedding model and model replicas, then warm them up.
+    
+    Args:
+        background_save: Save an incrementally updated index in a background thread
+    """
+    global chatbot, stages, startup_error
+    try:
+        with _startup_step("prefetch") as step:
+            if config.PREFETCH_FILES:
+                step.update(prefetch_files(startup_paths(), lock=config.MLOCK_FILES))
+        
+        print("[INIT] Setting up RAG pipeline...")
+        with _startup_step("index"):
+            success, message, vectorstore = setup_rag_pipeline(background_save)
+            if not success:
+                raise RuntimeError(message)
+        
+        # The embedding model is loaded lazily, so load it before the first query
+        with _startup_step("embedding") as step:
+            embedding_model = get_embedding_model()
+            embedding_model.embed_query("Halo")
+            step["load_time_s"] = embedding_model.load_time
+        
+        # Concurrent requests are spread over the replicas of the pool
+        with _startup_step("model"):
+            loaded = LlamaRagChatbot(vectorstore, llm=ModelPool())
+            loaded.set_language(config.OUTPUT_LANGUAGE)
+        
+        with _startup_step("warmup"):
+            if config.WARMUP_GENERATION:
+                loaded.llm.warmup()
+        
+        stages = RagStages(loaded)
+        chatbot = loaded
+        print("[READY] Chatbot initialized.")
+    except Exception as e:
+        startup_error = str(e)
+        print(f"[ERROR] Startup failed: {e}")
+
+def _require_chatbot():
+    """Reject requests with 503 until startup has finished."""
+    if chatbot is None:
+        raise HTTPException(status_code=503, detail=startup_error or "Chatbot is starting",
+                            headers={"Retry-After": "5"})
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: QueryRequest):
-    chatbot.set_language(req.language)
-    result = chatbot.process_query(req.query)
+    # Retrieval and generation run in the stage executors, never on the event loop
+    _require_chatbot()
+    deadline = _deadline(req)
+    try:
+        prepared = await stages.retrieve(req.query, _options(req), req.session_id)
+        result = await stages.generate(prepared, deadline=deadline)
+    except ModelPoolBusy as e:
+        raise _busy_error(e)
     return ChatResponse(
         response=result["response"],
+        num_docs_retrieved=result["num_docs_retrieved"],
         has_relevant_context=result["has_relevant_context"]
     )
 
+def _options(req: OptionsRequest) -> QueryOptions:
+    """Settings of a request; nothing is written to the shared config."""
+    return QueryOptions(language=req.language, top_k=req.top_k, temperature=req.temperature,
+                        top_p=req.top_p, max_new_tokens=req.max_new_tokens)
+
+def _deadline(req: QueryRequest) -> Optional[float]:
+    """Absolute deadline of a request, or None for the lane's default."""
+    if req.deadline_seconds is None:
+        return None
+    return time.monotonic() + req.deadline_seconds
+
+def _busy_error(e: ModelPoolBusy) -> HTTPException:
+    """429 when a queue is full, 503 when the deadline passed while queued."""
+    status_code = 503 if isinstance(e, DeadlineExceeded) else 429
+    return HTTPException(status_code=status_code, detail=str(e),
+                         headers={"Retry-After": str(e.retry_after)})
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _stream_events(prepared: dict, deadline: Optional[float]):
+    """Translate chatbot stream events into server-sent events."""
+    try:
+        async for event in _chatbot_events(prepared, deadline):
+            yield event
+    except ModelPoolBusy as e:
+        # The response has started, so the error is reported as an event
+        yield _sse("error", {"message": str(e), "retry_after": e.retry_after})
+
+async def _chatbot_events(prepared: dict, deadline: Optional[float]):
+    """Format the events of one chatbot stream."""
+    yield _sse("start", {
+        "num_docs_retrieved": prepared["num_docs_retrieved"],
+        "has_relevant_context": prepared["has_relevant_context"],
+    })
+    async for event in stages.stream(prepared, deadline=deadline):
+        if event["event"] == "token":
+            yield _sse("token", {"text": event["text"]})
+        else:
+            yield _sse("end", {
+                "response": event["response"],
+                "num_docs_retrieved": event["num_docs_retrieved"],
+                "has_relevant_context": event["has_relevant_context"],
+            })
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: QueryRequest):
+    """
+    Stream the answer as server-sent events: "start" after retrieval, one
+    "token" event per generated text piece and "end" with the full response,
+    or "error" if no model replica is available.
+    """
+    _require_chatbot()
+    deadline = _deadline(req)
+    try:
+        prepared = await stages.retrieve(req.query, _options(req), req.session_id)
+        chatbot.llm.check_admission()
+    except ModelPoolBusy as e:
+        raise _busy_error(e)
+    return StreamingResponse(
+        _stream_events(prepared, deadline),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _batch_lines(queries: List[str], prepared: List[dict]):
+    """Format each batch result as one JSON line, in the order they finish."""
+    async for index, result in stages.generate_batch(prepared):
+        if isinstance(result, ModelPoolBusy):
+            line = {"index": index, "query": queries[index], "error": str(result)}
+        else:
+            line = {
+                "index": index,
+                "query": queries[index],
+                "response": result["response"],
+                "num_docs_retrieved": result["num_docs_retrieved"],
+                "has_relevant_context": result["has_relevant_context"],
+            }
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(req: BatchRequest):
+    """
+    Answer a batch of queries as newline-delimited JSON, one line per query
+    as soon as its answer is ready, each with the "index" of its query.
+    
+    All queries are embedded in one batch and searched with one index call;
+    answers are generated on every model replica in parallel.
+    """
+    _require_chatbot()
+    try:
+        prepared = await stages.retrieve_batch(req.queries, _options(req), req.session_id)
+    except ModelPoolBusy as e:
+        raise _busy_error(e)
+    return StreamingResponse(_batch_lines(req.queries, prepared), media_type="application/x-ndjson")
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve_endpoint(req: RetrieveRequest):
+    """
+    Return the top-k chunks for a query with their scores, source metadata and
+    the embedding and search times, without generating an answer.
+    """
+    _require_chatbot()
+    try:
+        result = await stages.search(req.query, req.top_k)
+    except ModelPoolBusy as e:
+        raise _busy_error(e)
+    return RetrieveResponse(
+        query=req.query,
+        metric=result["metric"],
+        results=[RetrievedChunk(content=doc.page_content, score=score, metadata=doc.metadata)
+                 for doc, score in result["results"]],
+        embed_ms=round(result["embed_ms"], 3),
+        search_ms=round(result["search_ms"], 3),
+    )
+
+@app.get("/live")
+def liveness_check():
+    """The process is serving; fails only if startup failed, so the container is restarted."""
+    if startup_error:
+        raise HTTPException(status_code=500, detail=startup_error)
+    return {"status": "alive"}
+
+@app.get("/ready")
+def readiness_check():
+    """
+    Report readiness of each startup step with its timing. Returns 503 until
+    the index, embedding model and warm model replicas are all loaded, so
+    traffic is only routed to replicas that can answer right away.
+    """
+    ready = chatbot is not None
+    body = {
+        "status": "ready" if ready else ("failed" if startup_error else "starting"),
+        "steps": startup_steps,
+        "error": startup_error,
+    }
+    return body if ready else JSONResponse(status_code=503, content=body)
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {
+        "status": "ok" if chatbot else "starting",
+        "model_pool": chatbot.llm.stats() if chatbot else None,
+        "response_cache": chatbot.response_cache.stats() if chatbot and chatbot.response_cache else None,
+        "executor": stages.stats() if stages else None,
+        "worker": worker_id,
+        "memory": process_memory(),
+    }
\ No newline at end of file
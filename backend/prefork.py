@@ -0,0 +1,207 @@
+"""
+Prefork server: loads the index, embedding model and model replicas once, then
+forks worker processes that serve the API on one shared socket.
+
+The GGUF weights and the vectors of the saved FAISS index (FAISS_MMAP), also
+after an incremental update, are read-only file mappings, so every worker uses the same pages of the page
+cache. The embedding model, the HNSW graph or IVF centroids, an index that
+was just built and the rest of the loaded state are shared copy-on-write,
+and only what a worker writes, such as its model's KV cache, becomes private
+to it.
+
+Usage:
+    python backend/prefork.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+import backend.main as api
+from utils.helpers import process_memory
+import config
+
+
+def _set_torch_threads(threads: int):
+    """Set the threads of the embedding model's CPU operations."""
+    import torch
+    torch.set_num_threads(threads)
+
+
+def load_shared_state(workers: int):
+    """
+    Load everything the workers share, before any of them is forked.
+    
+    The CPU is split between the workers: each model replica gets its share
+    of the cores. The embedding model runs on one thread until the workers
+    are forked, since an OpenMP thread pool started before fork() can hang
+    the children. For the same reason an updated index is saved before this
+    returns rather than by a background thread.
+    
+    Args:
+        workers: Number of worker processes that will be forked
+    """
+    config.MODEL_REPLICA_THREADS = max(1, config.CPU_CORES // (workers * config.MODEL_REPLICAS))
+    print(f"[PREFORK] {workers} workers x {config.MODEL_REPLICAS} replicas "
+          f"with {config.MODEL_REPLICA_THREADS} threads each")
+    _set_torch_threads(1)
+    
+    api._load_chatbot(background_save=False)
+    if api.chatbot is None:
+        raise SystemExit(f"[PREFORK] Startup failed: {api.startup_error}")
+    
+    # Objects loaded so far are never collected, so the garbage collector does
+    # not touch, and thereby copy, their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Open the listening socket the workers accept connections on."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, sock: socket.socket, threads: int, log_level: str):
+    """Serve the API in a forked worker until it is told to stop."""
+    api.worker_id = index
+    _set_torch_threads(threads)
+    if api.chatbot.response_cache is not None:
+        api.chatbot.response_cache.after_fork()
+    
+    server = uvicorn.Server(uvicorn.Config(api.app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def _check_single_threaded():
+    """
+    Refuse to fork while other threads run.
+    
+    Only the forking thread exists in the child, so a lock another thread
+    holds, e.g. of stdout or a faiss write, would stay locked in the worker.
+    
+    Raises:
+        RuntimeError: If another thread is alive
+    """
+    others = [thread.name for thread in threading.enumerate() if thread is not threading.current_thread()]
+    if others:
+        raise RuntimeError(f"Cannot fork workers while other threads run: {', '.join(others)}")
+
+
+def spawn_worker(index: int, sock: socket.socket, threads: int, log_level: str) -> int:
+    """Fork a worker process and return its PID."""
+    _check_single_threaded()
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run_worker(index, sock, threads, log_level)
+        except BaseException as e:
+            print(f"[WORKER {index}] Stopped with error: {e}")
+            status = 1
+        finally:
+            os._exit(status)
+    print(f"[PREFORK] Worker {index} started with PID {pid}")
+    return pid
+
+
+def report_memory(workers: Dict[int, int]):
+    """Print the memory of the master and every worker, with the total PSS."""
+    rows = [("master", process_memory())]
+    for pid, index in sorted(workers.items(), key=lambda item: item[1]):
+        try:
+            rows.append((f"worker {index}", process_memory(pid)))
+        except Exception:
+            continue
+    
+    print("[PREFORK] Memory (MB):")
+    for name, memory in rows:
+        print(f"  {name:9s} pid={memory['pid']:<7d} rss={memory['rss_mb']:8.1f}  "
+              f"pss={memory['pss_mb'] or 0:8.1f}  uss={memory['uss_mb'] or 0:8.1f}")
+    total_pss = sum(memory["pss_mb"] or 0 for _, memory in rows)
+    print(f"  total pss={total_pss:.1f}")
+
+
+def serve(workers: int, host: str, port: int, log_level: str):
+    """
+    Load the shared state, fork the workers and restart any that exit.
+    
+    Args:
+        workers: Number of worker processes
+        host: Address to listen on
+        port: Port to listen on
+        log_level: uvicorn log level of the workers
+    """
+    load_shared_state(workers)
+    sock = bind_socket(host, port)
+    threads = max(1, config.CPU_CORES // workers)
+    
+    running: Dict[int, int] = {}
+    for index in range(workers):
+        running[spawn_worker(index, sock, threads, log_level)] = index
+    print(f"[PREFORK] Serving on http://{host}:{port}")
+    
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    last_report = time.monotonic()
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid and pid in running:
+            index = running.pop(pid)
+            print(f"[PREFORK] Worker {index} (PID {pid}) exited with status {status}, restarting")
+            # A worker that fails on every start is not restarted in a tight loop
+            time.sleep(1)
+            if not stopping:
+                running[spawn_worker(index, sock, threads, log_level)] = index
+            continue
+        
+        interval = config.PREFORK_MEMORY_REPORT_SECONDS
+        if interval and time.monotonic() - last_report >= interval:
+            report_memory(running)
+            last_report = time.monotonic()
+        time.sleep(0.5)
+    
+    print("[PREFORK] Stopping workers...")
+    for pid in running:
+        os.kill(pid, signal.SIGTERM)
+    for pid in running:
+        os.waitpid(pid, 0)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from worker processes sharing one loaded model")
+    parser.add_argument("--workers", type=int, default=config.PREFORK_WORKERS, help="Number of worker processes")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level of the workers")
+    args = parser.parse_args()
+    
+    serve(args.workers, args.host, args.port, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,14 @@ import argparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.chatbot import LlamaRagChatbot
-from utils.helpers import setup_rag_pipeline, time_function
 import config
 
 def run_cli_chatbot(language: str):
     """Run the chatbot in CLI interactive mode."""
+    # The RAG stack is imported here so that --help starts instantly
+    from src.chatbot import LlamaRagChatbot
+    from utils.helpers import print_streamed_response, setup_rag_pipeline
+    
     # Setup pipeline
     success, message, vectorstore = setup_rag_pipeline()
     print(f"\n[INFO] {message}")
@@ -32,8 +34,7 @@ def run_cli_chatbot(language: str):
             if not user_input:
                 continue
             print("\n⏳ Memproses pertanyaan Anda...")
-            result = time_function(chatbot.process_query)(user_input)
-            print("\n🦙 Binky:", result["response"])
+            result = print_streamed_response(chatbot.stream_query(user_input), prefix="\n🦙 Binky: ")
             print(f"📄 ({result['num_docs_retrieved']} dokumen relevan ditemukan)")
             print("\n---")
         except KeyboardInterrupt:
@@ -3,23 +3,111 @@ Configuration settings for the Llama RAG chatbot.
 """
 import os
 from dotenv import load_dotenv
-import torch
 import platform
 import glob
+from typing import Optional
 
 load_dotenv()
 
+
+def cuda_available() -> bool:
+    """
+    Check for a usable CUDA device through the driver library, without importing torch.
+    
+    Returns:
+        True if the CUDA driver loads and reports at least one device
+    """
+    import ctypes
+    import ctypes.util
+    
+    names = ["libcuda.so.1", "libcuda.dylib", "nvcuda.dll"]
+    found = ctypes.util.find_library("cuda")
+    if found:
+        names.append(found)
+    
+    for name in names:
+        try:
+            driver = ctypes.CDLL(name)
+        except OSError:
+            continue
+        count = ctypes.c_int(0)
+        if driver.cuInit(0) == 0 and driver.cuDeviceGetCount(ctypes.byref(count)) == 0:
+            return count.value > 0
+    return False
+
+
+def machine_fingerprint() -> dict:
+    """
+    Describe the CPU an autotune profile was measured on.
+    
+    Returns:
+        Dictionary with core count, architecture, CPU model and L3 cache size
+    """
+    import multiprocessing
+    
+    model_name = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo", "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model_name = line.split(":", 1)[1].strip()
+                    break
+    
+    l3_cache = None
+    cache_path = "/sys/devices/system/cpu/cpu0/cache/index3/size"
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            l3_cache = f.read().strip()
+    
+    return {
+        "cpu_cores": multiprocessing.cpu_count(),
+        "machine": platform.machine(),
+        "cpu_model": model_name,
+        "l3_cache": l3_cache,
+    }
+
+
+def load_autotune_profile(path: str) -> Optional[dict]:
+    """
+    Read an autotune profile if it was measured on this machine.
+    
+    Args:
+        path: Profile written by utils/autotune.py
+        
+    Returns:
+        Profile dictionary, or None if missing, unreadable or from another machine
+    """
+    import json
+    
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Tidak dapat membaca autotune profile {path}: {e}")
+        return None
+    
+    if profile.get("machine") != machine_fingerprint():
+        print(f"[INFO] Autotune profile {path} dibuat di mesin lain, diabaikan")
+        return None
+    if not os.path.exists(profile.get("model_path", "")):
+        print(f"[INFO] Model dari autotune profile tidak ditemukan: {profile.get('model_path')}")
+        return None
+    return profile
+
+
 # Pilihan untuk menggunakan GPU atau CPU
 USE_GPU = False  # Ubah ke True jika ingin menggunakan GPU
 
-if USE_GPU and torch.cuda.is_available():
+if USE_GPU and cuda_available():
     DEVICE = "cuda:0"
     GPU_LAYERS = 32  # Jumlah layer yang dijalankan di GPU
     print(f"[INFO] Model akan dijalankan di: {DEVICE}")
 else:
     DEVICE = "cpu"
     GPU_LAYERS = 0  # Tidak ada layer yang dijalankan di GPU
-    if USE_GPU and not torch.cuda.is_available():
+    if USE_GPU:
         print("[WARNING] CUDA tidak tersedia, menggunakan CPU sebagai fallback")
     print(f"[INFO] Model akan dijalankan di: {DEVICE}")
 
@@ -27,6 +115,25 @@ else:
 MODEL_ID = "TheBloke/Llama-2-7B-Chat-GGUF"  # GGML model
 MODEL_FILE = "llama-2-7b-chat.Q4_K_M.gguf"  
 EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+# Tokenizer with the Llama 2 vocabulary, used to store each chunk's token count
+# at index time so prompts can be packed without loading the model. Download it
+# with the model on hosts without internet access (see README), otherwise token
+# counts are estimated from the text length
+TOKENIZER_ID = "hf-internal-testing/llama-tokenizer"
+
+# Generation backend: "ctransformers", or "llama_cpp" (pip install llama-cpp-python),
+# which is required for speculative decoding
+LLM_BACKEND = "ctransformers"
+# Speculative decoding with the llama_cpp backend: draft tokens are proposed by
+# n-gram lookup in the prompt ("prompt_lookup", cheap for answers that copy from
+# the retrieved context) or by a small GGUF model with the Llama 2 vocabulary
+# ("draft_model"), and the main model verifies them in one forward pass without
+# changing what it would generate. Compare with evaluate/benchmark_speculative.py
+SPECULATIVE_DECODING = "off"
+SPECULATIVE_NUM_PRED_TOKENS = 8  # Draft tokens verified per forward pass
+SPECULATIVE_MAX_NGRAM = 3  # Longest n-gram matched by prompt lookup
+DRAFT_MODEL_ID = "TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF"
+DRAFT_MODEL_FILE = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
 
 # Data paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Binky/data")
@@ -40,6 +147,56 @@ SOP_PATH = os.path.join(DATA_DIR, "sop.txt")
 
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index")
 
+# Vector index type: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw" (approximate).
+# Approximate indexes are trained automatically on build; nprobe/efSearch trade
+# recall for speed at query time. Compare them with evaluate/benchmark_index.py
+FAISS_INDEX_TYPE = "flat"
+FAISS_IVF_NLIST = 0  # 0 = about 4 * sqrt(number of chunks)
+FAISS_PQ_M = 16  # Sub-quantizers, must divide the embedding dimension (384)
+FAISS_PQ_NBITS = 8
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 80
+FAISS_NPROBE = 8
+FAISS_EF_SEARCH = 64
+# Memory-map the index vectors (the inverted lists of IVF indexes) read-only when
+# serving, so the page cache holds one copy shared by every process that loads
+# the index instead of one copy per process
+FAISS_MMAP = True
+
+# Re-embed only the chunks of changed sources when the index is stale
+INCREMENTAL_INDEXING = True
+
+# On-disk embedding cache keyed by embedding model and chunk text hash
+USE_EMBEDDING_CACHE = True
+EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+
+
+# Shelf-location questions are answered from a catalogue index of buku.json,
+# without vector search or generation. The export's column labels are shifted:
+# the title is stored under "pengarang", the author under "penerbit" and the
+# publisher and year under "judul"
+USE_CATALOGUE_LOOKUP = True
+CATALOGUE_SOURCE_FIELDS = {
+    "title": "pengarang",
+    "author": "penerbit",
+    "publisher": "judul",
+    "shelf": "lokasi rak",
+}
+CATALOGUE_MIN_SIMILARITY = 0.6  # Dice similarity of title trigrams for fuzzy matches
+CATALOGUE_MAX_RESULTS = 10
+
+# Answers to repeated questions are served from a response cache: first by the
+# normalized query text, then by query embedding similarity among answers
+# generated from the same retrieved chunks in the same language. Entries expire
+# after the TTL, the least recently used are evicted, and a changed index
+# manifest clears the cache. Persisted in SQLite across restarts if enabled
+USE_RESPONSE_CACHE = True
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # Seconds
+RESPONSE_CACHE_SIMILARITY = 0.92  # Minimum cosine similarity of query embeddings
+RESPONSE_CACHE_PERSIST = False
+RESPONSE_CACHE_PATH = os.path.join(DATA_DIR, "response_cache.sqlite3")
+
 
 # Chunking settings
 CHUNK_SIZE = 500
@@ -49,11 +206,67 @@ TOP_K_RESULTS = 2
 
 # Language setting - Bahasa Indonesia
 OUTPUT_LANGUAGE = "bahasa_indonesia"
+# Words of a Bahasa Indonesia answer checked for English before the answer is
+# shown; an English start is aborted and regenerated with a language reminder
+LANGUAGE_CHECK_WORDS = 8
+# Chat histories kept per session ID; the least recently used beyond this are dropped
+MAX_CHAT_SESSIONS = 1000
 
 import multiprocessing
 CPU_CORES = multiprocessing.cpu_count()
 THREADS = min(CPU_CORES, 8)  # Maksimal 8 threads, atau sesuai jumlah core CPU
 
+# Model quantization and thread count measured on this machine by
+# python utils/autotune.py; they replace MODEL_FILE and THREADS. A profile
+# measured on a different CPU is ignored
+USE_AUTOTUNE_PROFILE = True
+AUTOTUNE_PROFILE_PATH = os.getenv(
+    "BINKY_AUTOTUNE_PROFILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "binky", "autotune_profile.json"),
+)
+AUTOTUNE_PROFILE = load_autotune_profile(AUTOTUNE_PROFILE_PATH) if USE_AUTOTUNE_PROFILE else None
+if AUTOTUNE_PROFILE:
+    MODEL_FILE = AUTOTUNE_PROFILE["model_file"]
+    THREADS = AUTOTUNE_PROFILE["threads"]
+    print(f"[INFO] Autotune profile: {MODEL_FILE} dengan {THREADS} threads")
+
+# Model replicas served by the API. Each replica generates one answer at a time
+# with its own threads; the weights are memory-mapped, so replicas mostly share
+# them. Requests beyond the idle replicas wait in a bounded queue
+MODEL_REPLICAS = 1
+MODEL_REPLICA_THREADS = THREADS if MODEL_REPLICAS == 1 else max(1, CPU_CORES // MODEL_REPLICAS)
+MODEL_QUEUE_SIZE = 32  # Waiting requests beyond this are rejected with HTTP 429
+# Waiting requests are served from lanes in weighted round robin: answers from
+# library documents ("short") before paper summaries ("long"), three to one
+SCHEDULER_LANE_WEIGHTS = {"short": 3, "long": 1}
+# Seconds a request may wait for a replica; requests that cannot get one in
+# time are rejected up front or dropped when the deadline passes
+REQUEST_DEADLINE = {"short": 30, "long": 90}
+
+# Blocking RAG work runs in bounded thread pools off the API event loop, so health
+# checks answer during generation. Retrieval covers embedding, FAISS search and
+# prompt building; generation threads mostly wait for a replica, so there is one
+# per replica and queue slot and the pool's lanes still decide the order
+RETRIEVAL_WORKERS = min(4, CPU_CORES)
+RETRIEVAL_QUEUE_SIZE = 64  # Requests waiting for retrieval beyond this are rejected with HTTP 429
+GENERATION_WORKERS = MODEL_REPLICAS + MODEL_QUEUE_SIZE
+# Maximum number of queries in one /chat/batch request
+MAX_BATCH_QUERIES = 500
+
+# Prefork serving (backend/prefork.py): the index, embedding model and model
+# replicas are loaded once, then worker processes are forked and share them
+# copy-on-write; the GGUF weights and the index are file mappings shared anyway
+PREFORK_WORKERS = 2
+PREFORK_MEMORY_REPORT_SECONDS = 60  # Interval of the per-worker memory report, 0 = off
+
+# Index build settings: texts per embedding forward pass and CPU worker processes
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_WORKERS = CPU_CORES
+# Chunks embedded and written per step of a streaming index build, and vectors
+# buffered to train approximate (IVF) index types
+INDEX_BUILD_BATCH_SIZE = 8192
+FAISS_TRAIN_SIZE = 65536
+
 # Prompt engineering settings - Optimized for CPU
 if DEVICE == "cpu":
     TEMPERATURE = 0.2
@@ -70,10 +283,26 @@ else:
     MAX_NEW_TOKENS = 512
     MAX_INPUT_TOKENS = 2048
 
+# Generation parameters logged with each evaluation run
+MODEL_CONFIG = {
+    "TEMPERATURE": TEMPERATURE,
+    "TOP_P": TOP_P,
+    "TOP_K": TOP_K,
+    "REPETITION_PENALTY": REPETITION_PENALTY,
+    "MAX_NEW_TOKENS": MAX_NEW_TOKENS,
+    "MAX_INPUT_TOKENS": MAX_INPUT_TOKENS,
+}
+
 if platform.system() == "Windows":
     MODEL_PATH = os.path.join(os.getenv("USERPROFILE"), ".cache", "huggingface", "hub", MODEL_ID, MODEL_FILE)
+    DRAFT_MODEL_PATH = os.path.join(os.getenv("USERPROFILE"), ".cache", "huggingface", "hub", DRAFT_MODEL_ID, DRAFT_MODEL_FILE)
 else:  # Linux/Mac
     MODEL_PATH = os.path.join(os.getenv("HOME"), ".cache", "huggingface", "hub", MODEL_ID, MODEL_FILE)
+    DRAFT_MODEL_PATH = os.path.join(os.getenv("HOME"), ".cache", "huggingface", "hub", DRAFT_MODEL_ID, DRAFT_MODEL_FILE)
+
+# The tuned file may live in the Hugging Face cache rather than MODEL_PATH's directory
+if AUTOTUNE_PROFILE:
+    MODEL_PATH = AUTOTUNE_PROFILE["model_path"]
 
 # Prompt templates in Bahasa Indonesia
 SYSTEM_PROMPT_INDONESIA = """Anda adalah asisten AI yang membantu menjawab pertanyaan berdasarkan konteks yang diberikan.
@@ -101,6 +330,22 @@ Answer:"""
 
 # Use Indonesian prompt by default
 SYSTEM_PROMPT = SYSTEM_PROMPT_INDONESIA
+# Prompt template of each supported output language
+SYSTEM_PROMPTS = {"bahasa_indonesia": SYSTEM_PROMPT_INDONESIA, "english": SYSTEM_PROMPT_ENGLISH}
+
+# Keep the evaluated instruction text before {context} in the model's context
+# between requests, so only the retrieved context and question are evaluated.
+# Compare prefill times with evaluate/benchmark_prefix_cache.py
+USE_PROMPT_PREFIX_CACHE = True
+
+# API startup: read the model and index files into the page cache before
+# serving, optionally pinning them in RAM with mlock (needs RLIMIT_MEMLOCK at
+# least the model size, e.g. ulimit -l unlimited), then generate a few tokens
+# on every replica. /ready reports ready only after these steps
+PREFETCH_FILES = True
+MLOCK_FILES = False
+WARMUP_GENERATION = True
+WARMUP_TOKENS = 8
 
 # Default answers when information is not found 
 DEFAULT_NO_INFO_ANSWERS = [
@@ -0,0 +1,178 @@
+"""
+Benchmark of the FAISS index types: recall@k against the flat index,
+p50/p99 search latency and index memory.
+
+Usage:
+    python evaluate/benchmark_index.py --scale 100 --k 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# Tambahkan path ke root project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import config
+from src.embedding_cache import EmbeddingCache
+from src.indexing import FAISS_INDEX_FILE
+from src.vector_index import INDEX_TYPES, apply_search_params, build_faiss_index, index_memory_bytes
+
+
+def load_corpus_vectors() -> np.ndarray:
+    """
+    Load the embedded corpus, from the persisted index or the embedding cache.
+    
+    Returns:
+        float32 array of shape (n, dim)
+    """
+    index_path = os.path.join(config.FAISS_INDEX_PATH, FAISS_INDEX_FILE)
+    if os.path.exists(index_path):
+        index = faiss.read_index(index_path)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        try:
+            return index.reconstruct_n(0, index.ntotal)
+        except RuntimeError:
+            pass
+    
+    cache = EmbeddingCache()
+    if len(cache) == 0:
+        raise RuntimeError("No persisted index or embedding cache found, build the index first")
+    return np.array(cache.all_vectors())
+
+
+def scale_corpus(vectors: np.ndarray, scale: int, seed: int = 0) -> np.ndarray:
+    """
+    Simulate a larger catalogue by adding jittered copies of the real vectors.
+    
+    Args:
+        vectors: Real corpus vectors
+        scale: Target size as a multiple of the real corpus
+        seed: Random seed
+    
+    Returns:
+        float32 array with scale * n rows
+    """
+    if scale <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    noise_scale = float(vectors.std()) * 0.3
+    num_vectors = len(vectors)
+    scaled = np.empty((num_vectors * scale, vectors.shape[1]), dtype=np.float32)
+    scaled[:num_vectors] = vectors
+    for copy in range(1, scale):
+        noise = rng.normal(0, noise_scale, vectors.shape).astype(np.float32)
+        scaled[copy * num_vectors:(copy + 1) * num_vectors] = vectors + noise
+    return scaled
+
+
+def make_queries(vectors: np.ndarray, num_queries: int, seed: int = 1) -> np.ndarray:
+    """Sample perturbed corpus vectors as stand-ins for user queries."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    noise = rng.normal(0, float(vectors.std()) * 0.5, (len(picks), vectors.shape[1]))
+    return np.ascontiguousarray(vectors[picks] + noise, dtype=np.float32)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    """
+    Search one query at a time, as the chatbot does, and score the results.
+    
+    Returns:
+        Dictionary with recall@k and p50/p99 latency in milliseconds
+    """
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, labels = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(labels[0]) & set(truth[i]))
+    
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_benchmark(scale: int, k: int, num_queries: int, index_types: List[str],
+                  nprobes: List[int], ef_searches: List[int]) -> List[Dict]:
+    """Build every index type and sweep its query-time parameter."""
+    faiss.omp_set_num_threads(config.THREADS)
+    
+    vectors = scale_corpus(load_corpus_vectors(), scale)
+    queries = make_queries(vectors, num_queries)
+    print(f"Corpus: {vectors.shape[0]} vectors of dim {vectors.shape[1]}, "
+          f"{len(queries)} queries, k={k}")
+    
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+    
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, index_type)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        memory_mb = index_memory_bytes(index) / 1e6
+        
+        if faiss.try_extract_index_ivf(index) is not None:
+            sweep = [("nprobe", value) for value in nprobes]
+        elif isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+            sweep = [("efSearch", value) for value in ef_searches]
+        else:
+            sweep = [("-", None)]
+        
+        for param, value in sweep:
+            if param == "nprobe":
+                apply_search_params(index, nprobe=value)
+            elif param == "efSearch":
+                apply_search_params(index, ef_search=value)
+            
+            row = {
+                "index_type": index_type,
+                "param": param,
+                "value": value,
+                "build_s": build_s,
+                "memory_mb": memory_mb,
+                **measure(index, queries, truth, k),
+            }
+            results.append(row)
+            print(f"{index_type:9s} {param:8s} {str(value or '-'):>5s}  "
+                  f"recall@{k}={row['recall_at_k']:.3f}  "
+                  f"p50={row['p50_ms']:.3f}ms  p99={row['p99_ms']:.3f}ms  "
+                  f"memory={memory_mb:.1f}MB  build={build_s:.1f}s")
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types")
+    parser.add_argument("--scale", type=int, default=1, help="Catalogue size as a multiple of the current corpus")
+    parser.add_argument("--k", type=int, default=config.TOP_K_RESULTS, help="Results per query")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.scale, args.k, args.queries, args.types, args.nprobe, args.ef_search)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark of prompt prefix reuse: prefill time of RAG prompts with an empty
+model context versus with the instruction prefix already evaluated.
+
+Usage:
+    python evaluate/benchmark_prefix_cache.py --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# Tambahkan path ke root project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from src.llm import LlamaInterface, prompt_prefix
+from src.retriever import DocumentRetriever
+from utils.helpers import setup_rag_pipeline
+
+
+LANGUAGES = {
+    "bahasa_indonesia": config.SYSTEM_PROMPT_INDONESIA,
+    "english": config.SYSTEM_PROMPT_ENGLISH,
+}
+
+DEFAULT_QUERIES = [
+    "Apa saja fasilitas yang terdapat di perpustakaan Universitas Brawijaya?",
+    "Bagaimana aturan atau SOP peminjaman buku di Universitas Brawijaya?",
+    "Apa saja layanan referensi jurnal yang terdapat pada universitas brawijaya?",
+    "Jelaskan apa itu layanan 'Klinik Journal' dalam Universitas Brawijaya?",
+    "Bagaimana menghubungi Admin Help desk universitas brawijaya?",
+]
+
+
+def time_prefill(llm: LlamaInterface, prompt: str, template: str, warm: bool) -> Dict:
+    """
+    Measure the prefill of one prompt.
+    
+    Args:
+        llm: Loaded model interface
+        prompt: Formatted RAG prompt
+        template: Prompt template the prompt was formatted from
+        warm: Evaluate the template's instruction prefix before timing
+    
+    Returns:
+        Dictionary with the number of tokens evaluated and the time in ms
+    """
+    llm.reset_context()
+    if warm:
+        llm.prime_prompt_prefix(template)
+    
+    start = time.perf_counter()
+    evaluated = llm.prefill(prompt)
+    return {"evaluated_tokens": evaluated, "ms": (time.perf_counter() - start) * 1000}
+
+
+def run_benchmark(queries: List[str], repeat: int) -> List[Dict]:
+    """Prefill every query's prompt cold and warm, in both languages."""
+    config.USE_PROMPT_PREFIX_CACHE = True
+    
+    success, message, vectorstore = setup_rag_pipeline()
+    if not success:
+        raise RuntimeError(message)
+    retriever = DocumentRetriever(vectorstore)
+    llm = LlamaInterface()
+    
+    results = []
+    for language, template in LANGUAGES.items():
+        config.SYSTEM_PROMPT = template
+        prefix_tokens = len(llm.model.tokenize(prompt_prefix(template)))
+        
+        for query in queries:
+            context = retriever.format_context(retriever.retrieve(query))
+            prompt = llm.format_rag_prompt(query, context)
+            cold = [time_prefill(llm, prompt, template, warm=False) for _ in range(repeat)]
+            warm = [time_prefill(llm, prompt, template, warm=True) for _ in range(repeat)]
+            
+            row = {
+                "language": language,
+                "query": query,
+                "prompt_tokens": len(llm.model.tokenize(prompt)),
+                "prefix_tokens": prefix_tokens,
+                "warm_evaluated_tokens": warm[0]["evaluated_tokens"],
+                "cold_ms": statistics.median(run["ms"] for run in cold),
+                "warm_ms": statistics.median(run["ms"] for run in warm),
+            }
+            row["saved_ms"] = row["cold_ms"] - row["warm_ms"]
+            results.append(row)
+            print(f"{language:16s} prompt={row['prompt_tokens']:4d} tok  "
+                  f"evaluated warm={row['warm_evaluated_tokens']:4d} tok  "
+                  f"cold={row['cold_ms']:8.1f}ms  warm={row['warm_ms']:8.1f}ms  "
+                  f"saved={row['saved_ms']:8.1f}ms")
+    
+    print("\nPrefill time saved per request")
+    print("=" * 50)
+    for language in LANGUAGES:
+        rows = [row for row in results if row["language"] == language]
+        cold_ms = statistics.mean(row["cold_ms"] for row in rows)
+        saved_ms = statistics.mean(row["saved_ms"] for row in rows)
+        print(f"{language:16s} prefix={rows[0]['prefix_tokens']} tok  "
+              f"saved {saved_ms:.1f}ms of {cold_ms:.1f}ms ({saved_ms / cold_ms:.0%})")
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt prefix reuse")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES, help="Queries to build prompts from")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per prompt, the median is reported")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.queries, args.repeat)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
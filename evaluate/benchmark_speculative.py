@@ -0,0 +1,154 @@
+"""
+Benchmark of speculative decoding: end-to-end generation speed of RAG answers
+and the share of draft tokens the main model accepts, per draft source.
+
+Requires llama-cpp-python. Usage:
+    python evaluate/benchmark_speculative.py --modes off prompt_lookup draft_model --greedy
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# Tambahkan path ke root project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from src.llm import LlamaInterface
+from src.retriever import DocumentRetriever
+from utils.helpers import setup_rag_pipeline
+
+
+MODES = ["off", "prompt_lookup", "draft_model"]
+
+DEFAULT_QUERIES = [
+    "Apa saja fasilitas yang terdapat di perpustakaan Universitas Brawijaya?",
+    "Bagaimana aturan atau SOP peminjaman buku di Universitas Brawijaya?",
+    "Apa saja layanan referensi jurnal yang terdapat pada universitas brawijaya?",
+    "Jelaskan apa itu layanan 'Klinik Journal' dalam Universitas Brawijaya?",
+    "Bagaimana menghubungi Admin Help desk universitas brawijaya?",
+]
+
+
+def time_generation(llm: LlamaInterface, prompt: str) -> Dict:
+    """
+    Generate an answer and measure it.
+    
+    Args:
+        llm: Loaded model interface with the llama_cpp backend
+        prompt: Formatted RAG prompt
+    
+    Returns:
+        Dictionary with the answer, wall time, tokens per second and draft token counts
+    """
+    before = copy.copy(llm.model.stats)
+    start = time.perf_counter()
+    answer = llm.generate_response(prompt, has_context=True)
+    seconds = time.perf_counter() - start
+    
+    stats = llm.model.stats
+    generated = stats.generated - before.generated
+    proposed = stats.proposed - before.proposed
+    accepted = stats.accepted - before.accepted
+    passes = stats.passes - before.passes
+    return {
+        "answer": answer,
+        "seconds": seconds,
+        "generated_tokens": generated,
+        "tokens_per_second": generated / seconds if seconds > 0 else 0.0,
+        "proposed": proposed,
+        "accepted": accepted,
+        "acceptance_rate": accepted / proposed if proposed else 0.0,
+        "tokens_per_pass": generated / passes if passes else 0.0,
+    }
+
+
+def run_benchmark(queries: List[str], modes: List[str], greedy: bool) -> Dict[str, List[Dict]]:
+    """Generate every query's answer with each draft source."""
+    config.LLM_BACKEND = "llama_cpp"
+    if greedy:
+        # Deterministic sampling, so every mode must produce the same answers
+        config.TOP_K = 1
+    
+    success, message, vectorstore = setup_rag_pipeline()
+    if not success:
+        raise RuntimeError(message)
+    retriever = DocumentRetriever(vectorstore)
+    
+    results: Dict[str, List[Dict]] = {}
+    prompts = None
+    for mode in modes:
+        config.SPECULATIVE_DECODING = mode
+        llm = LlamaInterface()
+        if prompts is None:
+            prompts = []
+            for query in queries:
+                documents = retriever.retrieve(query)
+                context = retriever.format_context(documents, max_tokens=llm.context_budget(query),
+                                                   count_tokens=llm.count_tokens)
+                prompts.append(llm.format_rag_prompt(query, context))
+        
+        print(f"\nMode: {mode}")
+        print("=" * 50)
+        results[mode] = []
+        for query, prompt in zip(queries, prompts):
+            # Same starting state for every mode: only the prompt prefix is evaluated
+            llm.reset_context()
+            llm.prime_prompt_prefix()
+            row = time_generation(llm, prompt)
+            row["query"] = query
+            results[mode].append(row)
+            print(f"{row['generated_tokens']:4d} tok  {row['tokens_per_second']:6.1f} tok/s  "
+                  f"accepted {row['accepted']:4d}/{row['proposed']:4d} ({row['acceptance_rate']:.0%})  "
+                  f"{row['tokens_per_pass']:.2f} tok/pass")
+        
+        # Free the model before loading the next one
+        del llm
+        gc.collect()
+    
+    print("\nSpeculative decoding summary")
+    print("=" * 50)
+    baseline = results.get("off")
+    for mode, rows in results.items():
+        tokens = sum(row["generated_tokens"] for row in rows)
+        seconds = sum(row["seconds"] for row in rows)
+        proposed = sum(row["proposed"] for row in rows)
+        accepted = sum(row["accepted"] for row in rows)
+        line = (f"{mode:14s} {tokens / seconds:6.1f} tok/s  "
+                f"acceptance {accepted / proposed if proposed else 0.0:.0%}  "
+                f"median latency {statistics.median(row['seconds'] for row in rows):.2f}s")
+        if baseline and mode != "off":
+            base_seconds = sum(row["seconds"] for row in baseline)
+            line += f"  speedup {base_seconds / seconds:.2f}x"
+            if greedy:
+                same = sum(row["answer"] == base["answer"] for row, base in zip(rows, baseline))
+                line += f"  identical answers {same}/{len(rows)}"
+        print(line)
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speculative decoding")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES, help="Queries to build prompts from")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES, help="Draft sources to compare")
+    parser.add_argument("--greedy", action="store_true",
+                        help="Sample greedily and check that answers match the run without speculation")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args.queries, args.modes, args.greedy)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
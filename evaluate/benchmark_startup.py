@@ -0,0 +1,181 @@
+"""
+Import-time report for the entry points: cold import time per module, the
+heaviest packages behind it, and wall time of the CLI --help commands.
+
+Usage:
+    python evaluate/benchmark_startup.py --top 10 --budget-ms 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that tools and entry points import before doing any real work
+DEFAULT_MODULES = [
+    "config",
+    "src",
+    "utils",
+    "src.chatbot",
+    "utils.helpers",
+    "evaluate.evaluation",
+]
+
+# Commands that should start instantly
+DEFAULT_COMMANDS = [
+    ["cli/cli_app.py", "--help"],
+    ["app.py", "--help"],
+]
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Parse the output of python -X importtime.
+    
+    Args:
+        stderr: Standard error of the interpreter
+    
+    Returns:
+        List of entries with module name, nesting depth, self and cumulative time in ms
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return entries
+
+
+def measure_import(module: str) -> Dict:
+    """
+    Import a module in a fresh interpreter and break down where the time goes.
+    
+    Args:
+        module: Dotted module name, importable from the project root
+    
+    Returns:
+        Dictionary with total time, per-package self time and an error message if the import failed
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True,
+    )
+    entries = parse_importtime(result.stderr)
+    
+    # Skip what the interpreter imports at startup, which ends with site
+    start = max((i + 1 for i, entry in enumerate(entries)
+                 if entry["module"] == "site" and entry["depth"] == 0), default=0)
+    entries = entries[start:]
+    total_ms = sum(entry["cumulative_ms"] for entry in entries if entry["depth"] == 0)
+    
+    # Attribute self time to top-level packages, e.g. torch.nn.modules -> torch
+    packages: Dict[str, float] = defaultdict(float)
+    for entry in entries:
+        packages[entry["module"].split(".")[0]] += entry["self_ms"]
+    
+    error = None
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["import failed"])[-1]
+    
+    return {
+        "module": module,
+        "total_ms": total_ms,
+        "num_modules": len(entries),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+        "error": error,
+    }
+
+
+def measure_command(args: List[str], repeat: int = 3) -> Dict:
+    """
+    Measure the best-of-n wall time of a Python entry point.
+    
+    Args:
+        args: Script path relative to the project root, followed by its arguments
+        repeat: Number of runs
+    
+    Returns:
+        Dictionary with the command and its fastest wall time in ms
+    """
+    timings = []
+    returncode = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=ROOT_DIR, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        returncode = result.returncode
+    
+    return {"command": " ".join(args), "wall_ms": min(timings), "returncode": returncode}
+
+
+def run_report(modules: List[str], commands: List[List[str]], top: int,
+               budget_ms: Optional[float]) -> Dict:
+    """Measure every module and command and print the report."""
+    report = {"imports": [], "commands": [], "over_budget": []}
+    
+    print("Cold import time")
+    print("=" * 50)
+    for module in modules:
+        row = measure_import(module)
+        report["imports"].append(row)
+        
+        if row["error"]:
+            print(f"{module:22s} FAILED: {row['error']}")
+            continue
+        
+        flag = ""
+        if budget_ms is not None and row["total_ms"] > budget_ms:
+            flag = "  OVER BUDGET"
+            report["over_budget"].append(module)
+        print(f"{module:22s} {row['total_ms']:8.1f} ms  ({row['num_modules']} modules){flag}")
+        
+        heaviest = list(row["packages"].items())[:top]
+        print("    " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in heaviest))
+    
+    print("\nEntry point wall time")
+    print("=" * 50)
+    for args in commands:
+        row = measure_command(args)
+        report["commands"].append(row)
+        status = "" if row["returncode"] == 0 else f"  (exit code {row['returncode']})"
+        print(f"{row['command']:22s} {row['wall_ms']:8.1f} ms{status}")
+    
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold import time of the entry points")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages listed per module")
+    parser.add_argument("--budget-ms", type=float, help="Exit with an error if an import takes longer")
+    parser.add_argument("--output", help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+    
+    report = run_report(args.modules, DEFAULT_COMMANDS, args.top, args.budget_ms)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n Report saved to: {args.output}")
+    
+    if report["over_budget"]:
+        print(f"\nOver the {args.budget_ms:.0f} ms budget: {', '.join(report['over_budget'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
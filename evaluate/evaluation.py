@@ -3,7 +3,6 @@ Implementasi evaluasi BLEU untuk chatbot library dengan pengukuran CPU usage dan
 """
 from typing import List, Dict
 from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-import mlflow
 import os
 import json
 import time
@@ -18,6 +17,8 @@ class LibraryBLEUEvaluator:
         self.use_mlflow = use_mlflow
 
         if self.use_mlflow:
+            # MLflow is slow to import, so it is only loaded when tracking is enabled
+            import mlflow
             mlflow.set_tracking_uri("http://localhost:5000")
             mlflow.set_experiment("Library_Chatbot_CPU")
             print("MLflow tracking enabled with URI: http://localhost:5000")
@@ -177,6 +178,8 @@ class LibraryBLEUEvaluator:
 
     def _log_to_mlflow(self, results, config_params):
         """Log hasil evaluasi ke MLflow"""
+        import mlflow
+        
         with mlflow.start_run():
             # Log BLEU metrics
             summary = results["summary"]["overall"]
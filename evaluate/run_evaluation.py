@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from evaluation import LibraryBLEUEvaluator
 from config import MODEL_CONFIG
 from src.chatbot import LlamaRagChatbot
+from src.embedding import get_embedding_model
 from utils.helpers import setup_rag_pipeline
 
 def run_current_config(chatbot):
@@ -39,7 +40,10 @@ if __name__ == "__main__":
     
     print("Creating chatbot instance...")
     chatbot = LlamaRagChatbot(vectorstore)
+    # Every query is generated, so latency is not measured on cached answers
+    chatbot.response_cache = None
     
     print("Starting evaluation...")
     results = run_current_config(chatbot)
+    print(f"Embedding model: {get_embedding_model().stats()}")
     print("Evaluation complete!")
\ No newline at end of file
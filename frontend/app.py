@@ -74,6 +74,8 @@ h1, h2, h3, h4 {
 
 # --- Backend API Configuration ---
 BACKEND_URL = "http://localhost:8000"
+# Seconds to connect, and to wait for the response or between streamed tokens
+REQUEST_TIMEOUT = (5, 120)
 
 # --- Language Selector ---
 language_options = {
@@ -152,19 +154,66 @@ def send_query_to_backend(query: str, language: str):
             f"{BACKEND_URL}/chat",
             json=payload,
             headers={"Content-Type": "application/json"},
-            #timeout=30  # 30 second timeout
+            timeout=REQUEST_TIMEOUT,
         )
         
         if response.status_code == 200:
             return response.json(), None
+        elif response.status_code in (429, 503):
+            return None, busy_message(response)
         else:
             return None, f"Backend error: {response.status_code}"
             
     except requests.exceptions.ConnectionError:
         return None, "Cannot connect to backend. Make sure FastAPI is running."
+    except requests.exceptions.Timeout:
+        return None, "The backend took too long to answer. Please try again."
     except Exception as e:
         return None, f"Unexpected error: {str(e)}"
 
+def busy_message(response) -> str:
+    """Error message for a request the backend rejected because it is busy."""
+    retry_after = response.headers.get("Retry-After", "a few")
+    return f"The chatbot is busy right now. Please try again in {retry_after} seconds."
+
+# --- Function to stream a response from the backend ---
+def stream_query_from_backend(query: str, language: str):
+    """Yield (event, data) pairs from the /chat/stream server-sent events."""
+    try:
+        payload = {
+            "query": query,
+            "language": language
+        }
+        
+        with requests.post(
+            f"{BACKEND_URL}/chat/stream",
+            json=payload,
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+            stream=True,
+            timeout=REQUEST_TIMEOUT,
+        ) as response:
+            if response.status_code in (429, 503):
+                yield "error", {"message": busy_message(response)}
+                return
+            if response.status_code != 200:
+                yield "error", {"message": f"Backend error: {response.status_code}"}
+                return
+            
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):].strip())
+                    event = "message"
+    
+    except requests.exceptions.ConnectionError:
+        yield "error", {"message": "Cannot connect to backend. Make sure FastAPI is running."}
+    except requests.exceptions.Timeout:
+        yield "error", {"message": "The backend took too long to answer. Please try again."}
+    except Exception as e:
+        yield "error", {"message": f"Unexpected error: {str(e)}"}
+
 # --- Initialize chat history ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -177,12 +226,14 @@ for message in st.session_state.messages:
         # Show metadata for assistant messages
         if message["role"] == "assistant" and "metadata" in message:
             with st.expander("📊 Detail Response"):
-                col1, col2, col3 = st.columns(3)
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("Docs Retrieved", message["metadata"]["num_docs_retrieved"])
                 with col2:
                     st.metric("Has Context", "Yes" if message["metadata"]["has_relevant_context"] else "No")
                 with col3:
+                    st.metric("First Token", f"{message['metadata'].get('first_token_time') or 'N/A'}s")
+                with col4:
                     st.metric("Response Time", f"{message['metadata'].get('response_time', 'N/A')}s")
 
 # --- Chat input and response ---
@@ -194,63 +245,78 @@ if prompt := st.chat_input(placeholder_text):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Display assistant response
+    # Display assistant response, rendering tokens as they arrive
     with st.chat_message("assistant"):
-        with st.spinner(processing_text):
-            import time
-            start_time = time.time()
+        start_time = time.time()
             
-            # Get initial CPU
-            cpu_before = get_cpu_usage()
+        # Prime the CPU counter; the next call reports usage during the request
+        psutil.cpu_percent(interval=None)
             
-            # Send request to backend
-            result, error = send_query_to_backend(prompt, language_code)
+        placeholder = st.empty()
+        placeholder.markdown(f"_{processing_text}_")
+        response_text = ""
+        first_token_time = None
+        result, error = None, None
             
-            # Get final CPU
-            cpu_after = get_cpu_usage()
-            end_time = time.time()
-            response_time = round(end_time - start_time, 2)
-            cpu_usage_during_request = round((cpu_before + cpu_after) / 2, 2)
+        for event, data in stream_query_from_backend(prompt, language_code):
+            if event == "token":
+                if first_token_time is None:
+                    first_token_time = round(time.time() - start_time, 2)
+                response_text += data["text"]
+                placeholder.markdown(response_text + "▌")
+            elif event == "end":
+                result = data
+            elif event == "error":
+                error = data["message"]
             
-            if error:
-                # Handle error
-                st.error(f"❌ {error}")
-                if "Cannot connect" in error:
-                    st.info("💡 Pastikan backend FastAPI sudah berjalan dengan perintah:\n```bash\ncd backend\nuvicorn main:app --reload\n```")
+        end_time = time.time()
+        response_time = round(end_time - start_time, 2)
+        cpu_usage_during_request = psutil.cpu_percent(interval=None)
                 
-                # Add error message to chat history
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": f"❌ {error}"
-                })
-            else:
-                # Display successful response
-                response_text = result["response"]
-                st.markdown(response_text)
+        if error or result is None:
+            error = error or "Backend closed the stream before the response was complete."
+            # Handle error
+            placeholder.empty()
+            st.error(f"❌ {error}")
+            if "Cannot connect" in error:
+                st.info("💡 Pastikan backend FastAPI sudah berjalan dengan perintah:\n```bash\ncd backend\nuvicorn main:app --reload\n```")
                 
-                # Show response metadata
-                with st.expander("📊 Response Details"):
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Docs Retrieved", result["num_docs_retrieved"])
-                    with col2:
-                        st.metric("Has Context", "Yes" if result["has_relevant_context"] else "No")
-                    with col3:
-                        st.metric("Response Time", f"{response_time}s")
-                    with col4:
-                        st.metric("CPU Usage", f"{cpu_usage_during_request}%")
+            # Add error message to chat history
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": f"❌ {error}"
+            })
+        else:
+            # Display the final response
+            response_text = result["response"]
+            placeholder.markdown(response_text)
                 
-                # Add successful response to chat history
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": response_text,
-                    "metadata": {
-                        "num_docs_retrieved": result["num_docs_retrieved"],
-                        "has_relevant_context": result["has_relevant_context"],
-                        "response_time": response_time,
-                        "cpu_usage": cpu_usage_during_request
-                    }
-                })
+            # Show response metadata
+            with st.expander("📊 Response Details"):
+                col1, col2, col3, col4, col5 = st.columns(5)
+                with col1:
+                    st.metric("Docs Retrieved", result["num_docs_retrieved"])
+                with col2:
+                    st.metric("Has Context", "Yes" if result["has_relevant_context"] else "No")
+                with col3:
+                    st.metric("First Token", f"{first_token_time or response_time}s")
+                with col4:
+                    st.metric("Response Time", f"{response_time}s")
+                with col5:
+                    st.metric("CPU Usage", f"{cpu_usage_during_request}%")
+            
+            # Add successful response to chat history
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": response_text,
+                "metadata": {
+                    "num_docs_retrieved": result["num_docs_retrieved"],
+                    "has_relevant_context": result["has_relevant_context"],
+                    "first_token_time": first_token_time,
+                    "response_time": response_time,
+                    "cpu_usage": cpu_usage_during_request
+                }
+            })
 # --- Footer ---
 st.sidebar.markdown("---")
 st.sidebar.markdown("### How to Run:")
@@ -142,9 +142,15 @@ if prompt := st.chat_input(placeholder_text):
     with st.chat_message("user"):
         st.markdown(prompt)
     with st.chat_message("assistant"):
-        with st.spinner(processing_text):
-            result = st.session_state.chatbot.process_query(prompt)
-            response = result["response"]
+        placeholder = st.empty()
+        placeholder.markdown(f"_{processing_text}_")
+        response = ""
+        for event in st.session_state.chatbot.stream_query(prompt):
+            if event["event"] == "token":
+                response += event["text"]
+                placeholder.markdown(response + "▌")
+            elif event["event"] == "end":
+                response = event["response"]
         
-            st.markdown(response)
+        placeholder.markdown(response)
     st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
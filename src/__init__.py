@@ -5,7 +5,23 @@ Package initialization for the src module.
 # Version information
 __version__ = '0.1.0'
 
-# Import key components for easier access
-from .chatbot import LlamaRagChatbot
-from .document_loader import load_all_documents
-from .indexing import get_or_create_index
+# Key components are importable from the package, but only loaded on first
+# access so that importing a light submodule does not pull in the LLM and
+# LangChain stacks
+_LAZY_EXPORTS = {
+    "LlamaRagChatbot": ".chatbot",
+    "load_all_documents": ".document_loader",
+    "get_or_create_index": ".indexing",
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
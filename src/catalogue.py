@@ -0,0 +1,401 @@
+"""
+Catalogue module to answer shelf-location questions directly from buku.json.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from src.document_loader import iter_json_array
+from src.manifest import fingerprint_file, source_is_unchanged
+import config
+
+
+CATALOGUE_VERSION = 1
+CATALOGUE_FILENAME = "catalogue.json"
+CATALOGUE_FIELDS = ("title", "author", "publisher", "shelf")
+
+# Fields that get a trigram index for typo-tolerant lookup
+SEARCH_FIELDS = ("title", "author")
+
+_SHELF_INTENT = re.compile(
+    r"\b(rak|letak|lokasi|di\s*mana(?:kah)?|shelf|where|location)\b", re.IGNORECASE
+)
+_QUOTED = [
+    re.compile(r"'(.+)'"),
+    re.compile(r'"(.+)"'),
+    re.compile(r"“(.+)”"),
+    re.compile(r"‘(.+)’"),
+]
+_AFTER_TITLE_WORD = re.compile(r"\b(?:berjudul|judul|titled|called)\b\s*:?\s*(.+)$", re.IGNORECASE)
+
+
+def normalize_text(text: Any) -> str:
+    """
+    Normalize a catalogue value for matching.
+    
+    Accents are stripped, text is lowercased, punctuation becomes a space
+    and whitespace is collapsed, so "Diabetes : Terapi" and "diabetes terapi"
+    compare equal.
+    
+    Args:
+        text: Raw field value
+    
+    Returns:
+        Normalized string, empty for missing values
+    """
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^0-9a-z]+", " ", text.lower())
+    return text.strip()
+
+
+def trigrams(text: str) -> set:
+    """
+    Split a normalized string into padded character trigrams.
+    
+    Args:
+        text: Normalized string
+    
+    Returns:
+        Set of trigrams
+    """
+    if not text:
+        return set()
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_shelf_query(query: str) -> Optional[str]:
+    """
+    Extract the book title from a shelf-location question.
+    
+    Args:
+        query: The user's question, e.g. "Dimana letak rak buku yang berjudul 'X'?"
+    
+    Returns:
+        The requested title, or None if the question is not a shelf lookup
+    """
+    if not _SHELF_INTENT.search(query):
+        return None
+    
+    for pattern in _QUOTED:
+        match = pattern.search(query)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+    
+    match = _AFTER_TITLE_WORD.search(query)
+    if match:
+        title = match.group(1).strip().rstrip("?.! ")
+        return title or None
+    return None
+
+
+class CatalogueIndex:
+    """
+    In-memory catalogue of books with exact and trigram lookup.
+    
+    Exact lookups on the normalized title are a dictionary access; when
+    there is no exact match, candidates sharing trigrams with the query are
+    ranked by Dice similarity, which tolerates typos and missing words.
+    """
+    
+    def __init__(self, records: Optional[Iterable[Dict[str, str]]] = None):
+        """
+        Initialize the catalogue.
+        
+        Args:
+            records: Books as dictionaries with title, author, publisher and shelf
+        """
+        self.records: List[Dict[str, str]] = []
+        self._normalized: List[Dict[str, str]] = []
+        self._exact: Dict[str, Dict[str, List[int]]] = {field: defaultdict(list) for field in SEARCH_FIELDS}
+        self._postings: Dict[str, Dict[str, List[int]]] = {field: defaultdict(list) for field in SEARCH_FIELDS}
+        self._arrays: Optional[Dict[str, Dict[str, np.ndarray]]] = None
+        self._sizes: Dict[str, np.ndarray] = {}
+        
+        for record in records or []:
+            self.add(record)
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def add(self, record: Dict[str, str]):
+        """
+        Add one book to the catalogue.
+        
+        Args:
+            record: Dictionary with title, author, publisher and shelf
+        """
+        row = len(self.records)
+        record = {field: "" if record.get(field) is None else str(record[field]).strip()
+                  for field in CATALOGUE_FIELDS}
+        normalized = {field: normalize_text(record[field]) for field in CATALOGUE_FIELDS}
+        self.records.append(record)
+        self._normalized.append(normalized)
+        self._arrays = None
+        
+        for field in SEARCH_FIELDS:
+            if normalized[field]:
+                self._exact[field][normalized[field]].append(row)
+                for gram in trigrams(normalized[field]):
+                    self._postings[field][gram].append(row)
+    
+    def lookup(self, text: str, field: str = "title", limit: int = 5,
+               min_similarity: Optional[float] = None) -> List[Tuple[Dict[str, str], float]]:
+        """
+        Find books by title or author.
+        
+        Args:
+            text: Title or author to look up
+            field: "title" or "author"
+            limit: Maximum number of results
+            min_similarity: Lowest Dice similarity accepted for fuzzy matches (default: from config)
+        
+        Returns:
+            List of (record, similarity) pairs, best first; exact matches score 1.0
+        """
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Unknown catalogue field: {field}, expected one of {SEARCH_FIELDS}")
+        if min_similarity is None:
+            min_similarity = config.CATALOGUE_MIN_SIMILARITY
+        
+        query = normalize_text(text)
+        if not query:
+            return []
+        
+        exact_rows = self._exact[field].get(query)
+        if exact_rows:
+            return [(self.records[row], 1.0) for row in exact_rows[:limit]]
+        
+        # Count shared trigrams per row over the postings of the query trigrams
+        postings = self._posting_arrays()[field]
+        query_grams = trigrams(query)
+        hits = [postings[gram] for gram in query_grams if gram in postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.records))
+        
+        similarity = 2 * shared / (len(query_grams) + self._sizes[field])
+        rows = np.flatnonzero(similarity >= min_similarity)
+        rows = rows[np.lexsort((rows, -similarity[rows]))][:limit]
+        return [(self.records[row], float(similarity[row])) for row in rows]
+    
+    def _posting_arrays(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """Freeze the posting lists into arrays after records were added."""
+        if self._arrays is None:
+            self._arrays = {
+                field: {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+                for field, postings in self._postings.items()
+            }
+            # A padded string of length n has n + 1 trigrams
+            self._sizes = {
+                field: np.array([len(normalized[field]) + 1 if normalized[field] else 0
+                                 for normalized in self._normalized], dtype=np.float64)
+                for field in SEARCH_FIELDS
+            }
+        return self._arrays
+    
+    def find_shelves(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Find where a book is shelved, collecting every copy of the best match.
+        
+        Args:
+            title: Title as written by the user
+        
+        Returns:
+            Dictionary with the matched record, its shelves and similarity, or
+            None if no title is similar enough
+        """
+        matches = self.lookup(title, limit=config.CATALOGUE_MAX_RESULTS)
+        if not matches:
+            return None
+        
+        best, similarity = matches[0]
+        best_title = normalize_text(best["title"])
+        copies = [record for record, _ in matches if normalize_text(record["title"]) == best_title]
+        
+        shelves = []
+        for record in copies:
+            if record["shelf"] and record["shelf"] not in shelves:
+                shelves.append(record["shelf"])
+        
+        return {
+            "record": best,
+            "copies": copies,
+            "shelves": shelves,
+            "similarity": similarity,
+        }
+    
+    def save(self, path: str, source: Optional[Dict[str, Any]] = None):
+        """
+        Persist the catalogue records beside the vector index.
+        
+        Args:
+            path: Directory to write the catalogue file to
+            source: Fingerprint of the JSON file the catalogue was built from
+        """
+        os.makedirs(path, exist_ok=True)
+        catalogue_path = os.path.join(path, CATALOGUE_FILENAME)
+        data = {
+            "version": CATALOGUE_VERSION,
+            "fields": config.CATALOGUE_SOURCE_FIELDS,
+            "source": source,
+            "records": [[record[field] for field in CATALOGUE_FIELDS] for record in self.records],
+        }
+        with open(catalogue_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(catalogue_path + ".tmp", catalogue_path)
+    
+    @classmethod
+    def load(cls, path: str) -> Tuple["CatalogueIndex", Dict[str, Any]]:
+        """
+        Load a persisted catalogue and rebuild its lookup tables.
+        
+        Args:
+            path: Directory containing the catalogue file
+        
+        Returns:
+            Tuple of (catalogue, file header without the records)
+        """
+        with open(os.path.join(path, CATALOGUE_FILENAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records = data.pop("records")
+        catalogue = cls(dict(zip(CATALOGUE_FIELDS, values)) for values in records)
+        catalogue._posting_arrays()
+        return catalogue, data
+
+
+def build_catalogue(json_path: str) -> CatalogueIndex:
+    """
+    Build a catalogue from a book export, streaming its records.
+    
+    Args:
+        json_path: Path to buku.json
+    
+    Returns:
+        CatalogueIndex with one entry per book record
+    """
+    catalogue = CatalogueIndex()
+    with open(json_path, "r", encoding="utf-8") as f:
+        for item in iter_json_array(f):
+            if isinstance(item, dict):
+                catalogue.add({
+                    field: item.get(key) for field, key in config.CATALOGUE_SOURCE_FIELDS.items()
+                })
+    catalogue._posting_arrays()
+    return catalogue
+
+
+def load_or_build_catalogue(index_path: Optional[str] = None,
+                            json_path: Optional[str] = None) -> Optional[CatalogueIndex]:
+    """
+    Load the persisted catalogue, rebuilding it when buku.json has changed.
+    
+    Args:
+        index_path: Directory the catalogue is stored in (default: the FAISS index directory)
+        json_path: Path to the book export (default: from config)
+    
+    Returns:
+        CatalogueIndex, or None if there is no book export
+    """
+    index_path = index_path or config.FAISS_INDEX_PATH
+    json_path = json_path or config.BUKU_JSON_PATH
+    if not os.path.exists(json_path):
+        return None
+    
+    if os.path.exists(os.path.join(index_path, CATALOGUE_FILENAME)):
+        try:
+            catalogue, header = CatalogueIndex.load(index_path)
+            if (header.get("version") == CATALOGUE_VERSION
+                    and header.get("fields") == config.CATALOGUE_SOURCE_FIELDS
+                    and source_is_unchanged(json_path, header.get("source"))):
+                return catalogue
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading catalogue: {e}")
+    
+    print("Building catalogue index...")
+    start_time = time.time()
+    source = fingerprint_file(json_path)
+    catalogue = build_catalogue(json_path)
+    catalogue.save(index_path, source)
+    print(f"Catalogue index with {len(catalogue)} books built in {time.time() - start_time:.2f} seconds")
+    return catalogue
+
+
+_catalogue: Optional[CatalogueIndex] = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> Optional[CatalogueIndex]:
+    """
+    Return the process-wide catalogue, loading or building it on first call.
+    
+    Returns:
+        Shared CatalogueIndex, or None if there is no book export
+    """
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = load_or_build_catalogue()
+    return _catalogue
+
+
+def format_shelf_answer(title: str, match: Dict[str, Any], language: str) -> str:
+    """
+    Phrase a shelf lookup result as a chatbot answer.
+    
+    Args:
+        title: Title as asked by the user
+        match: Result of CatalogueIndex.find_shelves
+        language: Output language code
+    
+    Returns:
+        Answer text
+    """
+    record = match["record"]
+    found_title = record["title"]
+    
+    if language == "english":
+        shelves = " and ".join(match["shelves"])
+        answer = f"The book titled '{found_title}' can be found on shelf {shelves}."
+        if match["similarity"] < 1.0:
+            answer = f"The closest match for '{title}' is the book '{found_title}', on shelf {shelves}."
+        if record["author"]:
+            answer += f" Author: {record['author']}."
+        return answer
+    
+    shelves = " dan ".join(match["shelves"])
+    answer = f"Buku berjudul '{found_title}' dapat ditemukan di rak buku {shelves}."
+    if match["similarity"] < 1.0:
+        answer = f"Buku yang paling sesuai dengan '{title}' adalah '{found_title}', di rak buku {shelves}."
+    if record["author"]:
+        answer += f" Pengarang: {record['author']}."
+    return answer
+
+
+def record_to_document(record: Dict[str, str], source: Optional[str] = None) -> Document:
+    """
+    Represent a catalogue record as a Document for the response sources.
+    
+    Args:
+        record: Catalogue record
+        source: Path of the book export (default: from config)
+    
+    Returns:
+        Document with the record fields as content and metadata
+    """
+    content = (f"Judul: {record['title']}\n\nPengarang: {record['author']}\n\n"
+               f"Penerbit: {record['publisher']}\n\nLokasi rak: {record['shelf']}")
+    metadata = {"source": source or config.BUKU_JSON_PATH, "file_type": "catalogue", **record}
+    return Document(page_content=content, metadata=metadata)
@@ -1,11 +1,20 @@
 """
 Chatbot implementation module that combines all components.
 """
-from typing import Dict, List, Any, Optional
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Any, Optional, Tuple, Union
 
+from langchain.schema import Document
 from langchain_community.vectorstores import FAISS
 
-from src.llm import LlamaInterface
+from src.catalogue import format_shelf_answer, get_catalogue, parse_shelf_query, record_to_document
+from src.llm import ERROR_RESPONSE, LlamaInterface
+from src.model_pool import ModelPool, ModelPoolBusy
+from src.options import QueryOptions
+from src.response_cache import get_response_cache
 from src.retriever import DocumentRetriever
 import config
 
@@ -15,62 +24,431 @@ class LlamaRagChatbot:
     RAG-powered chatbot using Llama model.
     """
     
-    def __init__(self, vectorstore: FAISS):
+    def __init__(self, vectorstore: FAISS, llm: Optional[Union[LlamaInterface, ModelPool]] = None):
         """
         Initialize the chatbot with a vector store.
         
         Args:
             vectorstore: FAISS vector store for retrieval
+            llm: Model or pool of model replicas (default: a single LlamaInterface)
         """
-        self.llm = LlamaInterface()
+        self.llm = llm or LlamaInterface()
         self.retriever = DocumentRetriever(vectorstore)
-        self.chat_history = []
+        self.catalogue = get_catalogue() if config.USE_CATALOGUE_LOOKUP else None
+        self.response_cache = get_response_cache() if config.USE_RESPONSE_CACHE else None
+        # Options of queries that do not bring their own
+        self.options = QueryOptions()
+        # Chat history per session ID, least recently used first; None is the default session
+        self._histories: "OrderedDict[Optional[str], List[Dict[str, str]]]" = OrderedDict()
+        self._history_lock = threading.Lock()
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    def process_query(self, query: str, deadline: Optional[float] = None, options: Optional[QueryOptions] = None,
+                      session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a user query through the RAG pipeline.
         
+        Safe to call from several threads at once: all per-query state is in
+        the options and the session's history.
+        
         Args:
             query: The user's question
+            deadline: time.monotonic() by which a model replica must be free,
+                when the model is a pool (default: the lane's REQUEST_DEADLINE)
+            options: Language, retrieval and generation settings (default: self.options)
+            session_id: Chat session the query belongs to (default: the shared session)
             
         Returns:
             Dictionary containing the response and related information
         """
-        # Retrieve relevant documents
-        retrieved_docs = self.retriever.retrieve(query)
-        has_relevant_context = len(retrieved_docs) > 0
-
-        #Augmented: add retrieval context to the prompt
-        context = self.retriever.format_context(retrieved_docs) if has_relevant_context else ""
-        rag_prompt = self.llm.format_rag_prompt(query, context)
+        return self.answer_prepared(self.prepare_query(query, options, session_id), deadline=deadline)
+    
+    def stream_query(self, query: str, deadline: Optional[float] = None, options: Optional[QueryOptions] = None,
+                     session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user query, streaming the response as it is generated.
         
-        # Generate the prompt
-        response = self.llm.generate_response(rag_prompt, has_context=has_relevant_context)
+        Yields a "start" event once retrieval is done, a "token" event for
+        every piece of generated text, and an "end" event carrying the same
+        fields as process_query's result.
+        
+        Args:
+            query: The user's question
+            deadline: time.monotonic() by which a model replica must be free,
+                when the model is a pool (default: the lane's REQUEST_DEADLINE)
+            options: Language, retrieval and generation settings (default: self.options)
+            session_id: Chat session the query belongs to (default: the shared session)
+            
+        Returns:
+            Iterator of event dictionaries with an "event" key
+        """
+        prepared = self.prepare_query(query, options, session_id)
+        yield self.start_event(prepared)
+        yield from self.stream_prepared(prepared, deadline=deadline)
+    
+    def prepare_query(self, query: str, options: Optional[QueryOptions] = None,
+                      session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieval stage: everything before generation.
         
-        # Add to chat history
-        self.chat_history.append({"query": query, "response": response})
+        Answers shelf-location and cached questions, otherwise retrieves the
+        documents and builds the RAG prompt. Does not use a model replica.
         
-        # Return the results
+        Args:
+            query: The user's question
+            options: Language, retrieval and generation settings (default: self.options)
+            session_id: Chat session the query belongs to (default: the shared session)
+            
+        Returns:
+            Dictionary with the query, options, session, retrieved documents,
+            query embedding, prompt, and the result under "answered" if no
+            generation is needed
+        """
+        options = options or self.options
+        
+        # Shelf-location and repeated questions are answered without generation
+        retrieved_docs, query_embedding, answered = self._answer_without_generation(query, options)
+        return self._prepared(query, options, session_id, retrieved_docs, query_embedding, answered)
+    
+    def prepare_queries(self, queries: List[str], options: Optional[QueryOptions] = None,
+                        session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieval stage of a batch of queries.
+        
+        The queries that are not answered from the catalogue or the exact
+        cache are embedded together and searched with one index call.
+        
+        Args:
+            queries: The users' questions
+            options: Settings shared by all queries (default: self.options)
+            session_id: Chat session the queries belong to (default: the shared session)
+            
+        Returns:
+            One prepare_query result per query, in order
+        """
+        options = options or self.options
+        answered = [self.lookup_shelf(query, options.language) or self.lookup_cache(query, options=options)
+                    for query in queries]
+        pending = [index for index, result in enumerate(answered) if not result]
+        
+        documents: Dict[int, List[Document]] = {}
+        embeddings: Dict[int, List[float]] = {}
+        if pending:
+            vectors = self.retriever.embed_queries([queries[index] for index in pending])
+            for index, vector, docs in zip(pending, vectors, self.retriever.retrieve_batch(vectors, options.top_k)):
+                documents[index] = docs
+                embeddings[index] = vector
+                answered[index] = self.lookup_cache(queries[index], docs, vector, options)
+        
+        return [self._prepared(query, options, session_id, documents.get(index, []),
+                               embeddings.get(index), answered[index])
+                for index, query in enumerate(queries)]
+    
+    def _prepared(self, query: str, options: QueryOptions, session_id: Optional[str],
+                  retrieved_docs: List[Document], query_embedding: Optional[List[float]],
+                  answered: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the result of prepare_query from the retrieval results."""
+        if answered:
+            return {"query": query, "options": options, "session_id": session_id, "answered": answered,
+                    "num_docs_retrieved": answered["num_docs_retrieved"],
+                    "has_relevant_context": answered["has_relevant_context"]}
+        
+        # Build the prompt from the retrieved documents
+        has_relevant_context, rag_prompt = self._prepare_prompt(query, retrieved_docs, options)
         return {
             "query": query,
-            "response": response,
+            "options": options,
+            "session_id": session_id,
+            "answered": None,
             "context_documents": retrieved_docs,
+            "query_embedding": query_embedding,
+            "prompt": rag_prompt,
             "num_docs_retrieved": len(retrieved_docs),
-            "has_relevant_context": has_relevant_context
+            "has_relevant_context": has_relevant_context,
+        }
+    
+    @property
+    def generation_workers(self) -> int:
+        """Number of answers the model generates at the same time."""
+        return self.llm.num_replicas if isinstance(self.llm, ModelPool) else 1
+    
+    def process_queries(self, queries: List[str], options: Optional[QueryOptions] = None,
+                        session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a batch of user queries, yielding each result as it finishes.
+        
+        Retrieval is done for the whole batch at once (prepare_queries), then
+        the answers are generated on as many threads as there are model
+        replicas, so the batch does not fill the pool's queue.
+        
+        Args:
+            queries: The users' questions
+            options: Settings shared by all queries (default: self.options)
+            session_id: Chat session the queries belong to (default: the shared session)
+            
+        Returns:
+            Iterator of process_query results, each with the "index" of its
+            query, or with an "error" if no model replica was available
+        """
+        prepared = self.prepare_queries(queries, options, session_id)
+        pending = []
+        for index, item in enumerate(prepared):
+            if item["answered"]:
+                yield {"index": index, **self.answer_prepared(item)}
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=min(self.generation_workers, len(pending)),
+                                      thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(self.answer_prepared, prepared[index]): index for index in pending}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield {"index": index, **future.result()}
+                except ModelPoolBusy as e:
+                    yield {"index": index, "query": queries[index], "error": str(e)}
+        finally:
+            # Queries not started yet are dropped if the caller stops early
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def start_event(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """The "start" stream event of a prepared query."""
+        return {"event": "start", "num_docs_retrieved": prepared["num_docs_retrieved"],
+                "has_relevant_context": prepared["has_relevant_context"]}
+    
+    def answer_prepared(self, prepared: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Generation stage: generate the answer to a query from prepare_query.
+        
+        Args:
+            prepared: Result of prepare_query
+            deadline: time.monotonic() by which a model replica must be free,
+                when the model is a pool (default: the lane's REQUEST_DEADLINE)
+            
+        Returns:
+            Dictionary containing the response and related information
+        """
+        if prepared["answered"]:
+            self._record(prepared["session_id"], prepared["query"], prepared["answered"]["response"])
+            return prepared["answered"]
+        
+        # Generate the prompt
+        response = self.llm.generate_response(prepared["prompt"], has_context=prepared["has_relevant_context"],
+                                              options=prepared["options"],
+                                              **self._scheduling(prepared["context_documents"], deadline))
+        return self._finish(prepared, response)
+    
+    def stream_prepared(self, prepared: Dict[str, Any],
+                        deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generation stage of stream_query: the "token" events and the "end" event.
+        
+        Args:
+            prepared: Result of prepare_query
+            deadline: time.monotonic() by which a model replica must be free,
+                when the model is a pool (default: the lane's REQUEST_DEADLINE)
+            
+        Returns:
+            Iterator of event dictionaries with an "event" key
+        """
+        answered = prepared["answered"]
+        if answered:
+            yield {"event": "token", "text": answered["response"]}
+            self._record(prepared["session_id"], prepared["query"], answered["response"])
+            yield {"event": "end", **answered}
+            return
+        
+        pieces = []
+        for text in self.llm.stream_response(prepared["prompt"], has_context=prepared["has_relevant_context"],
+                                             options=prepared["options"],
+                                             **self._scheduling(prepared["context_documents"], deadline)):
+            pieces.append(text)
+            yield {"event": "token", "text": text}
+        yield {"event": "end", **self._finish(prepared, "".join(pieces))}
+        
+    def _finish(self, prepared: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """Record a generated answer in the history and the response cache."""
+        # Add to the session's chat history
+        self._record(prepared["session_id"], prepared["query"], response)
+        
+        # Return the results
+        result = {
+            "query": prepared["query"],
+            "response": response,
+            "context_documents": prepared["context_documents"],
+            "num_docs_retrieved": prepared["num_docs_retrieved"],
+            "has_relevant_context": prepared["has_relevant_context"]
         }
+        self._cache_answer(result, prepared["query_embedding"], prepared["options"])
+        return result
+    
+    def _scheduling(self, documents: List[Document], deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        Scheduling arguments for a generation request on a model pool.
+        
+        Answers from paper abstracts tend to be long summaries, so they go to
+        the "long" lane and short library FAQ answers are not queued behind them.
+        
+        Args:
+            documents: Retrieved context documents
+            deadline: Deadline for getting a model replica
+            
+        Returns:
+            Keyword arguments for the pool's generation methods, empty for a single model
+        """
+        if not isinstance(self.llm, ModelPool):
+            return {}
+        papers = os.path.basename(config.PAPERS_JSON_PATH)
+        is_paper = any(os.path.basename(str(doc.metadata.get("source", ""))) == papers for doc in documents)
+        return {"lane": "long" if is_paper else "short", "deadline": deadline}
     
-    def get_chat_history(self) -> List[Dict[str, str]]:
+    def _answer_without_generation(self, query: str, options: QueryOptions) -> Tuple[List[Document], Optional[List[float]],
+                                                                 Optional[Dict[str, Any]]]:
+        """
+        Retrieve documents for a query unless it can be answered without the model.
+        
+        The catalogue and an exact response cache match are checked before
+        retrieval; a semantic cache match needs the retrieved documents.
+        
+        Args:
+            query: The user's question
+            options: Settings of the query
+            
+        Returns:
+            Retrieved documents, the query embedding if the cache needs it, and
+            the result dictionary if the query was answered
+        """
+        answered = self.lookup_shelf(query, options.language) or self.lookup_cache(query, options=options)
+        if answered:
+            return [], None, answered
+        
+        if self.response_cache is None or not options.cacheable:
+            return self.retriever.retrieve(query, top_k=options.top_k), None, None
+        
+        # Embedded once, for both the search and the semantic cache lookup
+        query_embedding = self.retriever.embed_query(query)
+        retrieved_docs = self.retriever.retrieve(query, top_k=options.top_k, query_embedding=query_embedding)
+        return retrieved_docs, query_embedding, self.lookup_cache(query, retrieved_docs, query_embedding, options)
+    
+    def lookup_cache(self, query: str, documents: Optional[List[Document]] = None,
+                     query_embedding: Optional[List[float]] = None,
+                     options: Optional[QueryOptions] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer a query from the response cache.
+        
+        Args:
+            query: The user's question
+            documents: Documents retrieved for the query; without them only
+                the normalized query text is matched
+            query_embedding: Embedding of the query, for a semantic match
+            options: Settings of the query (default: self.options); answers are
+                only cached for the configured retrieval and generation settings
+            
+        Returns:
+            Result dictionary shaped like process_query's, or None on a miss
+        """
+        options = options or self.options
+        if self.response_cache is None or not options.cacheable:
+            return None
+        
+        if documents is None:
+            cached = self.response_cache.get_exact(query, options.language)
+        else:
+            cached = self.response_cache.get_similar(query_embedding, documents, options.language)
+        if cached is None:
+            return None
+        return {"query": query, **cached, "answered_from": "cache"}
+    
+    def _cache_answer(self, result: Dict[str, Any], query_embedding: Optional[List[float]],
+                      options: QueryOptions):
+        """Store a generated answer, unless it has no context or generation failed."""
+        if self.response_cache is None or query_embedding is None or not options.cacheable:
+            return
+        if not result["has_relevant_context"] or result["response"] in ("", ERROR_RESPONSE):
+            return
+        
+        fields = {key: result[key] for key in ("response", "num_docs_retrieved", "has_relevant_context")}
+        self.response_cache.put(result["query"], options.language, result["context_documents"],
+                                query_embedding, fields)
+    
+    def _prepare_prompt(self, query: str, retrieved_docs: List[Document],
+                        options: QueryOptions) -> Tuple[bool, str]:
+        """Format the RAG prompt from the documents retrieved for a query."""
+        has_relevant_context = len(retrieved_docs) > 0
+        
+        #Augmented: add retrieval context to the prompt, packed into the tokens
+        # the context window has left after the template, question and answer
+        context = ""
+        if has_relevant_context:
+            context = self.retriever.format_context(
+                retrieved_docs,
+                max_tokens=self.llm.context_budget(query, options),
+                count_tokens=self.llm.count_tokens,
+            )
+        rag_prompt = self.llm.format_rag_prompt(query, context, options)
+        return has_relevant_context, rag_prompt
+    
+    def lookup_shelf(self, query: str, language: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer a shelf-location question from the catalogue index.
+        
+        Args:
+            query: The user's question
+            language: Output language code (default: the language of self.options)
+            
+        Returns:
+            Result dictionary shaped like process_query's, or None if the query
+            is not a shelf lookup or no book matches
+        """
+        if self.catalogue is None:
+            return None
+        
+        title = parse_shelf_query(query)
+        if not title:
+            return None
+        
+        match = self.catalogue.find_shelves(title)
+        if not match or not match["shelves"]:
+            return None
+        
+        documents = [record_to_document(record) for record in match["copies"]]
+        return {
+            "query": query,
+            "response": format_shelf_answer(title, match, language or self.options.language),
+            "context_documents": documents,
+            "num_docs_retrieved": len(documents),
+            "has_relevant_context": True,
+            "answered_from": "catalogue",
+        }
+    
+    def _record(self, session_id: Optional[str], query: str, response: str):
+        """Append a query and its response to a session's chat history."""
+        with self._history_lock:
+            history = self._histories.pop(session_id, [])
+            history.append({"query": query, "response": response})
+            self._histories[session_id] = history
+            while len(self._histories) > config.MAX_CHAT_SESSIONS:
+                self._histories.popitem(last=False)
+    
+    def get_chat_history(self, session_id: Optional[str] = None) -> List[Dict[str, str]]:
         """
         Get the chat history.
         
+        Args:
+            session_id: Chat session (default: the shared session)
+        
         Returns:
             List of query-response pairs
         """
-        return self.chat_history
+        with self._history_lock:
+            return list(self._histories.get(session_id, []))
     
-    def clear_chat_history(self):
-        """Clear the chat history."""
-        self.chat_history = []
+    def clear_chat_history(self, session_id: Optional[str] = None):
+        """Clear the chat history of a session (default: the shared session)."""
+        with self._history_lock:
+            self._histories.pop(session_id, None)
         
     def translate_query(self, query: str) -> str:
         """
@@ -87,18 +465,15 @@ class LlamaRagChatbot:
     
     def set_language(self, language: str):
         """
-        Set the output language for the chatbot.
+        Set the output language of queries without their own options.
+        
+        Only this chatbot's default options change, so queries in progress
+        and queries with their own options are not affected.
         
         Args:
             language: The language code (e.g., 'bahasa_indonesia', 'english')
         """
-        if language == "bahasa_indonesia":
-            config.SYSTEM_PROMPT = config.SYSTEM_PROMPT_INDONESIA
-            config.OUTPUT_LANGUAGE = "bahasa_indonesia"
-        elif language == "english":
-            config.SYSTEM_PROMPT = config.SYSTEM_PROMPT_ENGLISH
-            config.OUTPUT_LANGUAGE = "english"
-        else:
-            print(f"Unsupported language: {language}, defaulting to Bahasa Indonesia")
-            config.SYSTEM_PROMPT = config.SYSTEM_PROMPT_INDONESIA
-            config.OUTPUT_LANGUAGE = "bahasa_indonesia"
\ No newline at end of file
+        self.options = QueryOptions(language=language)
+        
+        # Evaluate the new language's instruction prefix before the next query
+        self.llm.prime_prompt_prefix(self.options.system_prompt)
\ No newline at end of file
@@ -1,14 +1,26 @@
 """
 Text chunking module to split documents into smaller chunks.
 """
-from typing import List
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
 
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from src.tokenization import annotate_token_counts
 import config
 
 
+def _get_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Create the text splitter configured for indexing."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        length_function=len,
+        is_separator_regex=False,
+    )
+
+
 def split_documents(documents: List[Document]) -> List[Document]:
     """
     Split documents into smaller chunks for better retrieval.
@@ -19,14 +31,74 @@ def split_documents(documents: List[Document]) -> List[Document]:
     Returns:
         List of chunked Document objects
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=config.CHUNK_SIZE,
-        chunk_overlap=config.CHUNK_OVERLAP,
-        length_function=len,
-        is_separator_regex=False,
-    )
+    text_splitter = _get_text_splitter()
     
     chunks = text_splitter.split_documents(documents)
+    assign_chunk_ids(chunks)
+    annotate_token_counts(chunks)
     print(f"Split {len(documents)} documents into {len(chunks)} chunks")
     
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def iter_split_documents(documents: Iterable[Document]) -> Iterator[Document]:
+    """
+    Split a stream of documents into chunks, one document at a time.
+    
+    Produces the same chunks and chunk IDs as split_documents without
+    holding the whole corpus in memory.
+    
+    Args:
+        documents: Iterable of LangChain Document objects
+    
+    Returns:
+        Iterator of chunked Document objects
+    """
+    text_splitter = _get_text_splitter()
+    seen: Dict[str, int] = {}
+    num_documents = 0
+    num_chunks = 0
+    
+    for document in documents:
+        chunks = text_splitter.split_documents([document])
+        assign_chunk_ids(chunks, seen)
+        annotate_token_counts(chunks)
+        num_documents += 1
+        num_chunks += len(chunks)
+        yield from chunks
+    
+    print(f"Split {num_documents} documents into {num_chunks} chunks")
+
+
+def assign_chunk_ids(chunks: List[Document], seen: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    Give every chunk a stable ID derived from its source and text.
+    
+    The ID only changes when the chunk content changes, which lets the index
+    be updated incrementally. Repeated chunks within a source get a suffix so
+    IDs stay unique.
+    
+    Args:
+        chunks: List of chunked Document objects, updated in place
+        seen: Occurrence counts of earlier chunks, shared across calls when
+            a corpus is chunked in pieces
+        
+    Returns:
+        List of chunk IDs in the same order as the chunks
+    """
+    if seen is None:
+        seen = {}
+    ids = []
+    
+    for chunk in chunks:
+        source = str(chunk.metadata.get("source", ""))
+        digest = hashlib.sha256(f"{source}\0{chunk.page_content}".encode("utf-8")).hexdigest()[:32]
+        
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunk_id = digest if occurrence == 0 else f"{digest}-{occurrence}"
+        
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    
+    return ids
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+Document store module to persist chunk texts and metadata without pickle.
+"""
+import json
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+
+IDS_FILE = "ids.txt"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "texts.off"
+METADATA_FILE = "metadata.json"
+TMP_SUFFIX = ".tmp"
+
+# Offsets are buffered in memory and flushed in blocks of this many rows
+_FLUSH_ROWS = 65536
+
+
+def _column_files(index: int) -> Tuple[str, str]:
+    """Return the data and offsets file names of a metadata column."""
+    return f"meta_{index}.bin", f"meta_{index}.off"
+
+
+class _BlobColumn:
+    """
+    Append-only column of variable-length byte values.
+    
+    Values are concatenated in a data file; an offsets file holds num_rows + 1
+    int64 positions so row i spans offsets[i]:offsets[i + 1].
+    """
+    
+    def __init__(self, data_path: str, offsets_path: str, start_row: int = 0):
+        self.data_path = data_path
+        self.offsets_path = offsets_path
+        self._data = open(data_path + TMP_SUFFIX, "wb")
+        self._offsets = open(offsets_path + TMP_SUFFIX, "wb")
+        self._pending = array("q")
+        self._size = 0
+        
+        # Rows written before this column existed are empty
+        self._pending.extend([0] * (start_row + 1))
+        self._flush_offsets()
+    
+    def append(self, value: Optional[bytes]):
+        """Append one row; None stores an empty value."""
+        if value:
+            self._data.write(value)
+            self._size += len(value)
+        self._pending.append(self._size)
+        if len(self._pending) >= _FLUSH_ROWS:
+            self._flush_offsets()
+    
+    def _flush_offsets(self):
+        self._pending.tofile(self._offsets)
+        self._pending = array("q")
+    
+    def close(self):
+        """Flush and move the files into place."""
+        self._flush_offsets()
+        self._data.close()
+        self._offsets.close()
+        os.replace(self.data_path + TMP_SUFFIX, self.data_path)
+        os.replace(self.offsets_path + TMP_SUFFIX, self.offsets_path)
+
+
+class DocstoreWriter:
+    """
+    Stream documents into the on-disk docstore format.
+    
+    Texts go into one blob addressed by offsets, and each metadata key gets
+    its own column of JSON-encoded values, so memory use does not depend on
+    the number of documents written. Files are written under temporary names
+    and only replace an existing store on close.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Start writing a docstore.
+        
+        Args:
+            path: Directory to write the docstore files to
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.num_rows = 0
+        self._ids = open(os.path.join(path, IDS_FILE) + TMP_SUFFIX, "w", encoding="utf-8")
+        self._texts = _BlobColumn(os.path.join(path, TEXTS_FILE),
+                                  os.path.join(path, TEXT_OFFSETS_FILE))
+        self._columns: Dict[str, _BlobColumn] = {}
+    
+    def add(self, doc_id: str, document: Document):
+        """
+        Append one document.
+        
+        Args:
+            doc_id: Docstore ID of the document
+            document: Document to store
+        """
+        self._ids.write(f"{doc_id}\n")
+        self._texts.append(document.page_content.encode("utf-8"))
+        
+        for key in document.metadata:
+            if key not in self._columns:
+                data_name, offsets_name = _column_files(len(self._columns))
+                self._columns[key] = _BlobColumn(os.path.join(self.path, data_name),
+                                                 os.path.join(self.path, offsets_name),
+                                                 start_row=self.num_rows)
+        
+        for key, column in self._columns.items():
+            if key in document.metadata:
+                column.append(json.dumps(document.metadata[key], ensure_ascii=False).encode("utf-8"))
+            else:
+                column.append(None)
+        
+        self.num_rows += 1
+    
+    def close(self):
+        """Finish writing and move the store into place."""
+        self._ids.close()
+        os.replace(os.path.join(self.path, IDS_FILE) + TMP_SUFFIX, os.path.join(self.path, IDS_FILE))
+        self._texts.close()
+        for column in self._columns.values():
+            column.close()
+        
+        # Drop columns left over from a previous store with more metadata keys
+        index = len(self._columns)
+        while os.path.exists(os.path.join(self.path, _column_files(index)[0])):
+            for name in _column_files(index):
+                os.remove(os.path.join(self.path, name))
+            index += 1
+        
+        # The header is written last, so a partial write is never loaded
+        header = {"num_rows": self.num_rows, "columns": list(self._columns)}
+        header_path = os.path.join(self.path, METADATA_FILE)
+        with open(header_path + TMP_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False)
+        os.replace(header_path + TMP_SUFFIX, header_path)
+
+
+def _map_bytes(path: str) -> np.ndarray:
+    """Memory-map a file as bytes; empty files cannot be mapped."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def _map_offsets(path: str) -> np.ndarray:
+    """Memory-map an offsets file as int64 positions."""
+    return np.memmap(path, dtype=np.int64, mode="r")
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """
+    Read-mostly docstore backed by memory-mapped files.
+    
+    Nothing but the ID list is read at load time; a Document is only
+    materialized when search() is called for it, which for retrieval means
+    the top-k hits of a query. Documents added or deleted after loading are
+    kept in memory until the store is written again.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open a docstore written by DocstoreWriter.
+        
+        Args:
+            path: Directory containing the docstore files
+        """
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        
+        with open(os.path.join(path, IDS_FILE), "r", encoding="utf-8") as f:
+            self.ids: List[str] = f.read().split("\n")[:header["num_rows"]]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        
+        self._texts = _map_bytes(os.path.join(path, TEXTS_FILE))
+        self._text_offsets = _map_offsets(os.path.join(path, TEXT_OFFSETS_FILE))
+        
+        self._columns = []
+        for index, key in enumerate(header["columns"]):
+            data_name, offsets_name = _column_files(index)
+            self._columns.append((
+                key,
+                _map_bytes(os.path.join(path, data_name)),
+                _map_offsets(os.path.join(path, offsets_name)),
+            ))
+        
+        self._added: Dict[str, Document] = {}
+        self._deleted: Set[str] = set()
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Check whether a complete docstore was written to a directory."""
+        return os.path.exists(os.path.join(path, METADATA_FILE))
+    
+    def _read_text(self, row: int) -> str:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        return self._texts[start:end].tobytes().decode("utf-8")
+    
+    def _read_value(self, column: int, row: int):
+        _, data, offsets = self._columns[column]
+        start, end = offsets[row], offsets[row + 1]
+        if start == end:
+            return None
+        return json.loads(data[start:end].tobytes().decode("utf-8"))
+    
+    def _read_metadata(self, row: int) -> Dict:
+        metadata = {}
+        for column, (key, data, offsets) in enumerate(self._columns):
+            if offsets[row] != offsets[row + 1]:
+                metadata[key] = self._read_value(column, row)
+        return metadata
+    
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Materialize a document by ID.
+        
+        Args:
+            search: ID of the document
+        
+        Returns:
+            Document if found, else an error message
+        """
+        if search in self._added:
+            return self._added[search]
+        row = self._rows.get(search)
+        if row is None or search in self._deleted:
+            return f"ID {search} not found."
+        return Document(page_content=self._read_text(row), metadata=self._read_metadata(row))
+    
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Add documents; they are kept in memory until the store is rewritten."""
+        overlapping = {
+            doc_id for doc_id in texts
+            if doc_id in self._added or (doc_id in self._rows and doc_id not in self._deleted)
+        }
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+    
+    def delete(self, ids: List) -> None:
+        """Delete documents by ID."""
+        for doc_id in ids:
+            if doc_id in self._added:
+                del self._added[doc_id]
+            elif doc_id in self._rows:
+                self._deleted.add(doc_id)
+    
+    def ids_by_source(self) -> Dict[str, Set[str]]:
+        """
+        Group document IDs by their source metadata without materializing texts.
+        
+        Returns:
+            Dictionary of source path to the set of IDs from that source
+        """
+        grouped: Dict[str, Set[str]] = {}
+        source_column = next(
+            (index for index, (key, _, _) in enumerate(self._columns) if key == "source"), None
+        )
+        
+        if source_column is not None:
+            for row, doc_id in enumerate(self.ids):
+                if doc_id not in self._deleted:
+                    source = os.path.normpath(str(self._read_value(source_column, row) or ""))
+                    grouped.setdefault(source, set()).add(doc_id)
+        
+        for doc_id, doc in self._added.items():
+            source = os.path.normpath(str(doc.metadata.get("source", "")))
+            grouped.setdefault(source, set()).add(doc_id)
+        
+        return grouped
+
+
+def write_docstore(path: str, documents: Iterable[Tuple[str, Document]]):
+    """
+    Write (ID, Document) pairs to a docstore directory.
+    
+    Args:
+        path: Directory to write the docstore files to
+        documents: Pairs of docstore ID and Document, in index order
+    """
+    writer = DocstoreWriter(path)
+    for doc_id, document in documents:
+        writer.add(doc_id, document)
+    writer.close()
+
+
+def iter_docstore(docstore: Docstore, ids: Iterable[str]) -> Iterator[Tuple[str, Document]]:
+    """
+    Read documents from any docstore in the order of the given IDs.
+    
+    Args:
+        docstore: Docstore to read from
+        ids: Docstore IDs, in index order
+    
+    Returns:
+        Iterator of (ID, Document) pairs
+    """
+    for doc_id in ids:
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+        yield doc_id, doc
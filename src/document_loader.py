@@ -3,15 +3,195 @@ Document loader module to process different file types.
 """
 import json
 import os
-from typing import Dict, List, Any, Union
+from typing import IO, Any, Dict, Iterator, List, Optional, Union
 
-import pandas as pd
 from langchain.schema import Document
-from langchain.document_loaders import TextLoader
 
 import config
 
 
+_PAPER_FIELDS = ["Judul", "Penulis", "URL", "Abstrak", "Publisher", "Tahun"]
+
+
+def iter_json_array(f: IO[str], buffer_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Parse a top-level JSON array incrementally, yielding one element at a time.
+    
+    Only the element being decoded and one read buffer are held in memory,
+    so arbitrarily large catalogue exports can be read in bounded memory.
+    
+    Args:
+        f: Text file positioned before the opening bracket
+        buffer_size: Number of characters read per step
+    
+    Returns:
+        Iterator over the array elements
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    expect = "start"  # then "first", "value" or "separator"
+    
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expect == "start":
+                if char != "[":
+                    raise ValueError("JSON document is not an array")
+                pos += 1
+                expect = "first"
+                continue
+            
+            if char == "]" and expect in ("first", "separator"):
+                return
+            
+            if expect == "separator":
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+                pos += 1
+                expect = "value"
+                continue
+            
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                end = None
+            
+            # An element is only complete once the separator after it has been
+            # read, otherwise a number cut at the buffer edge would be truncated
+            next_pos = end
+            while next_pos is not None and next_pos < len(buffer) and buffer[next_pos].isspace():
+                next_pos += 1
+            if end is not None and next_pos < len(buffer) and buffer[next_pos] in ",]":
+                yield element
+                pos = end
+                expect = "separator"
+                continue
+        
+        if eof:
+            if pos >= len(buffer):
+                raise ValueError("Unexpected end of JSON array")
+            raise ValueError("Malformed JSON array element")
+        
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = f.read(buffer_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def _paper_to_document(paper: Dict[str, Any], metadata: Dict[str, Any]) -> Optional[Document]:
+    """
+    Convert one paper or book record into a Document.
+    
+    Args:
+        paper: Record from the JSON file
+        metadata: Initial metadata (source and position of the record)
+    
+    Returns:
+        Document, or None if the record has no content
+    """
+    content = ""
+    
+    # Add title if available
+    if "Judul" in paper:
+        content += f"Judul: {paper['Judul']}\n\n"
+        metadata["title"] = paper["Judul"]
+    
+    # Add authors if available
+    if "Penulis" in paper:
+        if isinstance(paper["Penulis"], list):
+            authors = ", ".join(paper["Penulis"])
+        else:
+            authors = str(paper["Penulis"])
+        content += f"Penulis: {authors}\n\n"
+        metadata["authors"] = authors
+    
+    # Add URL if available
+    if "URL" in paper:
+        content += f"URL: {paper['URL']}\n\n"
+        metadata["url"] = paper["URL"]
+    
+    # Add abstract if available
+    if "Abstrak" in paper:
+        content += f"Abstrak: {paper['Abstrak']}\n\n"
+        metadata["has_abstract"] = True
+    
+    # Add publisher if available
+    if "Publisher" in paper:
+        content += f"Publisher: {paper['Publisher']}\n\n"
+        metadata["publisher"] = paper["Publisher"]
+    
+    # Add year if available
+    if "Tahun" in paper:
+        content += f"Tahun: {paper['Tahun']}\n\n"
+        metadata["year"] = paper["Tahun"]
+    
+    # Add other fields that might be relevant
+    for key, value in paper.items():
+        if key not in _PAPER_FIELDS:
+            if isinstance(value, (str, int, float, bool)):
+                metadata[key.lower()] = value
+                content += f"{key}: {value}\n\n"
+    
+    # Create document if content is not empty
+    if content.strip():
+        return Document(page_content=content, metadata=metadata)
+    return None
+
+
+def iter_json_papers(file_path: str) -> Iterator[Document]:
+    """
+    Stream a JSON file containing papers or books as LangChain documents.
+    
+    A top-level array is parsed incrementally, one record at a time. A
+    single paper object or a dictionary of papers keyed by ID is small by
+    nature and is loaded at once.
+    
+    Args:
+        file_path: Path to the JSON file
+    
+    Returns:
+        Iterator of LangChain Document objects
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        first_char = ""
+        while True:
+            first_char = f.read(1)
+            if not first_char or not first_char.isspace():
+                break
+        f.seek(0)
+        
+        if first_char == "[":
+            # If it's a list of papers
+            for i, paper in enumerate(iter_json_array(f)):
+                if isinstance(paper, dict):
+                    doc = _paper_to_document(paper, {"source": file_path, "index": i})
+                    if doc:
+                        yield doc
+            return
+        
+        papers_data = json.load(f)
+    
+    if isinstance(papers_data, dict):
+        # Check if it's a single paper object
+        if "Judul" in papers_data:
+            doc = _paper_to_document(papers_data, {"source": file_path})
+            if doc:
+                yield doc
+        else:
+            # It's a dictionary with papers as values (with keys as IDs)
+            for key, paper in papers_data.items():
+                if isinstance(paper, dict):
+                    doc = _paper_to_document(paper, {"source": file_path, "key": key})
+                    if doc:
+                        yield doc
+
+
 def load_json_papers(file_path: str) -> List[Document]:
     """
     Load JSON file containing papers data and convert to LangChain documents.
@@ -34,175 +214,7 @@ def load_json_papers(file_path: str) -> List[Document]:
         List of LangChain Document objects
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            papers_data = json.load(f)
-        
-        documents = []
-        
-        # Handle different possible structures of the JSON data
-        if isinstance(papers_data, list):
-            # If it's a list of papers
-            for i, paper in enumerate(papers_data):
-                if isinstance(paper, dict):
-                    # Extract content and metadata
-                    content = ""
-                    metadata = {"source": file_path, "index": i}
-                    
-                    # Add title if available
-                    if "Judul" in paper:
-                        content += f"Judul: {paper['Judul']}\n\n"
-                        metadata["title"] = paper["Judul"]
-                    
-                    # Add authors if available
-                    if "Penulis" in paper:
-                        if isinstance(paper["Penulis"], list):
-                            authors = ", ".join(paper["Penulis"])
-                        else:
-                            authors = str(paper["Penulis"])
-                        content += f"Penulis: {authors}\n\n"
-                        metadata["authors"] = authors
-                    
-                    # Add URL if available
-                    if "URL" in paper:
-                        content += f"URL: {paper['URL']}\n\n"
-                        metadata["url"] = paper["URL"]
-                    
-                    # Add abstract if available
-                    if "Abstrak" in paper:
-                        content += f"Abstrak: {paper['Abstrak']}\n\n"
-                        metadata["has_abstract"] = True
-                    
-                    # Add publisher if available
-                    if "Publisher" in paper:
-                        content += f"Publisher: {paper['Publisher']}\n\n"
-                        metadata["publisher"] = paper["Publisher"]
-                    
-                    # Add year if available
-                    if "Tahun" in paper:
-                        content += f"Tahun: {paper['Tahun']}\n\n"
-                        metadata["year"] = paper["Tahun"]
-                    
-                    # Add other fields that might be relevant
-                    for key, value in paper.items():
-                        if key not in ["Judul", "Penulis", "URL", "Abstrak", "Publisher", "Tahun"]:
-                            if isinstance(value, (str, int, float, bool)):
-                                metadata[key.lower()] = value
-                                content += f"{key}: {value}\n\n"
-                    
-                    # Create document if content is not empty
-                    if content.strip():
-                        doc = Document(page_content=content, metadata=metadata)
-                        documents.append(doc)
-        
-        elif isinstance(papers_data, dict):
-            # Handle case where the JSON is a single object or a dictionary with papers
-            
-            # Check if it's a single paper object
-            if "Judul" in papers_data:
-                # This is a single paper
-                paper = papers_data
-                content = ""
-                metadata = {"source": file_path}
-                
-                # Add title if available
-                if "Judul" in paper:
-                    content += f"Judul: {paper['Judul']}\n\n"
-                    metadata["title"] = paper["Judul"]
-                
-                # Add authors if available
-                if "Penulis" in paper:
-                    if isinstance(paper["Penulis"], list):
-                        authors = ", ".join(paper["Penulis"])
-                    else:
-                        authors = str(paper["Penulis"])
-                    content += f"Penulis: {authors}\n\n"
-                    metadata["authors"] = authors
-                
-                # Add URL if available
-                if "URL" in paper:
-                    content += f"URL: {paper['URL']}\n\n"
-                    metadata["url"] = paper["URL"]
-                
-                # Add abstract if available
-                if "Abstrak" in paper:
-                    content += f"Abstrak: {paper['Abstrak']}\n\n"
-                    metadata["has_abstract"] = True
-                
-                # Add publisher if available
-                if "Publisher" in paper:
-                    content += f"Publisher: {paper['Publisher']}\n\n"
-                    metadata["publisher"] = paper["Publisher"]
-                
-                # Add year if available
-                if "Tahun" in paper:
-                    content += f"Tahun: {paper['Tahun']}\n\n"
-                    metadata["year"] = paper["Tahun"]
-                
-                # Add other fields that might be relevant
-                for key, value in paper.items():
-                    if key not in ["Judul", "Penulis", "URL", "Abstrak", "Publisher", "Tahun"]:
-                        if isinstance(value, (str, int, float, bool)):
-                            metadata[key.lower()] = value
-                            content += f"{key}: {value}\n\n"
-                
-                # Create document if content is not empty
-                if content.strip():
-                    doc = Document(page_content=content, metadata=metadata)
-                    documents.append(doc)
-            else:
-                # It's a dictionary with papers as values (with keys as IDs)
-                for key, paper in papers_data.items():
-                    if isinstance(paper, dict):
-                        # Extract content and metadata
-                        content = ""
-                        metadata = {"source": file_path, "key": key}
-                        
-                        # Add title if available
-                        if "Judul" in paper:
-                            content += f"Judul: {paper['Judul']}\n\n"
-                            metadata["title"] = paper["Judul"]
-                        
-                        # Add authors if available
-                        if "Penulis" in paper:
-                            if isinstance(paper["Penulis"], list):
-                                authors = ", ".join(paper["Penulis"])
-                            else:
-                                authors = str(paper["Penulis"])
-                            content += f"Penulis: {authors}\n\n"
-                            metadata["authors"] = authors
-                        
-                        # Add URL if available
-                        if "URL" in paper:
-                            content += f"URL: {paper['URL']}\n\n"
-                            metadata["url"] = paper["URL"]
-                        
-                        # Add abstract if available
-                        if "Abstrak" in paper:
-                            content += f"Abstrak: {paper['Abstrak']}\n\n"
-                            metadata["has_abstract"] = True
-                        
-                        # Add publisher if available
-                        if "Publisher" in paper:
-                            content += f"Publisher: {paper['Publisher']}\n\n"
-                            metadata["publisher"] = paper["Publisher"]
-                        
-                        # Add year if available
-                        if "Tahun" in paper:
-                            content += f"Tahun: {paper['Tahun']}\n\n"
-                            metadata["year"] = paper["Tahun"]
-                        
-                        # Add other fields that might be relevant
-                        for field_key, value in paper.items():
-                            if field_key not in ["Judul", "Penulis", "URL", "Abstrak", "Publisher", "Tahun"]:
-                                if isinstance(value, (str, int, float, bool)):
-                                    metadata[field_key.lower()] = value
-                                    content += f"{field_key}: {value}\n\n"
-                        
-                        # Create document if content is not empty
-                        if content.strip():
-                            doc = Document(page_content=content, metadata=metadata)
-                            documents.append(doc)
-        
+        documents = list(iter_json_papers(file_path))
         print(f"Loaded {len(documents)} documents from JSON file")
         return documents
     
@@ -222,6 +234,7 @@ def load_text_file(file_path: str) -> List[Document]:
         List of LangChain Document objects
     """
     try:
+        from langchain.document_loaders import TextLoader
         loader = TextLoader(file_path, encoding="utf-8")
         documents = loader.load()
         
@@ -238,6 +251,88 @@ def load_text_file(file_path: str) -> List[Document]:
         return []
 
 
+def get_source_paths() -> List[str]:
+    """
+    Get the paths of all configured data sources.
+    
+    Returns:
+        List of file paths, JSON catalogues first
+    """
+    return [
+        config.PAPERS_JSON_PATH,
+        config.BUKU_JSON_PATH,
+        config.LIBRARY_INFO_PATH,
+        config.FASILITAS_PATH,
+        config.LAYANAN_PATH,
+        config.PROFIL_PATH,
+        config.SOP_PATH,
+    ]
+
+
+def load_source_documents(file_path: str) -> List[Document]:
+    """
+    Load a single data source, choosing the loader from the file extension.
+    
+    Args:
+        file_path: Path to a JSON or text file
+        
+    Returns:
+        List of LangChain Document objects
+    
+    Raises:
+        ValueError: If a JSON catalogue is malformed
+    """
+    return list(iter_source_documents(file_path))
+
+
+def iter_source_documents(file_path: str) -> Iterator[Document]:
+    """
+    Stream the documents of a single data source.
+    
+    JSON catalogues are parsed record by record; text files are small and
+    loaded at once.
+    
+    Args:
+        file_path: Path to a JSON or text file
+    
+    Returns:
+        Iterator of LangChain Document objects
+    
+    Raises:
+        ValueError: If a JSON catalogue is malformed. Some of its documents
+            may already have been yielded, so an index built from them must
+            not be saved as current.
+    """
+    if not os.path.exists(file_path):
+        print(f"Warning: Data file not found at {file_path}")
+        return
+    
+    if not file_path.lower().endswith(".json"):
+        yield from load_text_file(file_path)
+        return
+    
+    count = 0
+    try:
+        for doc in iter_json_papers(file_path):
+            count += 1
+            yield doc
+    except ValueError as e:
+        print(f"Error loading JSON file {file_path} after {count} documents: {e}")
+        raise
+    print(f"Loaded {count} documents from JSON file")
+
+
+def iter_all_documents() -> Iterator[Document]:
+    """
+    Stream all documents from the configured data sources.
+    
+    Returns:
+        Iterator of LangChain Document objects
+    """
+    for path in get_source_paths():
+        yield from iter_source_documents(path)
+
+
 def load_all_documents() -> List[Document]:
     """
     Load all documents from the configured data sources.
@@ -1,27 +1,360 @@
 """
 Embedding module to generate embeddings for documents.
 """
-from typing import List
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 
-from langchain.schema import Document
-from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
 
+from src.embedding_cache import get_embedding_cache
 import config
 
+if TYPE_CHECKING:
+    from langchain.embeddings import HuggingFaceEmbeddings
 
-def get_embedding_model():
+
+class EmbeddingProvider(Embeddings):
+    """
+    Process-wide embedding model that is loaded lazily on first use.
+    
+    Indexing, retrieval and evaluation all share one provider, so the
+    sentence-transformer is loaded at most once per process. Loading an
+    index does not load the model; the first embedding call does.
+    """
+    
+    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None):
+        """
+        Initialize the provider without loading the model.
+        
+        Args:
+            model_name: Hugging Face model ID (default: from config)
+            device: Torch device to run the model on (default: from config)
+        """
+        self.model_name = model_name or config.EMBEDDING_MODEL_ID
+        self.device = device or config.DEVICE
+        self.load_time: Optional[float] = None
+        self.memory_bytes: Optional[int] = None
+        self._model: Optional["HuggingFaceEmbeddings"] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def model(self) -> "HuggingFaceEmbeddings":
+        """The underlying HuggingFaceEmbeddings model, loaded on first access."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the model has been loaded."""
+        return self._model is not None
+    
+    def _load(self) -> "HuggingFaceEmbeddings":
+        """Load the sentence-transformer and record load time and memory."""
+        from langchain.embeddings import HuggingFaceEmbeddings
+        
+        print(f"Loading embedding model {self.model_name} on {self.device}...")
+        start_time = time.time()
+        
+        model = HuggingFaceEmbeddings(
+            model_name=self.model_name,
+            model_kwargs={'device': self.device}
+        )
+        
+        self.load_time = time.time() - start_time
+        self.memory_bytes = sum(
+            param.numel() * param.element_size() for param in model.client.parameters()
+        )
+        print(f"Embedding model loaded in {self.load_time:.2f} seconds "
+              f"({self.memory_bytes / 1e6:.1f} MB of weights)")
+        return model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of document texts."""
+        return self.model.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query text."""
+        return self.model.embed_query(text)
+    
+    def unload(self):
+        """Release the model; it is loaded again on the next embedding call."""
+        with self._lock:
+            self._model = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report the state of the provider.
+        
+        Returns:
+            Dictionary with model name, device, load state, load time and memory
+        """
+        return {
+            "model_name": self.model_name,
+            "device": self.device,
+            "loaded": self.is_loaded,
+            "load_time_s": self.load_time,
+            "memory_mb": self.memory_bytes / 1e6 if self.memory_bytes is not None else None,
+        }
+
+
+_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_embedding_model() -> EmbeddingProvider:
     """
-    Initialize and return the embedding model.
+    Return the process-wide embedding provider, creating it on first call.
     
     Returns:
-        HuggingFaceEmbeddings model
+        Shared EmbeddingProvider instance
     """
-    model_kwargs = {'device': config.DEVICE}
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = EmbeddingProvider()
+    return _provider
+
+
+def release_embedding_model():
+    """Unload the shared embedding model to free its memory."""
+    if _provider is not None:
+        _provider.unload()
+
+
+class ThroughputReporter:
+    """
+    Print a live chunks/sec and ETA readout while embedding.
+    """
+    
+    def __init__(self, total: Optional[int] = None, label: str = "Embedded"):
+        """
+        Initialize the reporter.
+        
+        Args:
+            total: Number of items that will be processed, or None for a stream
+                of unknown length (no ETA is shown)
+            label: Verb shown in front of the counter
+        """
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.start_time = time.time()
+        self._last_report = 0.0
+    
+    def update(self, count: int):
+        """Record that count more items were processed and refresh the readout."""
+        self.done += count
+        now = time.time()
+        if now - self._last_report < 0.5 and (self.total is None or self.done < self.total):
+            return
+        self._last_report = now
+        elapsed = now - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        if self.total is None:
+            sys.stdout.write(f"\r{self.label} {self.done} chunks ({rate:.1f} chunks/s)")
+        else:
+            eta = (self.total - self.done) / rate if rate > 0 else 0.0
+            sys.stdout.write(f"\r{self.label} {self.done}/{self.total} chunks "
+                             f"({rate:.1f} chunks/s, ETA {eta:.0f}s)")
+        sys.stdout.flush()
     
-    # Initialize the embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name=config.EMBEDDING_MODEL_ID,
-        model_kwargs=model_kwargs
+    def finish(self):
+        """End the readout line and print the overall throughput."""
+        elapsed = time.time() - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        sys.stdout.write("\n")
+        print(f"{self.label} {self.done} chunks in {elapsed:.2f} seconds ({rate:.1f} chunks/s)")
+
+
+@contextmanager
+def _worker_threads(threads: int) -> Iterator[None]:
+    """Limit the torch threads of spawned worker processes to avoid oversubscription."""
+    previous = os.environ.get("OMP_NUM_THREADS")
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ["OMP_NUM_THREADS"]
+        else:
+            os.environ["OMP_NUM_THREADS"] = previous
+
+
+# Worker pool kept alive across calls by embedding_pool()
+_pool: Optional[Dict[str, Any]] = None
+
+
+def _pool_enabled(client: Any, workers: int) -> bool:
+    """Whether the client can shard work across CPU worker processes."""
+    return (
+        workers > 1
+        and not str(config.DEVICE).startswith("cuda")
+        and hasattr(client, "start_multi_process_pool")
     )
+
+
+@contextmanager
+def embedding_pool(workers: Optional[int] = None) -> Iterator[None]:
+    """
+    Keep one set of embedding worker processes alive for a series of calls.
+    
+    A streaming index build embeds one batch at a time; inside this context
+    every embed_texts call reuses the same workers instead of starting new
+    ones for each batch.
+    
+    Args:
+        workers: Number of CPU worker processes (default: from config)
+    """
+    global _pool
+    workers = workers or config.EMBEDDING_WORKERS
+    client = getattr(get_embedding_model().model, "client", None)
+    
+    if _pool is not None or not _pool_enabled(client, workers):
+        yield
+        return
+    
+    print(f"Starting {workers} embedding worker processes")
+    with _worker_threads(max(1, config.CPU_CORES // workers)):
+        _pool = {"pool": client.start_multi_process_pool(["cpu"] * workers), "workers": workers}
+    try:
+        yield
+    finally:
+        pool, _pool = _pool["pool"], None
+        client.stop_multi_process_pool(pool)
+
+
+def embed_texts(texts: List[str], batch_size: Optional[int] = None,
+                workers: Optional[int] = None,
+                reporter: Optional[ThroughputReporter] = None) -> List[List[float]]:
+    """
+    Embed a corpus in batches, sharded across CPU worker processes.
+    
+    Identical texts are embedded once, and texts already in the on-disk
+    embedding cache are not embedded at all. Vectors match what the shared
+    provider's embed_documents would return for the same texts.
+    
+    Args:
+        texts: Texts to embed
+        batch_size: Texts per forward pass (default: from config)
+        workers: Number of CPU worker processes (default: from config)
+        reporter: Shared progress readout for a series of calls; per-call
+            summaries are not printed when given
+        
+    Returns:
+        List of embeddings, one for each input text
+    """
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    workers = workers or config.EMBEDDING_WORKERS
+    
+    # Embed every distinct text once
+    unique_positions: Dict[str, int] = {}
+    unique_texts = []
+    for text in texts:
+        if text not in unique_positions:
+            unique_positions[text] = len(unique_texts)
+            unique_texts.append(text)
+    
+    if len(unique_texts) < len(texts) and reporter is None:
+        print(f"Embedding {len(unique_texts)} unique chunks out of {len(texts)}")
+    
+    if not config.USE_EMBEDDING_CACHE:
+        vectors = _embed_unique(unique_texts, batch_size, workers, reporter)
+        if reporter is not None:
+            reporter.update(len(texts) - len(unique_texts))
+        return [vectors[unique_positions[text]] for text in texts]
+    
+    # Only compute embeddings the on-disk cache has never seen
+    cache = get_embedding_cache()
+    hashes = [cache.text_hash(text) for text in unique_texts]
+    cached = cache.get_many(hashes)
+    missing = [i for i, key in enumerate(hashes) if key not in cached]
+    if reporter is None:
+        print(f"Embedding cache: {len(cached)} hits, {len(missing)} misses")
+    
+    computed = _embed_unique([unique_texts[i] for i in missing], batch_size, workers, reporter)
+    cache.put_many([hashes[i] for i in missing], computed)
+    if reporter is not None:
+        reporter.update(len(texts) - len(missing))
+    for i, vector in zip(missing, computed):
+        cached[hashes[i]] = vector
+    
+    return [cached[hashes[unique_positions[text]]] for text in texts]
+
+
+def _embed_unique(texts: List[str], batch_size: int, workers: int,
+                  shared_reporter: Optional[ThroughputReporter] = None) -> List[List[float]]:
+    """Embed distinct texts with the shared model, reporting throughput."""
+    if not texts:
+        return []
+    
+    model = get_embedding_model().model
+    client = getattr(model, "client", None)
+    reporter = shared_reporter or ThroughputReporter(len(texts))
+    vectors: List[List[float]] = []
+    
+    # Models other than sentence-transformers fall back to their own batching
+    if client is None or not hasattr(client, "encode"):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors.extend(model.embed_documents(batch))
+            reporter.update(len(batch))
+        if shared_reporter is None:
+            reporter.finish()
+        return vectors
+    
+    # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+    texts = [text.replace("\n", " ") for text in texts]
+    encode_kwargs = dict(getattr(model, "encode_kwargs", {}) or {})
+    encode_kwargs.pop("batch_size", None)
+    encode_kwargs.pop("show_progress_bar", None)
+    
+    if _pool is not None:
+        vectors = _encode_with_pool(client, _pool["pool"], texts, batch_size,
+                                    _pool["workers"], encode_kwargs, reporter)
+    elif _pool_enabled(client, workers) and len(texts) >= batch_size * workers:
+        print(f"Embedding with {workers} worker processes, batch size {batch_size}")
+        with _worker_threads(max(1, config.CPU_CORES // workers)):
+            pool = client.start_multi_process_pool(["cpu"] * workers)
+        try:
+            vectors = _encode_with_pool(client, pool, texts, batch_size, workers,
+                                        encode_kwargs, reporter)
+        finally:
+            client.stop_multi_process_pool(pool)
+    else:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors.extend(client.encode(batch, batch_size=batch_size, **encode_kwargs).tolist())
+            reporter.update(len(batch))
+    
+    if shared_reporter is None:
+        reporter.finish()
+    return vectors
+
+
+def _encode_with_pool(client: Any, pool: Dict[str, Any], texts: List[str], batch_size: int,
+                      workers: int, encode_kwargs: Dict[str, Any],
+                      reporter: ThroughputReporter) -> List[List[float]]:
+    """Encode texts on a sentence-transformers multi-process pool."""
+    vectors: List[List[float]] = []
+    
+    # Hand the pool several batches per worker at a time so the readout stays live
+    step = batch_size * workers * 4
+    for start in range(0, len(texts), step):
+        shard = texts[start:start + step]
+        embeddings = client.encode_multi_process(
+            shard, pool,
+            batch_size=batch_size,
+            normalize_embeddings=encode_kwargs.get("normalize_embeddings", False),
+        )
+        vectors.extend(embeddings.tolist())
+        reporter.update(len(shard))
     
-    return embeddings
\ No newline at end of file
+    return vectors
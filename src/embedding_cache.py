@@ -0,0 +1,182 @@
+"""
+Embedding cache module to persist chunk embeddings across index builds.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of embeddings.
+    
+    Entries are keyed by the embedding model ID and the SHA-256 of the chunk
+    text. Vectors are appended to a raw float32 file that is read through a
+    memory map; a text file holds one hash per row. Changing the chunk
+    settings or deleting the index therefore only costs embeddings for chunk
+    texts that were never seen before.
+    """
+    
+    VECTORS_FILE = "vectors.f32"
+    KEYS_FILE = "keys.txt"
+    META_FILE = "meta.json"
+    
+    def __init__(self, cache_dir: Optional[str] = None, model_name: Optional[str] = None):
+        """
+        Open (or create) the cache for a model.
+        
+        Args:
+            cache_dir: Root directory of the cache (default: from config)
+            model_name: Embedding model ID the vectors belong to (default: from config)
+        """
+        self.model_name = model_name or config.EMBEDDING_MODEL_ID
+        model_slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", self.model_name)
+        self.path = os.path.join(cache_dir or config.EMBEDDING_CACHE_DIR, model_slug)
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Return the cache key of a chunk text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+    
+    def _load(self):
+        """Read the hash index and map the vector file."""
+        meta_path = self._file(self.META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        
+        keys_path = self._file(self.KEYS_FILE)
+        vectors_path = self._file(self.VECTORS_FILE)
+        for path in (keys_path, vectors_path):
+            # A crash right after the meta file was written leaves no data files
+            open(path, "ab").close()
+        with open(keys_path, "rb") as f:
+            # A key without its newline was cut off mid-write
+            keys = f.read().split(b"\n")[:-1]
+        
+        # put_many appends vectors before keys, so a crash between the two
+        # appends leaves vectors without keys, and a crash during an append
+        # leaves a partial row or key. Both files are cut back to the rows
+        # they have in common, so the next append numbers its rows from the
+        # end of the vector file.
+        row_bytes = self.dim * 4
+        num_rows = min(len(keys), os.path.getsize(vectors_path) // row_bytes)
+        if os.path.getsize(vectors_path) != num_rows * row_bytes:
+            os.truncate(vectors_path, num_rows * row_bytes)
+        keys_bytes = sum(len(key) + 1 for key in keys[:num_rows])
+        if os.path.getsize(keys_path) != keys_bytes:
+            os.truncate(keys_path, keys_bytes)
+        
+        self._rows = {key.decode("utf-8"): row for row, key in enumerate(keys[:num_rows])}
+        self._map(num_rows)
+    
+    def _map(self, num_rows: int):
+        """Memory-map the first num_rows vectors."""
+        if num_rows == 0:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(self._file(self.VECTORS_FILE), dtype=np.float32,
+                                  mode="r", shape=(num_rows, self.dim))
+    
+    def all_vectors(self) -> np.ndarray:
+        """
+        Return every cached vector as a read-only memory-mapped array.
+        
+        Returns:
+            float32 array of shape (n, dim)
+        """
+        if self._vectors is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._vectors
+    
+    def get_many(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors.
+        
+        Args:
+            hashes: Cache keys from text_hash
+            
+        Returns:
+            Dictionary of the keys that were found and their vectors
+        """
+        found = {}
+        if self._vectors is None:
+            return found
+        for key in hashes:
+            row = self._rows.get(key)
+            if row is not None:
+                found[key] = self._vectors[row].tolist()
+        return found
+    
+    def put_many(self, hashes: List[str], vectors: List[List[float]]):
+        """
+        Append new vectors to the cache.
+        
+        Args:
+            hashes: Cache keys from text_hash
+            vectors: Embeddings, one per key
+        """
+        if not hashes:
+            return
+        
+        with self._lock:
+            new = [(key, vector) for key, vector in zip(hashes, vectors) if key not in self._rows]
+            if not new:
+                return
+            
+            array = np.asarray([vector for _, vector in new], dtype=np.float32)
+            if self.dim is None:
+                self.dim = array.shape[1]
+                os.makedirs(self.path, exist_ok=True)
+                with open(self._file(self.META_FILE), "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            
+            # Vectors first, keys second: a key is only trusted once its row exists
+            with open(self._file(self.VECTORS_FILE), "ab") as f:
+                array.tofile(f)
+            with open(self._file(self.KEYS_FILE), "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key, _ in new))
+            
+            start = len(self._rows)
+            for offset, (key, _) in enumerate(new):
+                self._rows[key] = start + offset
+            self._map(len(self._rows))
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Return the process-wide embedding cache for the configured model.
+    
+    Returns:
+        Shared EmbeddingCache instance
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
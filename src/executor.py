@@ -0,0 +1,244 @@
+"""
+Executor module to run the blocking RAG stages off the API event loop.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from src.chatbot import LlamaRagChatbot
+from src.model_pool import ModelPoolBusy
+from src.options import QueryOptions
+import config
+
+
+class ExecutorBusy(ModelPoolBusy):
+    """Raised when a stage already has as many jobs as it may run and queue."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a limit on running plus waiting jobs.
+    
+    Jobs beyond max_workers + max_pending are rejected with ExecutorBusy
+    instead of growing an unbounded backlog.
+    """
+    
+    def __init__(self, name: str, max_workers: int, max_pending: int = 0):
+        """
+        Create the thread pool.
+        
+        Args:
+            name: Prefix of the worker thread names
+            max_workers: Number of worker threads
+            max_pending: Number of jobs that may wait for a worker
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_jobs = max_workers + max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._completed = 0
+        self._rejected = 0
+    
+    def _release(self, _future):
+        with self._lock:
+            self._jobs -= 1
+            self._completed += 1
+    
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking function in a worker thread and await its result.
+        
+        The job keeps its slot until the function returns, even if the
+        awaiting request is cancelled.
+        
+        Raises:
+            ExecutorBusy: If the executor is full
+        """
+        with self._lock:
+            if self._jobs >= self.max_jobs:
+                self._rejected += 1
+                raise ExecutorBusy(f"{self.name} is full ({self._jobs} jobs)")
+            self._jobs += 1
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report executor usage.
+        
+        Returns:
+            Dictionary with the worker count, jobs in flight and job counts
+        """
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_jobs": self.max_jobs,
+                "jobs": self._jobs,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+    
+    def shutdown(self):
+        """Stop accepting jobs and let the running ones finish."""
+        self._executor.shutdown(wait=False)
+
+
+class RagStages:
+    """
+    Awaitable retrieval and generation stages of a chatbot.
+    
+    Each stage runs in its own bounded executor, so the event loop keeps
+    serving health checks while embeddings, FAISS searches and generations
+    run, and queries waiting for a model replica do not hold up retrieval
+    for the next ones.
+    """
+    
+    def __init__(self, chatbot: LlamaRagChatbot, retrieval_workers: Optional[int] = None,
+                 generation_workers: Optional[int] = None):
+        """
+        Create the stage executors.
+        
+        Args:
+            chatbot: Chatbot whose stages are run
+            retrieval_workers: Threads for retrieval (default: from config)
+            generation_workers: Threads for generation (default: from config)
+        """
+        self.chatbot = chatbot
+        self.retrieval = BoundedExecutor("retrieval", retrieval_workers or config.RETRIEVAL_WORKERS,
+                                         config.RETRIEVAL_QUEUE_SIZE)
+        # Admission to generation is decided by the model pool's queue, so jobs never wait here
+        self.generation = BoundedExecutor("generation", generation_workers or config.GENERATION_WORKERS)
+    
+    async def retrieve(self, query: str, options: Optional[QueryOptions] = None,
+                       session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieval stage: answer from the catalogue or cache, or retrieve documents and build the prompt.
+        
+        Args:
+            query: The user's question
+            options: Language, retrieval and generation settings
+            session_id: Chat session the query belongs to
+        
+        Returns:
+            Result of LlamaRagChatbot.prepare_query
+        """
+        return await self.retrieval.run(self.chatbot.prepare_query, query, options, session_id)
+    
+    async def retrieve_batch(self, queries: List[str], options: Optional[QueryOptions] = None,
+                             session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieval stage of a batch: one embedding pass and one index search for all queries.
+        
+        Returns:
+            Result of LlamaRagChatbot.prepare_queries
+        """
+        return await self.retrieval.run(self.chatbot.prepare_queries, queries, options, session_id)
+    
+    async def search(self, query: str, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Retrieval without generation: the scored documents for a query.
+        
+        Returns:
+            Result of DocumentRetriever.retrieve_with_scores
+        """
+        return await self.retrieval.run(self.chatbot.retriever.retrieve_with_scores, query, top_k)
+    
+    async def generate(self, prepared: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Generation stage: generate the answer to a prepared query.
+        
+        Args:
+            prepared: Result of retrieve
+            deadline: time.monotonic() by which a model replica must be free
+        
+        Returns:
+            Dictionary containing the response and related information
+        """
+        return await self.generation.run(self.chatbot.answer_prepared, prepared, deadline=deadline)
+    
+    async def stream(self, prepared: Dict[str, Any],
+                     deadline: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generation stage of a stream: the "token" events and the "end" event.
+        
+        The whole generation runs as one job, which hands events to the
+        event loop as they are produced. Closing the iterator, e.g. when the
+        client disconnects, stops generation after the current token.
+        
+        Args:
+            prepared: Result of retrieve
+            deadline: time.monotonic() by which a model replica must be free
+        
+        Returns:
+            Async iterator of event dictionaries with an "event" key
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        
+        def produce():
+            for event in self.chatbot.stream_prepared(prepared, deadline=deadline):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        
+        job = asyncio.ensure_future(self.generation.run(produce))
+        job.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            # Raises the error of a failed generation
+            await job
+        finally:
+            stop.set()
+    
+    async def generate_batch(self, prepared: List[Dict[str, Any]]) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Generation stage of a batch, yielding answers as they finish.
+        
+        Only as many answers as there are model replicas are generated at a
+        time, so a large batch does not fill the pool's queue and other
+        requests keep their place in it.
+        
+        Args:
+            prepared: Result of retrieve_batch
+        
+        Returns:
+            Async iterator of (index, result) pairs, where the result is the
+            ModelPoolBusy error if no replica was available
+        """
+        slots = asyncio.Semaphore(self.chatbot.generation_workers)
+        
+        async def answer(index: int, item: Dict[str, Any]) -> Tuple[int, Any]:
+            if item["answered"]:
+                return index, self.chatbot.answer_prepared(item)
+            async with slots:
+                try:
+                    return index, await self.generate(item)
+                except ModelPoolBusy as e:
+                    return index, e
+        
+        tasks = [asyncio.ensure_future(answer(index, item)) for index, item in enumerate(prepared)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report the usage of both stage executors."""
+        return {"retrieval": self.retrieval.stats(), "generation": self.generation.stats()}
+    
+    def shutdown(self):
+        """Shut down both stage executors."""
+        self.retrieval.shutdown()
+        self.generation.shutdown()
@@ -2,53 +2,271 @@
 Indexing module to create and manage FAISS vector indexes.
 """
 import os
-from typing import List, Optional
+import threading
+import uuid
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 
-from src.embedding import get_embedding_model
+from src.docstore import DocstoreWriter, MmapDocstore, iter_docstore, write_docstore
+from src.document_loader import get_source_paths
+from src.embedding import ThroughputReporter, embed_texts, embedding_pool, get_embedding_model
+from src.manifest import MANIFEST_FILENAME, build_manifest, is_index_current, save_manifest
+from src.vector_index import apply_search_params, build_faiss_index, mmap_flags, supports_removal
 import config
 
 
-def create_faiss_index(documents: List[Document], save_path: Optional[str] = None) -> FAISS:
+FAISS_INDEX_FILE = "index.faiss"
+
+
+def create_faiss_index(documents: Iterable[Document], save_path: Optional[str] = None) -> FAISS:
     """
     Create a FAISS index from documents.
     
+    Documents are consumed as a stream and embedded in batches. With a save
+    path each batch goes straight to the on-disk docstore, so memory use
+    stays bounded by the batch size and the vectors themselves. Approximate
+    index types buffer the first FAISS_TRAIN_SIZE vectors for training.
+    
     Args:
-        documents: List of Document objects to index
+        documents: Iterable of Document objects to index
         save_path: Optional path to save the index
         
     Returns:
         FAISS vector store
     """
     embedding_model = get_embedding_model()
+    train_size = config.FAISS_TRAIN_SIZE if config.FAISS_INDEX_TYPE.startswith("ivf") else 1
     
-    # Create the FAISS vector store
-    vectorstore = FAISS.from_documents(documents, embedding_model)
-    
-    # Save the index if a path is provided
+    writer = None
+    docstore = InMemoryDocstore()
     if save_path:
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        vectorstore.save_local(save_path)
-        print(f"Saved FAISS index to {save_path}")
+        os.makedirs(save_path, exist_ok=True)
+        _remove_manifest(save_path)
+        writer = DocstoreWriter(save_path)
+    
+    index = None
+    pending: List[np.ndarray] = []
+    ids: List[str] = []
+    reporter = ThroughputReporter(label="Indexed")
+    
+    with embedding_pool():
+        for batch in _batched(documents, config.INDEX_BUILD_BATCH_SIZE):
+            vectors = np.asarray(
+                embed_texts([doc.page_content for doc in batch], reporter=reporter),
+                dtype=np.float32,
+            )
+            batch_ids = [doc.metadata.get("chunk_id") or str(uuid.uuid4()) for doc in batch]
+            if writer:
+                for doc_id, doc in zip(batch_ids, batch):
+                    writer.add(doc_id, doc)
+            else:
+                docstore.add(dict(zip(batch_ids, batch)))
+            ids.extend(batch_ids)
+    
+            # Approximate indexes are trained once enough vectors have been seen
+            if index is not None:
+                index.add(vectors)
+                continue
+            pending.append(vectors)
+            if sum(len(block) for block in pending) >= train_size:
+                index = _train_and_add(pending)
+                pending = []
     
-    return vectorstore
+    if index is None:
+        if not pending:
+            raise ValueError("No documents to index")
+        index = _train_and_add(pending)
+    reporter.finish()
+    
+    if not writer:
+        return FAISS(embedding_model, index, docstore, dict(enumerate(ids)))
+    
+    _write_faiss_file(index, save_path)
+    writer.close()
+    save_manifest(build_manifest(get_source_paths()), save_path)
+    print(f"Saved FAISS index to {save_path}")
+    
+    return FAISS(embedding_model, index, MmapDocstore(save_path), dict(enumerate(ids)))
+
+
+def _batched(items: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    """Group an iterable into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _train_and_add(blocks: List[np.ndarray]) -> faiss.Index:
+    """Build the configured index type from buffered vectors and add them."""
+    vectors = np.concatenate(blocks)
+    index = build_faiss_index(vectors)
+    index.add(vectors)
+    return index
 
 
-def load_faiss_index(load_path: str) -> Optional[FAISS]:
+def _remove_manifest(save_path: str):
+    """Invalidate a persisted index before it is overwritten."""
+    manifest_path = os.path.join(save_path, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+
+def _write_faiss_file(index: faiss.Index, save_path: str):
+    """Atomically write the raw FAISS index."""
+    index_path = os.path.join(save_path, FAISS_INDEX_FILE)
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+
+
+def save_faiss_index(vectorstore: FAISS, save_path: str):
+    """
+    Save a FAISS index to disk together with its manifest.
+    
+    The raw FAISS index is written with faiss.write_index and the documents
+    go to a memory-mapped docstore, so no pickle is involved. The manifest
+    is removed first and written last, so an interrupted save triggers a
+    full rebuild on the next startup.
+    
+    Args:
+        vectorstore: FAISS vector store to persist
+        save_path: Directory to save the index in
+    """
+    os.makedirs(save_path, exist_ok=True)
+    _remove_manifest(save_path)
+    _write_faiss_file(vectorstore.index, save_path)
+    
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    write_docstore(save_path, iter_docstore(vectorstore.docstore, ids))
+    
+    save_manifest(build_manifest(get_source_paths()), save_path)
+    print(f"Saved FAISS index to {save_path}")
+
+
+def _chunk_ids(documents: List[Document]) -> Optional[List[str]]:
+    """Return the chunk IDs of the documents, or None if any chunk lacks one."""
+    ids = [doc.metadata.get("chunk_id") for doc in documents]
+    if any(chunk_id is None for chunk_id in ids):
+        return None
+    return ids
+
+
+def _ids_by_source(vectorstore: FAISS) -> Dict[str, Set[str]]:
+    """Group the docstore IDs held by the index by their source path."""
+    if isinstance(vectorstore.docstore, MmapDocstore):
+        return vectorstore.docstore.ids_by_source()
+    
+    grouped = defaultdict(set)
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            grouped[os.path.normpath(str(doc.metadata.get("source", "")))].add(doc_id)
+    return grouped
+
+
+def update_faiss_index(vectorstore: FAISS, chunks: List[Document], sources: List[str],
+                       save_path: Optional[str] = None,
+                       background: bool = True) -> Optional[threading.Thread]:
+    """
+    Incrementally update an index for a set of changed sources.
+    
+    Only chunks whose IDs are not in the index yet are embedded. Vectors of
+    chunks that disappeared from the given sources are deleted by ID, which
+    also compacts the FAISS arrays. Sources that are not listed are left
+    untouched.
+    
+    Args:
+        vectorstore: FAISS vector store loaded from disk
+        chunks: Current chunks of the changed sources
+        sources: Paths of the new, modified or removed sources
+        save_path: Optional path to save the updated index
+        background: Save the index in a background thread instead of blocking
+        
+    Returns:
+        The background save thread, or None if the save was not deferred
+    """
+    ids_by_source = _ids_by_source(vectorstore)
+    indexed_ids = set()
+    for source in sources:
+        indexed_ids |= ids_by_source.get(os.path.normpath(source), set())
+    
+    current_ids = {chunk.metadata["chunk_id"] for chunk in chunks}
+    new_chunks = [chunk for chunk in chunks if chunk.metadata["chunk_id"] not in indexed_ids]
+    stale_ids = indexed_ids - current_ids
+    
+    print(f"Incremental update: {len(new_chunks)} new chunks to embed, "
+          f"{len(stale_ids)} stale vectors to delete, "
+          f"{len(indexed_ids) - len(stale_ids)} unchanged")
+    
+    if stale_ids:
+        if not supports_removal(vectorstore.index):
+            raise ValueError(f"{type(vectorstore.index).__name__} does not support deleting vectors")
+        vectorstore.delete(list(stale_ids))
+    if new_chunks:
+        texts = [chunk.page_content for chunk in new_chunks]
+        vectorstore.add_embeddings(
+            list(zip(texts, embed_texts(texts))),
+            metadatas=[chunk.metadata for chunk in new_chunks],
+            ids=[chunk.metadata["chunk_id"] for chunk in new_chunks],
+        )
+    
+    if not save_path:
+        return None
+    if not background:
+        save_faiss_index(vectorstore, save_path)
+        return None
+    
+    # Writing the compacted index does not block serving; the process waits
+    # for this non-daemon thread before exiting
+    thread = threading.Thread(target=save_faiss_index, args=(vectorstore, save_path),
+                              name="faiss-index-save")
+    thread.start()
+    return thread
+
+
+def load_faiss_index(load_path: str, mmap: bool = False) -> Optional[FAISS]:
     """
     Load a FAISS index from disk.
     
+    A memory-mapped index is read-only, so it is only used for serving: the
+    vectors (the inverted lists of IVF indexes) stay in the page cache, which
+    holds one copy for every process that maps the file, instead of each
+    process reading its own copy into memory.
+    
     Args:
         load_path: Path to the saved index
+        mmap: Memory-map the vectors read-only instead of reading them
         
     Returns:
         FAISS vector store or None if loading fails
     """
+    index_path = os.path.join(load_path, FAISS_INDEX_FILE)
+    if not os.path.exists(index_path) or not MmapDocstore.exists(load_path):
+        print(f"No FAISS index found at {load_path}")
+        return None
+    
     try:
-        embedding_model = get_embedding_model()
-        vectorstore = FAISS.load_local(load_path, embedding_model)
+        index = faiss.read_index(index_path, mmap_flags(index_path) if mmap else 0)
+        apply_search_params(index)
+        docstore = MmapDocstore(load_path)
+        if index.ntotal != len(docstore.ids):
+            raise ValueError(f"index has {index.ntotal} vectors but docstore has {len(docstore.ids)} documents")
+        
+        vectorstore = FAISS(
+            get_embedding_model(),
+            index,
+            docstore,
+            dict(enumerate(docstore.ids)),
+        )
         print(f"Loaded FAISS index from {load_path}")
         return vectorstore
     except Exception as e:
@@ -56,24 +274,27 @@ def load_faiss_index(load_path: str) -> Optional[FAISS]:
         return None
 
 
-def get_or_create_index(documents: Optional[List[Document]] = None) -> FAISS:
+def get_or_create_index(documents: Optional[Iterable[Document]] = None) -> FAISS:
     """
     Get existing FAISS index or create a new one.
     
     Args:
-        documents: List of Document objects to index if creating a new index
+        documents: List or stream of Document objects to index if creating a new index
         
     Returns:
         FAISS vector store
     """
-    if os.path.exists(config.FAISS_INDEX_PATH):
-        # Try to load existing index
-        index = load_faiss_index(config.FAISS_INDEX_PATH)
+    # Reuse the persisted index when it was built from the current sources,
+    # or when there is nothing to rebuild it from
+    if os.path.exists(config.FAISS_INDEX_PATH) and (
+        documents is None or is_index_current(config.FAISS_INDEX_PATH, get_source_paths())
+    ):
+        index = load_faiss_index(config.FAISS_INDEX_PATH, mmap=config.FAISS_MMAP)
         if index:
             return index
     
-    # If loading fails or index doesn't exist, create a new one
-    if documents:
+    # If loading fails, the index is stale or doesn't exist, create a new one
+    if documents is not None:
         print("Creating new FAISS index...")
         return create_faiss_index(documents, config.FAISS_INDEX_PATH)
     else:
@@ -0,0 +1,366 @@
+"""
+llama.cpp backend module for speculative decoding with llama-cpp-python.
+"""
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import config
+
+
+# Recent tokens penalized for repetition, the same window as llama.cpp and ctransformers
+REPEAT_LAST_N = 64
+
+
+class SpeculationStats:
+    """
+    Counts of draft tokens proposed and accepted by the main model.
+    
+    Attributes:
+        proposed: Draft tokens scored by the main model
+        accepted: Draft tokens that matched the token the main model sampled
+        passes: Forward passes of the main model during generation
+        generated: Tokens generated
+    """
+    
+    def __init__(self):
+        self.proposed = 0
+        self.accepted = 0
+        self.passes = 0
+        self.generated = 0
+    
+    @property
+    def acceptance_rate(self) -> float:
+        """Fraction of proposed draft tokens that were accepted."""
+        return self.accepted / self.proposed if self.proposed else 0.0
+    
+    @property
+    def tokens_per_pass(self) -> float:
+        """Generated tokens per forward pass of the main model; 1.0 without speculation."""
+        return self.generated / self.passes if self.passes else 0.0
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the counts and ratios as a dictionary."""
+        return {
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "passes": self.passes,
+            "generated": self.generated,
+            "acceptance_rate": self.acceptance_rate,
+            "tokens_per_pass": self.tokens_per_pass,
+        }
+
+
+class GgufDraftModel:
+    """
+    Propose draft tokens greedily with a small GGUF model.
+    
+    The draft model must share the main model's vocabulary (TinyLlama uses
+    the Llama 2 tokenizer). Like the main model it keeps the evaluated
+    tokens, so each call only evaluates what was added since the last one.
+    """
+    
+    def __init__(self, model_path: str, num_pred_tokens: int, threads: int):
+        """
+        Load the draft model.
+        
+        Args:
+            model_path: Path to the GGUF file of the draft model
+            num_pred_tokens: Maximum number of tokens proposed per call
+            threads: CPU threads used for the draft model
+        """
+        from llama_cpp import Llama
+        
+        self.num_pred_tokens = num_pred_tokens
+        self.llama = Llama(
+            model_path=model_path,
+            n_ctx=config.MAX_INPUT_TOKENS,
+            n_threads=threads,
+            n_gpu_layers=config.GPU_LAYERS,
+            verbose=False,
+        )
+    
+    def __call__(self, input_ids: np.ndarray) -> np.ndarray:
+        """
+        Continue a token sequence greedily.
+        
+        Args:
+            input_ids: Token ids of the sequence so far
+        
+        Returns:
+            Up to num_pred_tokens proposed token ids, stopping at end of text
+        """
+        count = min(self.num_pred_tokens, self.llama.n_ctx() - len(input_ids))
+        if count <= 0:
+            return np.array([], dtype=np.intc)
+        
+        self.llama.eval(_evaluate_from_prefix(self.llama, list(input_ids)))
+        drafts = []
+        for index in range(count):
+            token = int(np.argmax(self.llama.scores[self.llama.n_tokens - 1]))
+            if token == self.llama.token_eos():
+                break
+            drafts.append(token)
+            if index < count - 1:
+                self.llama.eval([token])
+        return np.array(drafts, dtype=np.intc)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Probabilities of logits, computed in float64."""
+    exp = np.exp(logits.astype(np.float64) - np.max(logits))
+    return exp / exp.sum()
+
+
+def sample_token(logits: np.ndarray, history: np.ndarray, rng: np.random.Generator, temperature: float,
+                 top_p: float, top_k: int, repetition_penalty: float) -> int:
+    """
+    Sample a token with the llama.cpp sampler chain: repetition penalty,
+    top-k, top-p, then temperature.
+    
+    Args:
+        logits: Logits of the position being sampled
+        history: Tokens up to and including that position, the last
+            REPEAT_LAST_N of them are penalized
+        rng: Random number generator
+        temperature: Sampling temperature, greedy if not positive
+        top_p: Nucleus sampling threshold
+        top_k: Number of most likely tokens sampled from, all if not positive
+        repetition_penalty: Penalty for tokens in the recent history
+    
+    Returns:
+        Sampled token id
+    """
+    logits = np.array(logits, dtype=np.float32)
+    recent = np.unique(np.asarray(history[-REPEAT_LAST_N:], dtype=np.intp))
+    if repetition_penalty != 1.0 and len(recent):
+        penalized = logits[recent]
+        logits[recent] = np.where(penalized > 0, penalized / repetition_penalty, penalized * repetition_penalty)
+    if temperature <= 0:
+        return int(np.argmax(logits))
+    
+    if 0 < top_k < len(logits):
+        candidates = np.argpartition(-logits, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(logits))
+    candidates = candidates[np.argsort(-logits[candidates], kind="stable")]
+    if top_p < 1.0:
+        cumulative = np.cumsum(_softmax(logits[candidates]))
+        candidates = candidates[:int(np.searchsorted(cumulative, top_p)) + 1]
+    
+    probabilities = _softmax(logits[candidates] / temperature)
+    return int(candidates[rng.choice(len(candidates), p=probabilities)])
+
+
+def _evaluate_from_prefix(llama: Any, tokens: List[int]) -> List[int]:
+    """
+    Keep the evaluated tokens that start a sequence and return the rest.
+    
+    At least the last token is returned, so there are logits to sample from.
+    
+    Args:
+        llama: llama_cpp.Llama instance
+        tokens: Token ids of the full sequence
+    
+    Returns:
+        Token ids that still have to be evaluated
+    """
+    n_past = 0
+    for evaluated, token in zip(llama.input_ids[:llama.n_tokens], tokens[:-1]):
+        if evaluated != token:
+            break
+        n_past += 1
+    llama.n_tokens = n_past
+    return tokens[n_past:]
+
+
+class LlamaCppModel:
+    """
+    llama-cpp-python model with the ctransformers methods LlamaInterface uses.
+    
+    With a draft source, each forward pass of the main model evaluates the
+    last accepted token together with the proposed draft tokens. A token is
+    sampled at every drafted position exactly as it would be without drafts,
+    from the same logits and with the same repetition history. Drafts are
+    kept while they match the sampled tokens, so the output distribution is
+    unchanged and every pass yields at least one token.
+    
+    Tokens are sampled from the rows of llama.scores with sample_token rather
+    than with Llama.sample, which in llama-cpp-python 0.3 always reads the
+    logits after the last evaluated token and keeps no repetition history
+    across calls.
+    """
+    
+    def __init__(self, model_path: str, threads: int, draft_model: Optional[Any] = None):
+        """
+        Load the model.
+        
+        Args:
+            model_path: Path to the GGUF model file
+            threads: CPU threads used for generation
+            draft_model: Callable proposing draft tokens from the token ids so
+                far, e.g. LlamaPromptLookupDecoding or GgufDraftModel
+        """
+        from llama_cpp import Llama
+        
+        self.draft_model = draft_model
+        self.stats = SpeculationStats()
+        self.llama = Llama(
+            model_path=model_path,
+            n_ctx=config.MAX_INPUT_TOKENS,
+            n_threads=threads,
+            n_gpu_layers=config.GPU_LAYERS,
+            # Drafted positions need their own logits to be verified
+            logits_all=draft_model is not None,
+            verbose=False,
+        )
+    
+    def tokenize(self, text: str, add_bos_token: bool = True) -> List[int]:
+        """Convert text to token ids."""
+        return self.llama.tokenize(text.encode("utf-8"), add_bos=add_bos_token)
+    
+    def detokenize(self, tokens: List[int], decode: bool = True):
+        """Convert token ids to text, or to bytes if decode is False."""
+        data = self.llama.detokenize(tokens)
+        return data.decode("utf-8", errors="ignore") if decode else data
+    
+    def prepare_inputs_for_generation(self, tokens: List[int]) -> List[int]:
+        """Keep the evaluated prefix of the tokens and return the tokens still to evaluate."""
+        return _evaluate_from_prefix(self.llama, list(tokens))
+    
+    def eval(self, tokens: List[int]):
+        """Evaluate tokens after the ones already in the context."""
+        self.llama.eval(tokens)
+    
+    def reset(self):
+        """Clear the context."""
+        self.llama.reset()
+    
+    def generate(self, tokens: List[int], temperature: float, top_p: float, top_k: int,
+                 repetition_penalty: float) -> Iterator[int]:
+        """
+        Generate tokens from a prompt until the end-of-text token.
+        
+        Args:
+            tokens: Prompt token ids
+            temperature: Sampling temperature
+            top_p: Nucleus sampling threshold
+            top_k: Number of most likely tokens sampled from
+            repetition_penalty: Penalty for tokens in the recent history
+        
+        Returns:
+            Iterator of generated token ids
+        """
+        llama = self.llama
+        rng = np.random.default_rng()
+        sampling = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "top_k": top_k,
+            "repetition_penalty": repetition_penalty,
+        }
+        pending = self.prepare_inputs_for_generation(tokens)
+        drafts: List[int] = []
+        prompt_pass = True
+        
+        while True:
+            # Position of the last token that is part of the sequence
+            last = llama.n_tokens + len(pending) - 1
+            llama.eval(pending + drafts)
+            end = llama.n_tokens
+            if not prompt_pass:
+                self.stats.passes += 1
+                self.stats.proposed += len(drafts)
+            prompt_pass = False
+            
+            for index in range(len(drafts) + 1):
+                # Sample from this position's logits and history, as if the
+                # drafted tokens after it were not there
+                position = last + index
+                history = llama.input_ids[max(0, position + 1 - REPEAT_LAST_N):position + 1]
+                token = sample_token(llama.scores[position], history, rng, **sampling)
+                accepted = index < len(drafts) and token == drafts[index]
+                if accepted:
+                    self.stats.accepted += 1
+                if token == llama.token_eos():
+                    llama.n_tokens = last + index + 1
+                    return
+                self.stats.generated += 1
+                yield token
+                if not accepted:
+                    break
+            
+            # Drafts after the first rejected one are dropped from the context
+            llama.n_tokens = min(last + index + 1, end)
+            pending = [token]
+            drafts = self._propose(pending)
+    
+    def _propose(self, pending: List[int]) -> List[int]:
+        """Ask the draft source for tokens following the sequence and the pending tokens."""
+        if self.draft_model is None:
+            return []
+        room = self.llama.n_ctx() - self.llama.n_tokens - len(pending)
+        sequence = np.concatenate([self.llama.input_ids[:self.llama.n_tokens],
+                                   np.array(pending, dtype=np.intc)])
+        return [int(token) for token in self.draft_model(sequence)[:max(room, 0)]]
+
+
+def _model_file(model_path: str, repo_id: str, filename: str) -> str:
+    """Return a local GGUF path, downloading the file from the Hub if it is missing."""
+    if os.path.exists(model_path):
+        return model_path
+    print(f"Model file not found at {model_path}")
+    print("Downloading model. This may take a while...")
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=repo_id, filename=filename)
+
+
+def load_draft_model(threads: int) -> Optional[Any]:
+    """
+    Create the draft token source selected by SPECULATIVE_DECODING.
+    
+    Args:
+        threads: CPU threads available to a draft model
+    
+    Returns:
+        Draft source, or None if speculative decoding is off
+    """
+    mode = config.SPECULATIVE_DECODING
+    if mode == "off":
+        return None
+    if mode == "prompt_lookup":
+        from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+        return LlamaPromptLookupDecoding(max_ngram_size=config.SPECULATIVE_MAX_NGRAM,
+                                         num_pred_tokens=config.SPECULATIVE_NUM_PRED_TOKENS)
+    if mode == "draft_model":
+        path = _model_file(config.DRAFT_MODEL_PATH, config.DRAFT_MODEL_ID, config.DRAFT_MODEL_FILE)
+        print(f"Loading draft model from {path}...")
+        return GgufDraftModel(path, config.SPECULATIVE_NUM_PRED_TOKENS, threads)
+    raise ValueError(f"Unknown SPECULATIVE_DECODING mode: {mode}")
+
+
+def load_llama_cpp_model(model_path: str, threads: int) -> LlamaCppModel:
+    """
+    Load the GGUF model with llama-cpp-python and the configured draft source.
+    
+    Args:
+        model_path: Path to the GGUF model file
+        threads: CPU threads used for generation
+    
+    Returns:
+        Loaded model
+    """
+    start_time = time.time()
+    draft_model = load_draft_model(threads)
+    model = LlamaCppModel(_model_file(model_path, config.MODEL_ID, config.MODEL_FILE),
+                          threads, draft_model)
+    
+    if draft_model is not None:
+        print(f"Speculative decoding: {config.SPECULATIVE_DECODING}, "
+              f"up to {config.SPECULATIVE_NUM_PRED_TOKENS} draft tokens per pass")
+    if isinstance(draft_model, GgufDraftModel) and draft_model.llama.n_vocab() != model.llama.n_vocab():
+        raise ValueError("Draft model vocabulary does not match the main model")
+    print(f"llama.cpp model loaded in {time.time() - start_time:.2f} seconds")
+    return model
@@ -1,44 +1,195 @@
 """
 LLM interface module to interact with the Llama model using GGUF format.
 """
+import codecs
 import os
 import random
+import re
+import threading
 import time
-from typing import Dict, List, Any, Optional
-import torch
-
-from ctransformers import AutoModelForCausalLM
+import warnings
+from string import Formatter
+from typing import Dict, Iterator, List, Any, Optional
 
+from src.options import QueryOptions
 import config
 
 
+# Sequences that end generation
+STOP_SEQUENCES = ["</s>", "[/INST]", "\n\n"]
+
+# Tokens and role labels the model sometimes emits that are removed from responses
+UNWANTED_PATTERNS = [
+    "</s>", "[/INST]", "<|im_end|>", "<|im_start|>",
+    "User:", "Assistant:", "Jawaban:", "Answer:"
+]
+
+# Returned instead of an answer when generation fails
+ERROR_RESPONSE = "Maaf, saya mengalami kesalahan saat mencoba menjawab. Silakan coba lagi."
+
+# Appended to the prompt when a Bahasa Indonesia answer comes back in English
+RETRY_SUFFIX = "\n\nPenting: Jawablah dalam Bahasa Indonesia."
+
+_STOP_REGEX = re.compile("|".join(map(re.escape, STOP_SEQUENCES)))
+
+
+def _partial_match_length(text: str, patterns: List[str]) -> int:
+    """Length of the longest suffix of text that is a proper prefix of one of the patterns."""
+    longest = 0
+    for pattern in patterns:
+        for length in range(len(pattern) - 1, 0, -1):
+            if text.endswith(pattern[:length]):
+                longest = max(longest, length)
+                break
+    return longest
+
+
+def remove_unwanted_patterns(text: str) -> str:
+    """
+    Remove UNWANTED_PATTERNS from text until none is left.
+    
+    Removing one pattern can join the pieces of another, e.g.
+    "Us<|im_end|>er:", so the replacements are repeated until nothing changes.
+    """
+    while True:
+        cleaned = text
+        for pattern in UNWANTED_PATTERNS:
+            cleaned = cleaned.replace(pattern, "")
+        if cleaned == text:
+            return cleaned
+        text = cleaned
+
+
+def _hold_length(text: str) -> int:
+    """
+    Length of the tail of streamed text that may still become part of a pattern.
+    
+    That is a partial pattern at the end, and before it any text that would
+    join another pattern once the partial one is completed and removed.
+    """
+    end = len(text)
+    while True:
+        length = _partial_match_length(text[:end], UNWANTED_PATTERNS)
+        if not length:
+            return len(text) - end
+        end -= length
+
+
+def prompt_prefix(template: str) -> str:
+    """
+    Return the static instruction text of a prompt template.
+    
+    The prefix ends before the last space ahead of the first placeholder, so
+    the rest of a formatted prompt starts at a word boundary and tokenizes
+    the same on its own as it does after the prefix.
+    
+    Args:
+        template: Prompt template with {context} and {question} placeholders
+        
+    Returns:
+        The cacheable prefix, or an empty string if there is none
+    """
+    static = next(Formatter().parse(template), ("", None, None, None))[0]
+    return static[:max(static.rfind(" "), 0)]
+
+
+class ResponseStreamCleaner:
+    """
+    Apply LlamaInterface._clean_response incrementally to streamed text.
+    
+    Text that could still become part of an unwanted pattern, including text
+    that a later removal would join to one, is held back until the next piece
+    shows whether it does, and whitespace runs are collapsed across piece
+    boundaries, so the concatenated output matches cleaning the full response
+    at once.
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._pending_space = False
+    
+    def feed(self, piece: str) -> str:
+        """
+        Add a piece of generated text.
+        
+        Args:
+            piece: Text produced by the model
+            
+        Returns:
+            Cleaned text that is safe to show now (may be empty)
+        """
+        self._buffer = remove_unwanted_patterns(self._buffer + piece)
+        hold = _hold_length(self._buffer)
+        ready = self._buffer[:len(self._buffer) - hold]
+        self._buffer = self._buffer[len(ready):]
+        return self._emit(ready)
+    
+    def finish(self) -> str:
+        """
+        Flush the held-back text at the end of generation.
+        
+        Returns:
+            Remaining cleaned text
+        """
+        ready, self._buffer = self._buffer, ""
+        return self._emit(ready, final=True)
+    
+    def _emit(self, text: str, final: bool = False) -> str:
+        words = text.split()
+        if not words:
+            if text and self._started:
+                self._pending_space = True
+            return ""
+        
+        prefix = " " if self._started and (self._pending_space or text[0].isspace()) else ""
+        self._started = True
+        self._pending_space = text[-1].isspace() and not final
+        return prefix + " ".join(words)
+
+
 class LlamaInterface:
     """
-    Interface for the Llama GGUF model using ctransformers.
+    Interface for the Llama GGUF model using ctransformers, or llama-cpp-python
+    when LLM_BACKEND is "llama_cpp".
     """
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, threads: Optional[int] = None):
         """
         Initialize the Llama model.
         
         Args:
             model_path: Path to GGUF model file (default: from config)
+            threads: CPU threads used for generation (default: from config)
         """
         self.model_path = model_path or config.MODEL_PATH
+        self.threads = threads or config.THREADS
         self.model = None
+        # The model keeps generation state, so one request uses it at a time
+        self._lock = threading.Lock()
+        # Token ids of the static prompt prefixes, and the prefix the model's
+        # context currently starts with
+        self._prefix_tokens: Dict[str, Optional[List[int]]] = {}
+        self._active_prefix: Optional[str] = None
+        self._num_generated = 0
         self._initialize_model()
+        self.prime_prompt_prefix()
     
     def _initialize_model(self):
-        """Initialize the model using ctransformers."""
+        """Initialize the model using the configured backend."""
         try:
             start_time = time.time()
             
+            # Imported here so that importing this module stays cheap
+            from ctransformers import AutoModelForCausalLM
+            
             print(f"Loading GGUF model from {self.model_path}...")
             print(f"Device: {config.DEVICE}, GPU Layers: {config.GPU_LAYERS}")
-            print(f"Threads: {config.THREADS}")
+            print(f"Threads: {self.threads}")
             
             # Cek apakah CUDA tersedia dan apakah menggunakan GPU
-            if config.DEVICE == "cuda:0" and torch.cuda.is_available():
+            if config.DEVICE == "cuda:0":
+                import torch
                 cuda_device = 0
                 print(f"CUDA available, using device: {cuda_device}")
                 print(f"GPU: {torch.cuda.get_device_name(cuda_device)}")
@@ -46,8 +197,16 @@ class LlamaInterface:
             else:
                 print("Using CPU only")
             
+            if config.SPECULATIVE_DECODING != "off" and config.LLM_BACKEND != "llama_cpp":
+                print("Speculative decoding needs LLM_BACKEND = \"llama_cpp\", generating without it")
+            
+            if config.LLM_BACKEND == "llama_cpp":
+                # Optional backend, drafts tokens for speculative decoding
+                from src.llama_cpp_backend import load_llama_cpp_model
+                self.model = load_llama_cpp_model(self.model_path, self.threads)
+            
             # Check if model exists
-            if not os.path.exists(self.model_path):
+            elif not os.path.exists(self.model_path):
                 print(f"Model file not found at {self.model_path}")
                 print("Downloading model. This may take a while...")
                 
@@ -58,7 +217,7 @@ class LlamaInterface:
                     model_type="llama",
                     gpu_layers=config.GPU_LAYERS, 
                     context_length=config.MAX_INPUT_TOKENS,
-                    threads=config.THREADS,    
+                    threads=self.threads,    
                 )
             else:
                 # Load from local path
@@ -67,7 +226,7 @@ class LlamaInterface:
                     model_type="llama",
                     gpu_layers=config.GPU_LAYERS,  
                     context_length=config.MAX_INPUT_TOKENS,
-                    threads=config.THREADS,        
+                    threads=self.threads,        
                 )
             
             end_time = time.time()
@@ -75,7 +234,8 @@ class LlamaInterface:
             print(f"Model loaded successfully in {load_time:.2f} seconds")
             
             # Print memory info
-            if config.DEVICE == "cuda:0" and torch.cuda.is_available() and config.GPU_LAYERS > 0:
+            if config.DEVICE == "cuda:0" and config.GPU_LAYERS > 0:
+                import torch
                 cuda_device = 0
                 allocated = torch.cuda.memory_allocated(cuda_device) / 1e9
                 reserved = torch.cuda.memory_reserved(cuda_device) / 1e9
@@ -88,13 +248,15 @@ class LlamaInterface:
             print(f"Error initializing model: {e}")
             raise
     
-    def generate_response(self, prompt: str, has_context: bool = True) -> str:
+    def generate_response(self, prompt: str, has_context: bool = True,
+                          options: Optional[QueryOptions] = None) -> str:
         """
         Generate a response using the Llama model.
         
         Args:
             prompt: The full prompt including system prompt and user query
             has_context: Whether relevant context was found
+            options: Language and sampling settings (default: from config)
             
         Returns:
             Generated text response
@@ -109,21 +271,15 @@ class LlamaInterface:
             
             start_time = time.time()
             
-            # Generate text with the model
-            generated_text = self.model(
-                prompt,
-                max_new_tokens=config.MAX_NEW_TOKENS,
-                temperature=config.TEMPERATURE,
-                top_p=config.TOP_P,
-                top_k=config.TOP_K,
-                repetition_penalty=config.REPETITION_PENALTY,
-                stop=["</s>", "[/INST]", "\n\n"] 
-            )
+            # Generate text with the model; the token count is read before
+            # another request on this model can reset it
+            with self._lock:
+                generated_text = "".join(self._generate_text(prompt, options or QueryOptions()))
+                num_generated = self._num_generated
             
             end_time = time.time()
             gen_time = end_time - start_time
-            response_tokens = len(generated_text.split()) - len(prompt.split())
-            tokens_per_second = response_tokens / gen_time if gen_time > 0 else 0
+            tokens_per_second = num_generated / gen_time if gen_time > 0 else 0
             
             print(f"Generation completed in {gen_time:.2f} seconds")
             print(f"Speed: {tokens_per_second:.1f} tokens/second")
@@ -136,33 +292,266 @@ class LlamaInterface:
                 
             response = self._clean_response(response)
 
-            if config.OUTPUT_LANGUAGE == "bahasa_indonesia" and self._detect_english(response):
-                print("Detected English response, retrying in Bahasa Indonesia...")
-                retry_prompt = prompt + "\n\nPenting: Jawablah dalam Bahasa Indonesia."
-                
-                generated_text = self.model(
-                    retry_prompt,
-                    max_new_tokens=config.MAX_NEW_TOKENS,
-                    temperature=config.TEMPERATURE,
-                    top_p=config.TOP_P,
-                    top_k=config.TOP_K,
-                    repetition_penalty=config.REPETITION_PENALTY,
-                    stop=["</s>", "[/INST]", "\n\n"]
-                )
-                
-                if generated_text.startswith(retry_prompt):
-                    response = generated_text[len(retry_prompt):].strip()
-                else:
-                    response = generated_text.strip()
-                
-                response = self._clean_response(response)
+            return response
+        
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return ERROR_RESPONSE
+    
+    def stream_response(self, prompt: str, has_context: bool = True,
+                        options: Optional[QueryOptions] = None) -> Iterator[str]:
+        """
+        Generate a response as a stream of text pieces.
+        
+        Pieces are yielded as soon as the model produces them, so the first
+        words reach the user after prompt evaluation rather than after the
+        whole answer. When answers must be in Bahasa Indonesia, the first
+        LANGUAGE_CHECK_WORDS words are held back until the language check.
         
+        Args:
+            prompt: The full prompt including system prompt and user query
+            has_context: Whether relevant context was found
+            options: Language and sampling settings (default: from config)
             
-            return response
+        Returns:
+            Iterator of cleaned response text pieces
+        """
+        if not self.model:
+            raise ValueError("Model not initialized")
+        
+        # If no context was found, there's a chance to return a default no-info answer
+        if not has_context and random.random() < 0.4:
+            yield random.choice(config.DEFAULT_NO_INFO_ANSWERS)
+            return
+        
+        cleaner = ResponseStreamCleaner()
+        start_time = time.time()
+        first_token_time = None
+        
+        try:
+            with self._lock:
+                for piece in self._generate_text(prompt, options or QueryOptions()):
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                    text = cleaner.feed(piece)
+                    if text:
+                        yield text
+                num_generated = self._num_generated
+            
+            text = cleaner.finish()
+            if text:
+                yield text
         
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "Maaf, saya mengalami kesalahan saat mencoba menjawab. Silakan coba lagi."
+            yield ERROR_RESPONSE
+            return
+        
+        gen_time = time.time() - start_time
+        tokens_per_second = num_generated / gen_time if gen_time > 0 else 0
+        # Start on a new line, the console may have been printing the tokens
+        print(f"\nGeneration completed in {gen_time:.2f} seconds "
+              f"(first token after {first_token_time or gen_time:.2f} seconds)")
+        print(f"Speed: {tokens_per_second:.1f} tokens/second")
+    
+    def prime_prompt_prefix(self, template: Optional[str] = None):
+        """
+        Evaluate the static instruction prefix of a prompt template ahead of a request.
+        
+        The model keeps the state of one token sequence and only evaluates the
+        part of a prompt that differs from it, so once the prefix is evaluated
+        requests in the same language skip it. Switching languages evaluates
+        the other prefix once.
+        
+        Args:
+            template: Prompt template (default: config.SYSTEM_PROMPT)
+        """
+        if not config.USE_PROMPT_PREFIX_CACHE or not self.model:
+            return
+        
+        prefix = prompt_prefix(template or config.SYSTEM_PROMPT)
+        with self._lock:
+            tokens = self._prefix_token_ids(prefix)
+            if not tokens or prefix == self._active_prefix:
+                return
+            
+            start_time = time.time()
+            self.model.eval(self.model.prepare_inputs_for_generation(tokens))
+            self._active_prefix = prefix
+        print(f"Prompt prefix ({len(tokens)} tokens) evaluated in {time.time() - start_time:.2f} seconds")
+    
+    def warmup(self, max_tokens: Optional[int] = None) -> float:
+        """
+        Generate a few tokens from a short RAG prompt.
+        
+        The first generation pays one-time costs (page faults on the weights,
+        buffer allocation, thread start-up) that would otherwise land on the
+        first user's request. The prompt starts with the instruction prefix,
+        so the prefix stays evaluated afterwards.
+        
+        Args:
+            max_tokens: Tokens to generate (default: config.WARMUP_TOKENS)
+            
+        Returns:
+            Seconds the warmup took
+        """
+        start_time = time.time()
+        prompt = self.format_rag_prompt("Halo", "")
+        with self._lock:
+            tokens = self.model.generate(self._tokenize_prompt(prompt), **QueryOptions().sampling_kwargs())
+            for count, _ in enumerate(tokens, start=1):
+                if count >= (max_tokens or config.WARMUP_TOKENS):
+                    break
+            tokens.close()
+        warmup_time = time.time() - start_time
+        print(f"Model warmed up in {warmup_time:.2f} seconds")
+        return warmup_time
+    
+    def prefill(self, prompt: str) -> int:
+        """
+        Evaluate a prompt without generating from it.
+        
+        Args:
+            prompt: The full prompt
+            
+        Returns:
+            Number of tokens that had to be evaluated
+        """
+        with self._lock:
+            tokens = self.model.prepare_inputs_for_generation(self._tokenize_prompt(prompt))
+            self.model.eval(tokens)
+        return len(tokens)
+    
+    def reset_context(self):
+        """Clear the model's context, including an evaluated prompt prefix."""
+        with self._lock:
+            with warnings.catch_warnings():
+                # Deprecated in ctransformers, but the only way to drop the state
+                warnings.simplefilter("ignore")
+                self.model.reset()
+            self._active_prefix = None
+    
+    def _prefix_token_ids(self, prefix: str) -> Optional[List[int]]:
+        """
+        Tokenize a prompt prefix once and check that it can be reused.
+        
+        Returns:
+            Token ids of the prefix, or None if the tokenizer merges text across
+            the prefix boundary and prompts have to be tokenized whole
+        """
+        if prefix not in self._prefix_tokens:
+            tokens = self.model.tokenize(prefix)
+            sample = "Konteks dokumen"
+            joined = self.model.tokenize(prefix + " " + sample)
+            if tokens + self.model.tokenize(sample, add_bos_token=False) != joined:
+                print("Prompt prefix does not tokenize on its own, prefix reuse is disabled for it")
+                tokens = None
+            self._prefix_tokens[prefix] = tokens
+        return self._prefix_tokens[prefix]
+    
+    def _tokenize_prompt(self, prompt: str) -> List[int]:
+        """
+        Tokenize a prompt, reusing the cached tokens of a known prefix.
+        
+        Identical prefix tokens let the model skip evaluating the part of the
+        prompt that is already in its context.
+        
+        Args:
+            prompt: The full prompt
+            
+        Returns:
+            Prompt token ids
+        """
+        self._active_prefix = None
+        if config.USE_PROMPT_PREFIX_CACHE:
+            for template in (config.SYSTEM_PROMPT, config.SYSTEM_PROMPT_INDONESIA, config.SYSTEM_PROMPT_ENGLISH):
+                prefix = prompt_prefix(template)
+                if prefix and prompt.startswith(prefix + " "):
+                    tokens = self._prefix_token_ids(prefix)
+                    if tokens:
+                        self._active_prefix = prefix
+                        rest = prompt[len(prefix) + 1:]
+                        return tokens + self.model.tokenize(rest, add_bos_token=False)
+        return self.model.tokenize(prompt)
+    
+    def _generate_text(self, prompt: str, options: QueryOptions) -> Iterator[str]:
+        """
+        Generate text for a prompt, enforcing Bahasa Indonesia early.
+        
+        The language of the first LANGUAGE_CHECK_WORDS words is checked before
+        anything is returned. An English start aborts the generation and
+        restarts it with an instruction to answer in Bahasa Indonesia, so a
+        wrong-language answer costs a few tokens instead of a full second
+        generation; the restarted prompt shares the evaluated tokens of the
+        first one. Must be called with the lock held.
+        
+        Args:
+            prompt: The full prompt
+            options: Language and sampling settings of the request
+            
+        Returns:
+            Iterator of generated text pieces
+        """
+        pieces = self._stream_tokens(self._tokenize_prompt(prompt), options)
+        if options.language != "bahasa_indonesia":
+            yield from pieces
+            return
+        
+        # One word more than checked, so the last checked word is complete
+        head = ""
+        for piece in pieces:
+            head += piece
+            if len(head.split()) > config.LANGUAGE_CHECK_WORDS:
+                break
+        
+        if self._detect_english(self._clean_response(head)):
+            pieces.close()
+            print(f"Detected English after {self._num_generated} tokens, restarting in Bahasa Indonesia...")
+            yield from self._stream_tokens(self._tokenize_prompt(prompt + RETRY_SUFFIX), options)
+            return
+        
+        if head:
+            yield head
+        yield from pieces
+    
+    def _stream_tokens(self, tokens: List[int], options: QueryOptions) -> Iterator[str]:
+        """
+        Generate text from prompt tokens until a stop sequence or the token limit.
+        
+        Text that could be the start of a stop sequence is held back until
+        the next token shows whether it completes one. Must be called with
+        the lock held.
+        
+        Args:
+            tokens: Prompt token ids
+            options: Sampling settings and token limit of the request
+            
+        Returns:
+            Iterator of generated text pieces
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        text = ""
+        self._num_generated = 0
+        
+        for token in self.model.generate(tokens, **options.sampling_kwargs()):
+            text += decoder.decode(self.model.detokenize([token], decode=False))
+            self._num_generated += 1
+            
+            match = _STOP_REGEX.search(text)
+            if match:
+                text = text[:match.start()]
+                break
+            
+            end = len(text) - _partial_match_length(text, STOP_SEQUENCES)
+            if end > 0:
+                yield text[:end]
+                text = text[end:]
+            
+            if self._num_generated >= options.max_new_tokens:
+                break
+        
+        if text:
+            yield text
     
     def _clean_response(self, response: str) -> str:
         """
@@ -175,13 +564,7 @@ class LlamaInterface:
             Cleaned response
         """
         # Remove common unwanted tokens/patterns
-        unwanted_patterns = [
-            "</s>", "[/INST]", "<|im_end|>", "<|im_start|>",
-            "User:", "Assistant:", "Jawaban:", "Answer:"
-        ]
-        
-        for pattern in unwanted_patterns:
-            response = response.replace(pattern, "")
+        response = remove_unwanted_patterns(response)
         
         # Remove excessive whitespace
         response = " ".join(response.split())
@@ -221,19 +604,53 @@ class LlamaInterface:
             return True
         return False
     
-    def format_rag_prompt(self, query: str, context: str) -> str:
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of a text with the model's tokenizer.
+        
+        Args:
+            text: Text to count
+            
+        Returns:
+            Number of tokens, without the beginning-of-sequence token
+        """
+        return len(self.model.tokenize(text, add_bos_token=False))
+    
+    def context_budget(self, query: str, options: Optional[QueryOptions] = None) -> int:
+        """
+        Tokens left for retrieved context in the prompt for a query.
+        
+        The context window has to hold the prompt template, the question and
+        max_new_tokens of answer, plus the retry instruction when answers are
+        checked for Bahasa Indonesia.
+        
+        Args:
+            query: The user's question
+            options: Language, prompt template and token limit (default: from config)
+            
+        Returns:
+            Token budget for the context, possibly zero
+        """
+        options = options or QueryOptions()
+        used = len(self.model.tokenize(self.format_rag_prompt(query, "", options)))
+        if options.language == "bahasa_indonesia":
+            used += self.count_tokens(RETRY_SUFFIX)
+        return max(config.MAX_INPUT_TOKENS - options.max_new_tokens - used, 0)
+    
+    def format_rag_prompt(self, query: str, context: str, options: Optional[QueryOptions] = None) -> str:
         """
         Format a prompt for RAG using the retrieved context.
         
         Args:
             query: The user's question
             context: The retrieved context for RAG
+            options: Settings with the prompt template (default: from config)
             
         Returns:
             Formatted prompt string
         """
-        # Format using the system prompt template from config
-        prompt = config.SYSTEM_PROMPT.format(
+        # Format using the system prompt template of the request's language
+        prompt = (options or QueryOptions()).system_prompt.format(
             context=context,
             question=query
         )
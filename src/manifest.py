@@ -0,0 +1,224 @@
+"""
+Index manifest module to detect whether a persisted index is still current.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+
+def _source_key(path: str) -> str:
+    """
+    Key a source file by its path relative to the data directory, so moving
+    the checkout does not invalidate the manifest.
+    """
+    try:
+        return os.path.relpath(path, config.DATA_DIR)
+    except ValueError:
+        return path
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file without reading it into memory at once.
+    
+    Args:
+        path: Path to the file
+        block_size: Number of bytes read per step
+        
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_file(path: str) -> Dict[str, Any]:
+    """
+    Describe a source file by size, modification time and content hash.
+    
+    Args:
+        path: Path to the file
+        
+    Returns:
+        Dictionary with size, mtime and sha256
+    """
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": hash_file(path),
+    }
+
+
+def build_manifest(source_paths: List[str]) -> Dict[str, Any]:
+    """
+    Build a manifest describing the inputs an index was built from.
+    
+    Args:
+        source_paths: Paths of the data files that were indexed
+        
+    Returns:
+        Manifest dictionary
+    """
+    sources = {}
+    for path in source_paths:
+        if os.path.exists(path):
+            sources[_source_key(path)] = fingerprint_file(path)
+    
+    return {
+        "version": MANIFEST_VERSION,
+        "embedding_model": config.EMBEDDING_MODEL_ID,
+        "chunk_size": config.CHUNK_SIZE,
+        "chunk_overlap": config.CHUNK_OVERLAP,
+        "tokenizer": config.TOKENIZER_ID,
+        "index_type": config.FAISS_INDEX_TYPE,
+        "sources": sources,
+    }
+
+
+def load_manifest(index_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the manifest stored beside an index.
+    
+    Args:
+        index_path: Directory of the persisted index
+        
+    Returns:
+        Manifest dictionary or None if it is missing or unreadable
+    """
+    manifest_path = os.path.join(index_path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading index manifest: {e}")
+        return None
+
+
+def save_manifest(manifest: Dict[str, Any], index_path: str):
+    """
+    Write the manifest beside an index.
+    
+    The file is written to a temporary name first so a crash never leaves a
+    manifest that claims an index is current when it is not.
+    
+    Args:
+        manifest: Manifest dictionary
+        index_path: Directory of the persisted index
+    """
+    os.makedirs(index_path, exist_ok=True)
+    manifest_path = os.path.join(index_path, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def settings_match(manifest: Dict[str, Any]) -> bool:
+    """
+    Check whether a manifest was built with the current chunking, embedding and index settings.
+    
+    Args:
+        manifest: Manifest dictionary
+        
+    Returns:
+        True if the settings are unchanged
+    """
+    return (
+        manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("embedding_model") == config.EMBEDDING_MODEL_ID
+        and manifest.get("chunk_size") == config.CHUNK_SIZE
+        and manifest.get("chunk_overlap") == config.CHUNK_OVERLAP
+        and manifest.get("tokenizer") == config.TOKENIZER_ID
+        and manifest.get("index_type") == config.FAISS_INDEX_TYPE
+    )
+
+
+def source_is_unchanged(path: str, recorded: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check whether a source file still matches its recorded fingerprint.
+    
+    Size is compared first; the content hash is only computed when the
+    modification time differs from the recorded one.
+    
+    Args:
+        path: Path to the source file
+        recorded: Fingerprint stored in the manifest
+        
+    Returns:
+        True if the file is unchanged
+    """
+    if recorded is None or not os.path.exists(path):
+        return False
+    
+    stat = os.stat(path)
+    if stat.st_size != recorded.get("size"):
+        return False
+    if stat.st_mtime == recorded.get("mtime"):
+        return True
+    return hash_file(path) == recorded.get("sha256")
+
+
+def is_index_current(index_path: str, source_paths: List[str]) -> bool:
+    """
+    Check whether the persisted index was built from the current sources and settings.
+    
+    Args:
+        index_path: Directory of the persisted index
+        source_paths: Paths of the data files that should be indexed
+        
+    Returns:
+        True if the index can be loaded without re-reading the sources
+    """
+    manifest = load_manifest(index_path)
+    if manifest is None or not settings_match(manifest):
+        return False
+    
+    recorded_sources = manifest.get("sources", {})
+    existing_paths = [path for path in source_paths if os.path.exists(path)]
+    if set(recorded_sources) != {_source_key(path) for path in existing_paths}:
+        return False
+    
+    return all(
+        source_is_unchanged(path, recorded_sources.get(_source_key(path)))
+        for path in existing_paths
+    )
+
+
+def find_changed_sources(manifest: Dict[str, Any], source_paths: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Compare the current sources against a manifest.
+    
+    Args:
+        manifest: Manifest of the persisted index
+        source_paths: Paths of the data files that should be indexed
+        
+    Returns:
+        Tuple of (new or modified source paths, source paths that were removed)
+    """
+    recorded_sources = manifest.get("sources", {})
+    existing_paths = [path for path in source_paths if os.path.exists(path)]
+    existing_keys = {_source_key(path) for path in existing_paths}
+    
+    changed = [
+        path for path in existing_paths
+        if not source_is_unchanged(path, recorded_sources.get(_source_key(path)))
+    ]
+    removed = [
+        os.path.join(config.DATA_DIR, key)
+        for key in recorded_sources if key not in existing_keys
+    ]
+    
+    return changed, removed
@@ -0,0 +1,284 @@
+"""
+Model pool module to serve concurrent requests from several Llama replicas.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.llm import LlamaInterface
+from src.options import QueryOptions
+import config
+
+
+class ModelPoolBusy(RuntimeError):
+    """
+    Raised when a request is not admitted because the queue is full or its
+    deadline cannot be met.
+    
+    Attributes:
+        retry_after: Estimated seconds until the request could be served
+    """
+    
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(ModelPoolBusy):
+    """Raised when a queued request reaches its deadline before a replica is free."""
+
+
+class _Ticket:
+    """A request waiting in a lane for a replica."""
+    
+    __slots__ = ("lane", "deadline", "replica")
+    
+    def __init__(self, lane: str, deadline: float):
+        self.lane = lane
+        self.deadline = deadline
+        self.replica: Optional[LlamaInterface] = None
+
+
+class ModelPool:
+    """
+    Fixed set of LlamaInterface replicas behind a priority request scheduler.
+    
+    Each replica is a separate model instance with its own generation state
+    and thread count, so up to `replicas` answers are generated in parallel.
+    Waiting requests are kept in lanes (SCHEDULER_LANE_WEIGHTS); when a
+    replica becomes idle the lanes are served in weighted round robin and
+    FIFO within a lane, so short answers are not stuck behind long ones
+    while long ones still make progress.
+    
+    Admission is bounded: once max_queue requests wait, or the expected wait
+    exceeds a request's deadline, it is rejected with ModelPoolBusy, and a
+    queued request that reaches its deadline is dropped with
+    DeadlineExceeded. The pool has the generation methods of LlamaInterface,
+    so the chatbot can use either.
+    """
+    
+    def __init__(self, replicas: Optional[int] = None, threads: Optional[int] = None,
+                 max_queue: Optional[int] = None):
+        """
+        Load the replicas.
+        
+        Args:
+            replicas: Number of model instances (default: from config)
+            threads: CPU threads per replica (default: from config)
+            max_queue: Maximum number of waiting requests (default: from config)
+        """
+        self.num_replicas = replicas or config.MODEL_REPLICAS
+        self.threads = threads or config.MODEL_REPLICA_THREADS
+        self.max_queue = config.MODEL_QUEUE_SIZE if max_queue is None else max_queue
+        
+        self.replicas: List[LlamaInterface] = []
+        for index in range(self.num_replicas):
+            print(f"Loading model replica {index + 1}/{self.num_replicas} with {self.threads} threads")
+            self.replicas.append(LlamaInterface(threads=self.threads))
+        self._idle: List[LlamaInterface] = list(self.replicas)
+        
+        # Lane order of the weighted round robin, e.g. short, short, short, long
+        self.lanes = list(config.SCHEDULER_LANE_WEIGHTS)
+        self._rotation = [lane for lane, weight in config.SCHEDULER_LANE_WEIGHTS.items()
+                          for _ in range(weight)]
+        self._position = 0
+        self._waiting: Dict[str, deque] = {lane: deque() for lane in self.lanes}
+        
+        self._condition = threading.Condition()
+        self._service_time = None
+        self._served = {lane: 0 for lane in self.lanes}
+        self._rejected = 0
+        self._expired = 0
+        self._wait_times = {lane: deque(maxlen=1000) for lane in self.lanes}
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a replica."""
+        return sum(len(tickets) for tickets in self._waiting.values())
+    
+    def _expected_wait(self) -> float:
+        """Seconds until a newly queued request gets a replica, from the mean service time."""
+        if self._idle and not self.queue_depth:
+            return 0.0
+        service_time = self._service_time or 0.0
+        return service_time * (self.queue_depth + 1) / self.num_replicas
+    
+    def _queue_full(self) -> bool:
+        """Whether a new request would have to wait but the queue has no room."""
+        must_wait = not self._idle or self.queue_depth > 0
+        return must_wait and self.queue_depth >= self.max_queue
+    
+    def _retry_after(self) -> int:
+        """Whole seconds a rejected client should wait before retrying."""
+        return max(1, math.ceil(self._expected_wait()))
+    
+    def _dispatch(self):
+        """Hand idle replicas to waiting requests. Called with the condition held."""
+        dispatched = False
+        while self._idle and self.queue_depth:
+            for offset in range(len(self._rotation)):
+                lane = self._rotation[(self._position + offset) % len(self._rotation)]
+                if self._waiting[lane]:
+                    self._position = (self._position + offset + 1) % len(self._rotation)
+                    break
+            ticket = self._waiting[lane].popleft()
+            ticket.replica = self._idle.pop()
+            dispatched = True
+        if dispatched:
+            self._condition.notify_all()
+    
+    @contextmanager
+    def acquire(self, lane: Optional[str] = None, deadline: Optional[float] = None) -> Iterator[LlamaInterface]:
+        """
+        Wait for an idle replica and hold it for the duration of the block.
+        
+        Args:
+            lane: Scheduling lane (default: the first, highest priority lane)
+            deadline: time.monotonic() by which a replica must be assigned
+                (default: now plus the lane's REQUEST_DEADLINE)
+        
+        Returns:
+            Context manager yielding the replica
+        
+        Raises:
+            ModelPoolBusy: If the queue is full or the deadline cannot be met
+            DeadlineExceeded: If the deadline passed while waiting
+        """
+        lane = lane if lane in self._waiting else self.lanes[0]
+        start_time = time.monotonic()
+        if deadline is None:
+            deadline = start_time + config.REQUEST_DEADLINE[lane]
+        
+        with self._condition:
+            expected_wait = self._expected_wait()
+            if self._queue_full():
+                self._rejected += 1
+                raise ModelPoolBusy(f"Request queue is full ({self.queue_depth} waiting)", self._retry_after())
+            if start_time + expected_wait > deadline:
+                self._rejected += 1
+                raise ModelPoolBusy(f"Expected wait of {expected_wait:.0f} seconds exceeds the deadline",
+                                    self._retry_after())
+        
+            ticket = _Ticket(lane, deadline)
+            self._waiting[lane].append(ticket)
+            self._dispatch()
+            while ticket.replica is None:
+                remaining = ticket.deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting[lane].remove(ticket)
+                    self._expired += 1
+                    raise DeadlineExceeded("Deadline passed while waiting for a model replica",
+                                           self._retry_after())
+                self._condition.wait(remaining)
+            
+            acquired_time = time.monotonic()
+            self._wait_times[lane].append(acquired_time - start_time)
+            self._served[lane] += 1
+        
+        try:
+            yield ticket.replica
+        finally:
+            with self._condition:
+                held = time.monotonic() - acquired_time
+                # Exponential moving average of how long a request holds a replica
+                self._service_time = held if self._service_time is None else 0.8 * self._service_time + 0.2 * held
+                self._idle.append(ticket.replica)
+                self._dispatch()
+        
+    def check_admission(self):
+        """
+        Reject a request up front if the queue is full.
+        
+        Streaming responses send their status before generation is scheduled,
+        so they check admission first.
+        
+        Raises:
+            ModelPoolBusy: If the queue is full
+        """
+        with self._condition:
+            if self._queue_full():
+                self._rejected += 1
+                raise ModelPoolBusy(f"Request queue is full ({self.queue_depth} waiting)", self._retry_after())
+        
+    def generate_response(self, prompt: str, has_context: bool = True, options: Optional[QueryOptions] = None,
+                          lane: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """Generate a response on the next replica scheduled for the request."""
+        with self.acquire(lane, deadline) as replica:
+            return replica.generate_response(prompt, has_context, options)
+    
+    def stream_response(self, prompt: str, has_context: bool = True, options: Optional[QueryOptions] = None,
+                        lane: Optional[str] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """Stream a response from the next scheduled replica, holding it until the stream ends."""
+        with self.acquire(lane, deadline) as replica:
+            yield from replica.stream_response(prompt, has_context, options)
+    
+    def prime_prompt_prefix(self, template: Optional[str] = None):
+        """Evaluate a prompt prefix on the replicas that are idle right now."""
+        with self._condition:
+            primed, self._idle = self._idle, []
+        try:
+            for replica in primed:
+                replica.prime_prompt_prefix(template)
+        finally:
+            with self._condition:
+                self._idle.extend(primed)
+                self._dispatch()
+    
+    def warmup(self) -> float:
+        """
+        Run a warmup generation on every replica, before the pool takes requests.
+        
+        Returns:
+            Seconds the warmup took
+        """
+        start_time = time.time()
+        for replica in self.replicas:
+            replica.warmup()
+        return time.time() - start_time
+    
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the model's tokenizer."""
+        return self.replicas[0].count_tokens(text)
+    
+    def context_budget(self, query: str, options: Optional[QueryOptions] = None) -> int:
+        """Tokens left for retrieved context in the prompt for a query."""
+        return self.replicas[0].context_budget(query, options)
+    
+    def format_rag_prompt(self, query: str, context: str, options: Optional[QueryOptions] = None) -> str:
+        """Format a prompt for RAG using the retrieved context."""
+        return self.replicas[0].format_rag_prompt(query, context, options)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report pool utilization.
+        
+        Returns:
+            Dictionary with replica counts, queue depth per lane, request
+            counts and wait times in ms over the last 1000 requests per lane
+        """
+        with self._condition:
+            lanes = {}
+            for lane in self.lanes:
+                wait_ms = np.array(self._wait_times[lane]) * 1000
+                lanes[lane] = {
+                    "queue_depth": len(self._waiting[lane]),
+                    "served": self._served[lane],
+                    "wait_ms_mean": float(wait_ms.mean()) if len(wait_ms) else 0.0,
+                    "wait_ms_p95": float(np.percentile(wait_ms, 95)) if len(wait_ms) else 0.0,
+                }
+            return {
+                "replicas": self.num_replicas,
+                "threads_per_replica": self.threads,
+                "busy_replicas": self.num_replicas - len(self._idle),
+                "queue_depth": self.queue_depth,
+                "max_queue": self.max_queue,
+                "rejected": self._rejected,
+                "expired": self._expired,
+                "service_time_s": self._service_time or 0.0,
+                "lanes": lanes,
+            }
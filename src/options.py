@@ -0,0 +1,76 @@
+"""
+Query options module for per-request language, retrieval and generation settings.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import config
+
+
+@dataclass
+class QueryOptions:
+    """
+    Settings of one query, so concurrent queries do not share mutable config.
+    
+    Every setting left as None is filled in from config when the options are
+    created, and the options are not changed afterwards.
+    
+    Attributes:
+        language: Output language code, "bahasa_indonesia" or "english"
+        top_k: Number of documents to retrieve
+        temperature: Sampling temperature
+        top_p: Nucleus sampling threshold
+        sampling_top_k: Number of most likely tokens sampled from
+        repetition_penalty: Penalty for tokens in the recent history
+        max_new_tokens: Maximum number of tokens generated
+        system_prompt: Prompt template (default: config.SYSTEM_PROMPT for the
+            configured language, the language's own template otherwise)
+    """
+    
+    language: Optional[str] = None
+    top_k: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    sampling_top_k: Optional[int] = None
+    repetition_penalty: Optional[float] = None
+    max_new_tokens: Optional[int] = None
+    system_prompt: Optional[str] = None
+    
+    def __post_init__(self):
+        if self.language is None:
+            self.language = config.OUTPUT_LANGUAGE
+        elif self.language not in config.SYSTEM_PROMPTS:
+            print(f"Unsupported language: {self.language}, defaulting to Bahasa Indonesia")
+            self.language = "bahasa_indonesia"
+        
+        if self.system_prompt is None:
+            if self.language == config.OUTPUT_LANGUAGE:
+                self.system_prompt = config.SYSTEM_PROMPT
+            else:
+                self.system_prompt = config.SYSTEM_PROMPTS[self.language]
+        
+        defaults = {
+            "top_k": config.TOP_K_RESULTS,
+            "temperature": config.TEMPERATURE,
+            "top_p": config.TOP_P,
+            "sampling_top_k": config.TOP_K,
+            "repetition_penalty": config.REPETITION_PENALTY,
+            "max_new_tokens": config.MAX_NEW_TOKENS,
+        }
+        for name, value in defaults.items():
+            if getattr(self, name) is None:
+                setattr(self, name, value)
+    
+    @property
+    def cacheable(self) -> bool:
+        """Whether answers may be shared through the response cache: only the language differs from config."""
+        return self == QueryOptions(language=self.language)
+    
+    def sampling_kwargs(self) -> Dict[str, Any]:
+        """Sampling parameters for the model's generate call."""
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.sampling_top_k,
+            "repetition_penalty": self.repetition_penalty,
+        }
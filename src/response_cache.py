@@ -0,0 +1,378 @@
+"""
+Response cache module to answer repeated questions without retrieval or generation.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from src.manifest import MANIFEST_FILENAME
+import config
+
+
+# Punctuation and symbols that do not change what is being asked
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a query to the form used for exact matching.
+    
+    Args:
+        query: The user's question
+    
+    Returns:
+        Lowercased query without punctuation and with single spaces
+    """
+    return " ".join(_PUNCTUATION.sub(" ", query.lower()).split())
+
+
+def chunk_key(documents: List[Document]) -> str:
+    """
+    Identify a ranked list of retrieved chunks.
+    
+    Chunks are identified by the hash of their source and text, which stays
+    the same when the index is rebuilt from unchanged documents.
+    
+    Args:
+        documents: Retrieved documents, best match first
+    
+    Returns:
+        Hex digest of the chunk identities in rank order
+    """
+    digest = hashlib.sha256()
+    for doc in documents:
+        digest.update(str(doc.metadata.get("source", "")).encode("utf-8") + b"\0")
+        digest.update(doc.page_content.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class _Entry:
+    """A cached answer with the keys it is found by."""
+    
+    __slots__ = ("query", "language", "chunks", "embedding", "result", "created")
+    
+    def __init__(self, query: str, language: str, chunks: str, embedding: Optional[np.ndarray],
+                 result: Dict[str, Any], created: float):
+        self.query = query
+        self.language = language
+        self.chunks = chunks
+        self.embedding = embedding
+        self.result = result
+        self.created = created
+
+
+class ResponseCache:
+    """
+    LRU cache of chatbot answers with exact and semantic lookup.
+    
+    An answer is stored under its normalized query and output language, and
+    is found again either by the same normalized query, before any retrieval,
+    or by a query whose embedding is at least RESPONSE_CACHE_SIMILARITY
+    similar and which retrieved the same chunks in the same language. Every
+    lookup first checks the index manifest; when it changed the index was
+    rebuilt and all answers are dropped.
+    
+    With a database path the entries are also written to SQLite and loaded
+    again on start, except those that expired or belong to another manifest.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 similarity: Optional[float] = None, db_path: Optional[str] = None,
+                 manifest_path: Optional[str] = None):
+        """
+        Create the cache, loading persisted entries if a database is given.
+        
+        Args:
+            max_entries: Maximum number of cached answers (default: from config)
+            ttl: Seconds an answer stays valid (default: from config)
+            similarity: Minimum cosine similarity for a semantic hit (default: from config)
+            db_path: SQLite file to persist entries in (default: in memory only)
+            manifest_path: Index manifest whose changes invalidate the cache
+                (default: the manifest of FAISS_INDEX_PATH)
+        """
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl or config.RESPONSE_CACHE_TTL
+        self.similarity = similarity or config.RESPONSE_CACHE_SIMILARITY
+        self.manifest_path = manifest_path or os.path.join(config.FAISS_INDEX_PATH, MANIFEST_FILENAME)
+        
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        # Entries by (chunk key, language), for semantic lookup
+        self._by_chunks: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._manifest_stat = None
+        self._manifest_hash = None
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        
+        self._db = None
+        self.db_path = db_path
+        self._check_manifest()
+        if db_path:
+            self._open_db(db_path)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _check_manifest(self):
+        """Drop every entry if the index manifest changed since the last check."""
+        try:
+            stat = os.stat(self.manifest_path)
+            current_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            current_stat = None
+        if current_stat == self._manifest_stat:
+            return
+        
+        self._manifest_stat = current_stat
+        manifest_hash = None
+        if current_stat is not None:
+            with open(self.manifest_path, "rb") as f:
+                manifest_hash = hashlib.sha256(f.read()).hexdigest()
+        if manifest_hash != self._manifest_hash:
+            if self._entries:
+                print("Index manifest changed, clearing the response cache")
+            self._manifest_hash = manifest_hash
+            self._clear()
+    
+    def after_fork(self):
+        """
+        Reconnect to the database in a forked worker process.
+        
+        A SQLite connection must not be used by two processes; each worker
+        opens its own, and SQLite's file locking orders their writes.
+        """
+        if self.db_path:
+            self._lock = threading.Lock()
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+    
+    def _open_db(self, db_path: str):
+        """Open the SQLite database and load its current entries."""
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " query TEXT NOT NULL, language TEXT NOT NULL, chunks TEXT NOT NULL,"
+            " embedding BLOB, result TEXT NOT NULL, created REAL NOT NULL,"
+            " last_used REAL NOT NULL, manifest TEXT,"
+            " PRIMARY KEY (query, language))"
+        )
+        self._db.execute(
+            "DELETE FROM responses WHERE created < ? OR manifest IS NOT ?",
+            (time.time() - self.ttl, self._manifest_hash),
+        )
+        self._db.commit()
+        
+        rows = self._db.execute(
+            "SELECT query, language, chunks, embedding, result, created FROM responses"
+            " ORDER BY last_used DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for query, language, chunks, embedding, result, created in reversed(rows):
+            vector = np.frombuffer(embedding, dtype=np.float32) if embedding else None
+            self._insert(_Entry(query, language, chunks, vector, _result_from_json(result), created))
+        print(f"Loaded {len(rows)} cached responses from {db_path}")
+    
+    def _insert(self, entry: _Entry):
+        """Add an entry in memory as the most recently used one."""
+        key = (entry.query, entry.language)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._by_chunks.setdefault((entry.chunks, entry.language), []).append(key)
+    
+    def _remove(self, key: Tuple[str, str]):
+        """Remove an entry from memory."""
+        entry = self._entries.pop(key)
+        siblings = self._by_chunks[(entry.chunks, entry.language)]
+        siblings.remove(key)
+        if not siblings:
+            del self._by_chunks[(entry.chunks, entry.language)]
+    
+    def _delete(self, keys: List[Tuple[str, str]]):
+        """Remove entries from memory and the database."""
+        for key in keys:
+            self._remove(key)
+        if self._db is not None and keys:
+            self._db.executemany("DELETE FROM responses WHERE query = ? AND language = ?", keys)
+            self._db.commit()
+    
+    def _clear(self):
+        self._entries.clear()
+        self._by_chunks.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+    
+    def _expired(self, entry: _Entry) -> bool:
+        return time.time() - entry.created > self.ttl
+    
+    def _hit(self, key: Tuple[str, str], kind: str) -> Dict[str, Any]:
+        """Mark an entry as used and return a copy of its result."""
+        self._entries.move_to_end(key)
+        self.hits[kind] += 1
+        if self._db is not None:
+            self._db.execute("UPDATE responses SET last_used = ? WHERE query = ? AND language = ?",
+                             (time.time(), *key))
+            self._db.commit()
+        return dict(self._entries[key].result)
+    
+    def get_exact(self, query: str, language: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer by normalized query text.
+        
+        Args:
+            query: The user's question
+            language: Output language code
+        
+        Returns:
+            Cached result fields (response, context_documents, has_relevant_context), or None
+        """
+        key = (normalize_query(query), language)
+        with self._lock:
+            self._check_manifest()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._delete([key])
+                return None
+            return self._hit(key, "exact")
+    
+    def get_similar(self, query_embedding: List[float], documents: List[Document],
+                    language: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer to a similar query that retrieved the same chunks.
+        
+        Args:
+            query_embedding: Embedding of the user's question
+            documents: Documents retrieved for the question
+            language: Output language code
+        
+        Returns:
+            Cached result fields of the most similar query, or None
+        """
+        vector = _unit_vector(query_embedding)
+        with self._lock:
+            self._check_manifest()
+            keys = list(self._by_chunks.get((chunk_key(documents), language), []))
+            expired = [key for key in keys if self._expired(self._entries[key])]
+            self._delete(expired)
+            
+            best_key, best_similarity = None, self.similarity
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry.embedding is None:
+                    continue
+                similarity = float(np.dot(entry.embedding, vector))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+            
+            if best_key is None:
+                self.misses += 1
+                return None
+            return self._hit(best_key, "semantic")
+    
+    def put(self, query: str, language: str, documents: List[Document],
+            query_embedding: Optional[List[float]], result: Dict[str, Any]):
+        """
+        Store an answer.
+        
+        Args:
+            query: The user's question
+            language: Output language code
+            documents: Documents retrieved for the question
+            query_embedding: Embedding of the question, for semantic lookup
+            result: Result fields to return on a hit
+        """
+        vector = _unit_vector(query_embedding) if query_embedding is not None else None
+        entry = _Entry(normalize_query(query), language, chunk_key(documents), vector,
+                       {**result, "context_documents": list(documents)}, time.time())
+        
+        with self._lock:
+            self._check_manifest()
+            self._insert(entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry.query, entry.language, entry.chunks,
+                     vector.tobytes() if vector is not None else None,
+                     _result_to_json(entry.result), entry.created, entry.created, self._manifest_hash),
+                )
+                self._db.commit()
+            
+            # Least recently used entries go first
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._delete(list(self._entries)[:overflow])
+    
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache usage.
+        
+        Returns:
+            Dictionary with the number of entries, hits by lookup type and misses
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.hits["exact"],
+                "semantic_hits": self.hits["semantic"],
+                "misses": self.misses,
+                "persistent": self._db is not None,
+            }
+
+
+def _unit_vector(embedding: List[float]) -> np.ndarray:
+    """Convert an embedding to a unit-length float32 vector, for cosine similarity by dot product."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _result_to_json(result: Dict[str, Any]) -> str:
+    """Serialize result fields, including the context documents."""
+    data = dict(result)
+    data["context_documents"] = [
+        {"page_content": doc.page_content, "metadata": doc.metadata} for doc in result["context_documents"]
+    ]
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _result_from_json(text: str) -> Dict[str, Any]:
+    """Deserialize result fields written by _result_to_json."""
+    data = json.loads(text)
+    data["context_documents"] = [Document(**doc) for doc in data["context_documents"]]
+    return data
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Return the process-wide response cache, persisted if configured.
+    
+    Returns:
+        Shared ResponseCache instance
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(db_path=config.RESPONSE_CACHE_PATH if config.RESPONSE_CACHE_PERSIST else None)
+    return _cache
@@ -1,11 +1,16 @@
 """
 Retriever module to fetch relevant documents from the vector store.
 """
-from typing import List, Dict, Any
+import os
+import time
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
+import faiss
+import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import FAISS
 
+from src.tokenization import count_tokens as default_count_tokens, truncate_to_tokens
 import config
 
 
@@ -23,13 +28,16 @@ class DocumentRetriever:
         """
         self.vectorstore = vectorstore
     
-    def retrieve(self, query: str, top_k: int = None) -> List[Document]:
+    def retrieve(self, query: str, top_k: int = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Document]:
         """
         Retrieve relevant documents for a query.
         
         Args:
             query: The user's query string
             top_k: Number of documents to retrieve (default: from config)
+            query_embedding: Embedding of the query from embed_query, so it is
+                not embedded a second time
             
         Returns:
             List of relevant Document objects
@@ -38,28 +46,167 @@ class DocumentRetriever:
             top_k = config.TOP_K_RESULTS
         
         # Get similar documents from the vector store
-        docs = self.vectorstore.similarity_search(query, k=top_k)
+        if query_embedding is not None:
+            docs = self.vectorstore.similarity_search_by_vector(query_embedding, k=top_k)
+        else:
+            docs = self.vectorstore.similarity_search(query, k=top_k)
         
         return docs
     
-    def format_context(self, documents: List[Document]) -> str:
+    def retrieve_with_scores(self, query: str, top_k: int = None) -> Dict[str, Any]:
+        """
+        Retrieve relevant documents with their scores, timing each stage.
+        
+        Args:
+            query: The user's query string
+            top_k: Number of documents to retrieve (default: from config)
+            
+        Returns:
+            Dictionary with (Document, score) pairs best match first under
+            "results", the index metric ("l2" distance, lower is closer, or
+            "inner_product", higher is closer), and the embedding and search
+            times in ms
+        """
+        if top_k is None:
+            top_k = config.TOP_K_RESULTS
+        
+        start = time.perf_counter()
+        query_embedding = self.embed_query(query)
+        embedded = time.perf_counter()
+        results = self.vectorstore.similarity_search_with_score_by_vector(query_embedding, k=top_k)
+        searched = time.perf_counter()
+        
+        metric = "inner_product" if self.vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+        return {
+            "results": [(doc, float(score)) for doc, score in results],
+            "metric": metric,
+            "embed_ms": (embedded - start) * 1000,
+            "search_ms": (searched - embedded) * 1000,
+        }
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the vector store's embedding model.
+        
+        Args:
+            query: The user's query string
+            
+        Returns:
+            Query embedding
+        """
+        return self.vectorstore.embeddings.embed_query(query)
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed several queries in batched forward passes.
+        
+        The sentence-transformer embeds a query exactly like a document, so
+        the rows equal what embed_query returns for each query.
+        
+        Args:
+            queries: The users' query strings
+            
+        Returns:
+            float32 matrix with one embedding per query
+        """
+        return np.asarray(self.vectorstore.embeddings.embed_documents(queries), dtype=np.float32)
+    
+    def retrieve_batch(self, query_embeddings: np.ndarray, top_k: int = None) -> List[List[Document]]:
+        """
+        Retrieve relevant documents for several queries with one index search.
+        
+        Args:
+            query_embeddings: Matrix with one query embedding per row, from embed_queries
+            top_k: Number of documents to retrieve per query (default: from config)
+            
+        Returns:
+            List of relevant Document objects for each query, in the order of the rows
+        
+        Raises:
+            ValueError: If an indexed vector has no document, like similarity_search_by_vector
+        """
+        if top_k is None:
+            top_k = config.TOP_K_RESULTS
+        
+        # Copied, since normalization works in place. LangChain keeps its
+        # normalize_L2 setting only in this attribute; the stores built by
+        # src.indexing do not normalize
+        vectors = np.array(query_embeddings, dtype=np.float32)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(vectors)
+        _, indices = self.vectorstore.index.search(vectors, top_k)
+        
+        return [[self._document(i) for i in row if i != -1] for row in indices]
+    
+    def _document(self, position: int) -> Document:
+        """Look up the document of an index position."""
+        doc_id = self.vectorstore.index_to_docstore_id[position]
+        doc = self.vectorstore.docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+        return doc
+    
+    def format_context(self, documents: List[Document], max_tokens: Optional[int] = None,
+                       count_tokens: Optional[Callable[[str], int]] = None) -> str:
         """
         Format retrieved documents into a context string.
         
+        With a token budget, documents are packed in rank order: each one that
+        fits is added whole, one that does not is cut at the last sentence that
+        fits, and the assembled context is checked against the budget.
+        
         Args:
-            documents: List of Document objects
+            documents: List of Document objects, best match first
+            max_tokens: Token budget for the context (default: unlimited)
+            count_tokens: Token counting function, ideally the model's tokenizer
             
         Returns:
             Formatted context string
         """
-        context_parts = []
+        if max_tokens is None:
+            return self._join_context([
+                (self._format_header(i, doc), doc.page_content) for i, doc in enumerate(documents)
+            ])
+        
+        count_tokens = count_tokens or default_count_tokens
+        context_parts: List[Tuple[str, str]] = []
+        remaining = max_tokens
+            
+        for doc in documents:
+            header = self._format_header(len(context_parts), doc)
+            text = doc.page_content
+            # Header, text and the newlines between parts
+            overhead = count_tokens(header) + 2
+            text_tokens = doc.metadata.get("num_tokens")
+            if text_tokens is None:
+                text_tokens = count_tokens(text)
         
-        for i, doc in enumerate(documents):
-            # Extract source information
-            source = doc.metadata.get("source", "Unknown")
+            if overhead + text_tokens > remaining:
+                text = truncate_to_tokens(text, remaining - overhead, count_tokens)
+                if not text:
+                    continue
+                text_tokens = count_tokens(text)
             
-            # Format the document content with source information
-            formatted_doc = f"Document {i+1} (Source: {source}):\n{doc.page_content}\n"
-            context_parts.append(formatted_doc)
+            context_parts.append((header, text))
+            remaining -= overhead + text_tokens
         
-        return "\n".join(context_parts)
\ No newline at end of file
+        # Separately counted parts can differ by a token from the joined text
+        context = self._join_context(context_parts)
+        while context_parts and count_tokens(context) > max_tokens:
+            header, text = context_parts.pop()
+            overflow = count_tokens(context) - max_tokens
+            text = truncate_to_tokens(text, count_tokens(text) - overflow, count_tokens)
+            if text:
+                context_parts.append((header, text))
+            context = self._join_context(context_parts)
+        
+        return context
+    
+    def _format_header(self, index: int, doc: Document) -> str:
+        """Short source header of a context document, e.g. "[1] profil.txt"."""
+        source = os.path.basename(str(doc.metadata.get("source", "Unknown")))
+        return f"[{index + 1}] {source}"
+    
+    def _join_context(self, context_parts: List[Tuple[str, str]]) -> str:
+        """Join (header, text) pairs into the context string."""
+        return "\n".join(f"{header}\n{text}\n" for header, text in context_parts)
@@ -0,0 +1,137 @@
+"""
+Tokenization module to count prompt tokens the way the Llama model does.
+"""
+import re
+import threading
+from typing import Any, Callable, List
+
+from langchain.schema import Document
+
+import config
+
+
+# Rough characters per Llama token, used only when no tokenizer can be loaded
+_CHARS_PER_TOKEN = 3
+
+# Positions after which a chunk can be cut: sentence ends and line breaks
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+_tokenizer: Any = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer() -> Any:
+    """
+    Load the tokenizer from the local Hugging Face cache, or download it.
+    
+    from_pretrained retries every file it looks for, which stalls an offline
+    host for most of a minute, so the cache is tried first and a missing
+    tokenizer is fetched with a single snapshot_download, which fails at once
+    without a connection.
+    """
+    from transformers import AutoTokenizer
+    
+    try:
+        return AutoTokenizer.from_pretrained(config.TOKENIZER_ID, local_files_only=True)
+    except OSError:
+        pass
+    
+    from huggingface_hub import snapshot_download
+    print(f"Downloading tokenizer {config.TOKENIZER_ID}...")
+    path = snapshot_download(config.TOKENIZER_ID, allow_patterns=["*.json", "*.model"])
+    return AutoTokenizer.from_pretrained(path)
+
+
+def get_tokenizer() -> Any:
+    """
+    Return the process-wide Hugging Face tokenizer, loading it on first call.
+    
+    The tokenizer shares the SentencePiece vocabulary of the GGUF model, so
+    token counts can be computed at index time without loading the LLM. It
+    should be downloaded together with the model; without it, token counts
+    are estimated from the text length.
+    
+    Returns:
+        Tokenizer, or None if it could not be loaded
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                try:
+                    _tokenizer = _load_tokenizer()
+                except Exception as e:
+                    print(f"Could not load tokenizer {config.TOKENIZER_ID} ({e}), estimating token counts")
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text, without special tokens.
+    
+    Args:
+        text: Text to count
+    
+    Returns:
+        Number of tokens
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def annotate_token_counts(chunks: List[Document]) -> List[Document]:
+    """
+    Store each chunk's token count in its num_tokens metadata.
+    
+    Nothing is stored when the tokenizer is unavailable; prompt assembly then
+    counts the retrieved chunks with the model's own tokenizer.
+    
+    Args:
+        chunks: List of chunked Document objects, updated in place
+    
+    Returns:
+        The same chunks
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None or not chunks:
+        return chunks
+    
+    encoded = tokenizer([chunk.page_content for chunk in chunks], add_special_tokens=False)
+    for chunk, input_ids in zip(chunks, encoded["input_ids"]):
+        chunk.metadata["num_tokens"] = len(input_ids)
+    return chunks
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count: Callable[[str], int] = count_tokens) -> str:
+    """
+    Cut a text at the last sentence boundary that fits a token budget.
+    
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+        count: Token counting function
+    
+    Returns:
+        The longest run of whole sentences that fits, possibly empty
+    """
+    if max_tokens <= 0:
+        return ""
+    if count(text) <= max_tokens:
+        return text
+    
+    ends = [match.end() for match in _SENTENCE_END.finditer(text)]
+    best = ""
+    low, high = 0, len(ends) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = text[:ends[middle]].rstrip()
+        if count(candidate) <= max_tokens:
+            best = candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
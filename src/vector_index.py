@@ -0,0 +1,133 @@
+"""
+Vector index module to build the configured type of FAISS index.
+"""
+import math
+from typing import Optional
+
+import faiss
+import numpy as np
+
+import config
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS wants roughly this many training points per IVF centroid / PQ code
+MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_nlist(num_vectors: int) -> int:
+    """
+    Pick the number of IVF lists for a corpus size.
+    
+    Args:
+        num_vectors: Number of vectors that will be indexed
+        
+    Returns:
+        Configured FAISS_IVF_NLIST, or about 4 * sqrt(n) capped by the training set size
+    """
+    if config.FAISS_IVF_NLIST:
+        return config.FAISS_IVF_NLIST
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: Optional[str] = None) -> faiss.Index:
+    """
+    Create an empty FAISS index of the configured type, trained on the vectors.
+    
+    Args:
+        vectors: float32 array of shape (n, dim) used for training
+        index_type: One of INDEX_TYPES (default: from config)
+        
+    Returns:
+        Trained FAISS index with no vectors added yet
+    """
+    index_type = index_type or config.FAISS_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}, expected one of {INDEX_TYPES}")
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.FAISS_HNSW_M)
+        index.hnsw.efConstruction = config.FAISS_HNSW_EF_CONSTRUCTION
+        apply_search_params(index)
+        return index
+    
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = choose_nlist(num_vectors)
+        enough_for_pq = index_type != "ivf_pq" or num_vectors >= 2 ** config.FAISS_PQ_NBITS
+        if nlist > 1 and enough_for_pq:
+            quantizer = faiss.IndexFlatL2(dim)
+            if index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+            else:
+                index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.FAISS_PQ_M, config.FAISS_PQ_NBITS)
+            
+            print(f"Training {index_type} index with {nlist} lists on {num_vectors} vectors...")
+            index.train(vectors)
+            apply_search_params(index)
+            return index
+        
+        print(f"Warning: {num_vectors} vectors are too few to train a {index_type} index, "
+              f"using a flat index instead")
+    
+    return faiss.IndexFlatL2(dim)
+
+
+def apply_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None):
+    """
+    Set the query-time accuracy/speed knobs of an index.
+    
+    Args:
+        index: FAISS index, searched with these parameters afterwards
+        nprobe: IVF lists to visit per query (default: from config)
+        ef_search: HNSW candidate list size per query (default: from config)
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe or config.FAISS_NPROBE
+    
+    downcast = faiss.downcast_index(index)
+    if isinstance(downcast, faiss.IndexHNSW):
+        downcast.hnsw.efSearch = ef_search or config.FAISS_EF_SEARCH
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """
+    Whether vectors can be deleted from the index in place.
+    
+    LangChain's FAISS.delete expects remove_ids to shift the remaining
+    positions down, which only flat indexes do. IVF indexes keep their
+    original labels and HNSW cannot remove at all.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def mmap_flags(index_path: str) -> int:
+    """
+    faiss.read_index flags that memory-map a saved index read-only.
+    
+    IO_FLAG_MMAP only maps the inverted lists of IVF indexes; the vectors of
+    flat and HNSW indexes are flat codes, which IO_FLAG_MMAP_IFC maps. The
+    two flags cannot be combined for IVF indexes, so the type is read from
+    the fourcc that starts the file ("Iw.." for IVF indexes).
+    
+    Args:
+        index_path: Path to a file written by faiss.write_index
+        
+    Returns:
+        Flags for faiss.read_index
+    """
+    with open(index_path, "rb") as f:
+        fourcc = f.read(4)
+    mmap_flag = faiss.IO_FLAG_MMAP if fourcc.startswith(b"Iw") else faiss.IO_FLAG_MMAP_IFC
+    return mmap_flag | faiss.IO_FLAG_READ_ONLY
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the index in bytes, measured by serializing it."""
+    return int(faiss.serialize_index(index).nbytes)
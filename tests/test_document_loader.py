@@ -0,0 +1,69 @@
+"""
+Tests for the streaming JSON catalogue loader.
+"""
+import io
+import json
+
+import pytest
+
+from src.document_loader import iter_json_array, iter_source_documents, load_source_documents
+
+
+SAMPLE = [
+    {"Judul": "Buku [1], edisi \"baru\"", "Tahun": 2023},
+    12345678901234567890,
+    -1.5e-3,
+    "],[",
+    [],
+    {"nested": {"list": [1, 2, {"x": "}"}]}},
+    None,
+    True,
+]
+
+
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_matches_json_loads(buffer_size, indent):
+    text = json.dumps(SAMPLE, indent=indent, ensure_ascii=False)
+    assert list(iter_json_array(io.StringIO(text), buffer_size=buffer_size)) == SAMPLE
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n]\n"])
+def test_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text), buffer_size=2)) == []
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": 1}',
+    "[1, 2",
+    "[1 2]",
+    '[1, {"a": }]',
+    "[1,, 2]",
+    '[{"a": 1}, {"b": 2',
+    "",
+])
+def test_malformed_raises(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), buffer_size=4))
+
+
+def test_malformed_catalogue_raises_after_partial_documents(tmp_path):
+    path = tmp_path / "buku.json"
+    path.write_text('[{"Judul": "A"}, {"Judul": "B"}, {"Judul": ', encoding="utf-8")
+    
+    documents = iter_source_documents(str(path))
+    assert "Judul: A" in next(documents).page_content
+    with pytest.raises(ValueError):
+        list(documents)
+    with pytest.raises(ValueError):
+        load_source_documents(str(path))
+
+
+def test_catalogue_documents(tmp_path):
+    path = tmp_path / "buku.json"
+    path.write_text(json.dumps([{"Judul": "A", "Tahun": "2020"}, "skipped", {"Judul": "B"}]),
+                    encoding="utf-8")
+    
+    documents = load_source_documents(str(path))
+    assert [doc.metadata["title"] for doc in documents] == ["A", "B"]
+    assert [doc.metadata["index"] for doc in documents] == [0, 2]
@@ -0,0 +1,68 @@
+"""
+Tests for the on-disk embedding cache.
+"""
+import os
+
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+
+
+def _cache(tmp_path) -> EmbeddingCache:
+    return EmbeddingCache(cache_dir=str(tmp_path), model_name="test/model")
+
+
+def test_put_and_reload(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a", "b"], [[1.0, 1.0], [2.0, 2.0]])
+    
+    reloaded = _cache(tmp_path)
+    assert len(reloaded) == 2
+    assert reloaded.get_many(["a", "b", "c"]) == {"a": [1.0, 1.0], "b": [2.0, 2.0]}
+
+
+def test_orphan_vector_after_crash_is_dropped(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a"], [[1.0, 1.0]])
+    
+    # Crash after the vector append of put_many, before its key append
+    with open(os.path.join(cache.path, EmbeddingCache.VECTORS_FILE), "ab") as f:
+        np.asarray([[9.0, 9.0]], dtype=np.float32).tofile(f)
+    
+    cache = _cache(tmp_path)
+    assert len(cache) == 1
+    cache.put_many(["b"], [[2.0, 2.0]])
+    
+    reloaded = _cache(tmp_path)
+    assert reloaded.get_many(["a", "b"]) == {"a": [1.0, 1.0], "b": [2.0, 2.0]}
+    assert reloaded.all_vectors().shape == (2, 2)
+
+
+def test_partial_row_and_key_are_dropped(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a"], [[1.0, 1.0]])
+    
+    # Crash in the middle of both appends
+    with open(os.path.join(cache.path, EmbeddingCache.VECTORS_FILE), "ab") as f:
+        f.write(b"\x00\x00")
+    with open(os.path.join(cache.path, EmbeddingCache.KEYS_FILE), "a", encoding="utf-8") as f:
+        f.write("bro")
+    
+    cache = _cache(tmp_path)
+    assert len(cache) == 1
+    cache.put_many(["b"], [[2.0, 2.0]])
+    
+    reloaded = _cache(tmp_path)
+    assert reloaded.get_many(["a", "b"]) == {"a": [1.0, 1.0], "b": [2.0, 2.0]}
+
+
+def test_meta_without_data_files(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a"], [[1.0, 1.0]])
+    os.remove(os.path.join(cache.path, EmbeddingCache.VECTORS_FILE))
+    os.remove(os.path.join(cache.path, EmbeddingCache.KEYS_FILE))
+    
+    cache = _cache(tmp_path)
+    assert len(cache) == 0
+    cache.put_many(["b"], [[2.0, 2.0]])
+    assert _cache(tmp_path).get_many(["b"]) == {"b": [2.0, 2.0]}
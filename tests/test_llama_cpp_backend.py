@@ -0,0 +1,131 @@
+"""
+Tests for speculative decoding in the llama.cpp backend, with a fake llama_cpp.Llama.
+"""
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import config
+from src.llama_cpp_backend import LlamaCppModel, sample_token
+
+
+VOCAB = 40
+EOS = 2
+MAX_TOKENS = 60
+
+
+def _logits(tokens) -> np.ndarray:
+    """Logits after a sequence: depend on its last two tokens, end of text after MAX_TOKENS."""
+    seed = int(tokens[-1]) * VOCAB + (int(tokens[-2]) if len(tokens) > 1 else 0)
+    logits = np.random.default_rng(seed).normal(size=VOCAB).astype(np.float32)
+    # Close runners-up, so the repetition penalty changes which token wins
+    logits[np.argsort(-logits)[:3]] = [2.0, 1.9, 1.8]
+    logits[EOS] = 10.0 if len(tokens) >= MAX_TOKENS else -10.0
+    return logits
+
+
+class FakeLlama:
+    """The parts of llama_cpp.Llama the backend uses."""
+    
+    def __init__(self, model_path=None, n_ctx=512, logits_all=False, **kwargs):
+        self._n_ctx = n_ctx
+        self.logits_all = logits_all
+        self.n_tokens = 0
+        self.input_ids = np.zeros(n_ctx, dtype=np.intc)
+        self.scores = np.zeros((n_ctx, VOCAB), dtype=np.float32)
+        self.evaluated = 0
+    
+    def n_ctx(self):
+        return self._n_ctx
+    
+    def token_eos(self):
+        return EOS
+    
+    def eval(self, tokens):
+        start = self.n_tokens
+        self.input_ids[start:start + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+        # Like llama.cpp, only the last row has logits unless logits_all is set
+        rows = range(start, self.n_tokens) if self.logits_all else [self.n_tokens - 1]
+        for row in rows:
+            self.scores[row] = _logits(self.input_ids[:row + 1])
+
+
+@pytest.fixture(autouse=True)
+def fake_llama_cpp(monkeypatch):
+    monkeypatch.setitem(sys.modules, "llama_cpp", types.SimpleNamespace(Llama=FakeLlama))
+    monkeypatch.setattr(config, "MAX_INPUT_TOKENS", 512)
+
+
+class RandomDrafts:
+    """Draft source proposing random tokens, which are mostly rejected."""
+    
+    def __init__(self):
+        self.rng = np.random.default_rng(0)
+    
+    def __call__(self, input_ids):
+        return self.rng.integers(3, VOCAB, size=4).astype(np.intc)
+
+
+class ReplayDrafts:
+    """Draft source proposing a known continuation, so most drafts are accepted."""
+    
+    def __init__(self, prompt, output):
+        self.sequence = list(prompt) + list(output)
+    
+    def __call__(self, input_ids):
+        n = len(input_ids)
+        if list(input_ids) != self.sequence[:n]:
+            return np.array([], dtype=np.intc)
+        return np.array(self.sequence[n:n + 5], dtype=np.intc)
+
+
+PROMPT = [1, 5, 9, 11, 7]
+
+
+def _generate(draft_model=None, repetition_penalty=1.3):
+    model = LlamaCppModel("model.gguf", threads=1, draft_model=draft_model)
+    tokens = list(model.generate(PROMPT, temperature=0.0, top_p=0.95, top_k=40,
+                                 repetition_penalty=repetition_penalty))
+    return model, tokens
+
+
+@pytest.mark.parametrize("repetition_penalty", [1.0, 1.3])
+def test_greedy_output_is_the_same_with_drafts(repetition_penalty):
+    _, expected = _generate(repetition_penalty=repetition_penalty)
+    assert len(expected) == MAX_TOKENS - len(PROMPT)
+    
+    model, tokens = _generate(RandomDrafts(), repetition_penalty)
+    assert tokens == expected
+    assert model.stats.proposed > 0
+    
+    model, tokens = _generate(ReplayDrafts(PROMPT, expected), repetition_penalty)
+    assert tokens == expected
+    assert model.stats.acceptance_rate > 0.9
+    assert model.stats.tokens_per_pass > 2
+
+
+def test_repetition_penalty_changes_greedy_output():
+    assert _generate(repetition_penalty=1.0)[1] != _generate(repetition_penalty=1.3)[1]
+
+
+def test_rejected_drafts_are_dropped_from_the_context():
+    model, tokens = _generate(RandomDrafts())
+    llama = model.llama
+    assert list(llama.input_ids[:llama.n_tokens]) == PROMPT + tokens
+
+
+def test_sample_token_keeps_top_k_and_top_p():
+    logits = np.array([0.0, 5.0, 4.9, 1.0, -3.0], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    seen = {sample_token(logits, [], rng, 1.0, 1.0, 2, 1.0) for _ in range(200)}
+    assert seen == {1, 2}
+    
+    seen = {sample_token(logits, [], rng, 1.0, 0.4, 0, 1.0) for _ in range(200)}
+    assert seen == {1}
+    
+    # Penalizing the best token makes the runner-up the greedy choice
+    assert sample_token(logits, [1], rng, 0.0, 1.0, 0, 1.2) == 2
@@ -0,0 +1,43 @@
+"""
+Tests for cleaning streamed responses the same way as full ones.
+"""
+import random
+
+import pytest
+
+from src.llm import UNWANTED_PATTERNS, LlamaInterface, ResponseStreamCleaner
+
+
+def _clean(text: str) -> str:
+    # _clean_response does not use the model, so no model is loaded
+    return LlamaInterface.__new__(LlamaInterface)._clean_response(text)
+
+
+def _stream(pieces) -> str:
+    cleaner = ResponseStreamCleaner()
+    return "".join(cleaner.feed(piece) for piece in pieces) + cleaner.finish()
+
+
+@pytest.mark.parametrize("pieces, expected", [
+    (["Jawaban:UsUs<|im_e", "nd|>er:"], "Us"),
+    (["Perpustakaan  buka", "\n pukul 08.00</", "s>"], "Perpustakaan buka pukul 08.00"),
+    (["A<|im_start|>ssi", "stant:B"], "B"),
+    (["Use", "r: halo"], "halo"),
+])
+def test_stream_examples(pieces, expected):
+    assert _clean("".join(pieces)) == expected
+    assert _stream(pieces) == expected
+
+
+def test_stream_matches_full_cleaning_on_random_splits():
+    fragments = [" ", "  ", "\n", "a", "Us", "er:", "x y"]
+    for pattern in UNWANTED_PATTERNS:
+        for cut in range(len(pattern) + 1):
+            fragments += [pattern[:cut], pattern[cut:]]
+    
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = "".join(rng.choice(fragments) for _ in range(rng.randint(1, 8)))
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 4))))
+        pieces = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        assert _stream(pieces) == _clean(text), (text, pieces)
@@ -0,0 +1,193 @@
+"""
+Tests for the model pool scheduler and the API's busy responses, with stub replicas.
+"""
+import threading
+import time
+
+import pytest
+
+import config
+import src.model_pool as model_pool
+from src.model_pool import DeadlineExceeded, ModelPool, ModelPoolBusy
+
+
+class StubReplica:
+    """Replica that answers immediately without a model."""
+    
+    def __init__(self, threads=None):
+        self.threads = threads
+    
+    def generate_response(self, prompt, has_context=True, options=None):
+        return f"answer to {prompt}"
+    
+    def stream_response(self, prompt, has_context=True, options=None):
+        yield from ["answer ", "to ", prompt]
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    monkeypatch.setattr(model_pool, "LlamaInterface", StubReplica)
+    monkeypatch.setattr(config, "SCHEDULER_LANE_WEIGHTS", {"short": 3, "long": 1})
+    monkeypatch.setattr(config, "REQUEST_DEADLINE", {"short": 30, "long": 90})
+    
+    def make(replicas=1, max_queue=8):
+        return ModelPool(replicas=replicas, threads=1, max_queue=max_queue)
+    return make
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.005)
+
+
+def _start_waiters(pool, lanes, order):
+    """Queue one request per lane, in order, and record the order they get the replica."""
+    threads = []
+    for lane in lanes:
+        def wait(lane=lane):
+            with pool.acquire(lane):
+                order.append(lane)
+        
+        depth = pool.queue_depth
+        thread = threading.Thread(target=wait)
+        thread.start()
+        _wait_for(lambda: pool.queue_depth == depth + 1)
+        threads.append(thread)
+    return threads
+
+
+def test_generation_uses_a_replica(make_pool):
+    pool = make_pool(replicas=2)
+    assert pool.generate_response("q") == "answer to q"
+    assert "".join(pool.stream_response("q")) == "answer to q"
+    stats = pool.stats()
+    assert stats["busy_replicas"] == 0
+    assert stats["lanes"]["short"]["served"] == 2
+
+
+def test_lanes_are_served_in_weighted_round_robin(make_pool):
+    pool = make_pool()
+    order = []
+    # Holding the replica from the last lane of the rotation starts the next cycle
+    with pool.acquire("long"):
+        threads = _start_waiters(pool, ["long"] * 4 + ["short"] * 4, order)
+    for thread in threads:
+        thread.join(5)
+    
+    assert order == ["short", "short", "short", "long", "short", "long", "long", "long"]
+    assert pool.stats()["lanes"]["long"]["served"] == 5
+
+
+def test_unknown_lane_uses_the_first_lane(make_pool):
+    pool = make_pool()
+    with pool.acquire("urgent"):
+        pass
+    assert pool.stats()["lanes"]["short"]["served"] == 1
+
+
+def test_full_queue_is_rejected(make_pool):
+    pool = make_pool(max_queue=2)
+    order = []
+    with pool.acquire():
+        threads = _start_waiters(pool, ["short", "short"], order)
+        
+        with pytest.raises(ModelPoolBusy) as error:
+            pool.check_admission()
+        assert not isinstance(error.value, DeadlineExceeded)
+        with pytest.raises(ModelPoolBusy):
+            with pool.acquire():
+                pass
+        assert pool.stats()["rejected"] == 2
+    for thread in threads:
+        thread.join(5)
+    
+    assert order == ["short", "short"]
+    pool.check_admission()
+
+
+def test_idle_replica_admits_with_no_queue_room(make_pool):
+    pool = make_pool(max_queue=0)
+    pool.check_admission()
+    with pool.acquire():
+        with pytest.raises(ModelPoolBusy):
+            pool.check_admission()
+
+
+def test_deadline_that_cannot_be_met_is_rejected_up_front(make_pool):
+    pool = make_pool()
+    pool._service_time = 10.0
+    with pool.acquire():
+        with pytest.raises(ModelPoolBusy) as error:
+            with pool.acquire(deadline=time.monotonic() + 1):
+                pass
+    assert not isinstance(error.value, DeadlineExceeded)
+    assert error.value.retry_after == 10
+    assert pool.queue_depth == 0
+
+
+def test_deadline_expires_while_queued(make_pool):
+    pool = make_pool()
+    errors = []
+    
+    def wait():
+        try:
+            with pool.acquire(deadline=time.monotonic() + 0.2):
+                pass
+        except ModelPoolBusy as e:
+            errors.append(e)
+    
+    with pool.acquire():
+        thread = threading.Thread(target=wait)
+        thread.start()
+        thread.join(5)
+    
+    assert len(errors) == 1 and isinstance(errors[0], DeadlineExceeded)
+    stats = pool.stats()
+    assert stats["expired"] == 1 and stats["queue_depth"] == 0
+    with pool.acquire():
+        pass
+
+
+class StubStages:
+    """RagStages whose generation stage fails with a given error."""
+    
+    def __init__(self, error):
+        self.error = error
+    
+    async def retrieve(self, query, options=None, session_id=None):
+        return {"query": query}
+    
+    async def generate(self, prepared, deadline=None):
+        raise self.error
+
+
+@pytest.fixture
+def api(monkeypatch):
+    from fastapi.testclient import TestClient
+    import backend.main as main
+    
+    # Without entering the client, startup does not load the real chatbot
+    return main, TestClient(main.app)
+
+
+def test_chat_returns_503_while_starting(api, monkeypatch):
+    main, client = api
+    monkeypatch.setattr(main, "chatbot", None)
+    response = client.post("/chat", json={"query": "halo"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (ModelPoolBusy("Request queue is full", retry_after=7), 429),
+    (DeadlineExceeded("Deadline passed", retry_after=3), 503),
+])
+def test_chat_busy_status(api, monkeypatch, error, status_code):
+    main, client = api
+    monkeypatch.setattr(main, "chatbot", object())
+    monkeypatch.setattr(main, "stages", StubStages(error))
+    response = client.post("/chat", json={"query": "halo"})
+    assert response.status_code == status_code
+    assert response.headers["Retry-After"] == str(error.retry_after)
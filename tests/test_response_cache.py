@@ -0,0 +1,133 @@
+"""
+Tests for the response cache: lookup, expiry, eviction and invalidation by the index manifest.
+"""
+import types
+
+import pytest
+from langchain.schema import Document
+
+import src.response_cache as response_cache
+from src.response_cache import ResponseCache
+
+
+DOCS = [Document(page_content="Perpustakaan buka pukul 08.00", metadata={"source": "info.txt"})]
+OTHER_DOCS = [Document(page_content="Peminjaman buku maksimal 5", metadata={"source": "sop.txt"})]
+RESULT = {"response": "Jam 08.00", "has_relevant_context": True}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text('{"version": 1}', encoding="utf-8")
+    return path
+
+
+def _cache(manifest, **kwargs) -> ResponseCache:
+    kwargs.setdefault("ttl", 60)
+    kwargs.setdefault("similarity", 0.9)
+    kwargs.setdefault("max_entries", 10)
+    return ResponseCache(manifest_path=str(manifest), **kwargs)
+
+
+def test_exact_hit_ignores_case_and_punctuation(clock, manifest):
+    cache = _cache(manifest)
+    cache.put("Kapan perpustakaan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    hit = cache.get_exact("  kapan PERPUSTAKAAN buka ", "bahasa_indonesia")
+    assert hit["response"] == "Jam 08.00"
+    assert hit["context_documents"][0].page_content == DOCS[0].page_content
+    assert cache.get_exact("Kapan perpustakaan buka?", "english") is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_semantic_hit_needs_similar_query_and_same_chunks(clock, manifest):
+    cache = _cache(manifest)
+    cache.put("Kapan perpustakaan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    assert cache.get_similar([0.99, 0.1], DOCS, "bahasa_indonesia")["response"] == "Jam 08.00"
+    assert cache.get_similar([0.5, 0.5], DOCS, "bahasa_indonesia") is None
+    assert cache.get_similar([0.99, 0.1], OTHER_DOCS, "bahasa_indonesia") is None
+    assert cache.get_similar([0.99, 0.1], DOCS, "english") is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1 and stats["misses"] == 3
+
+
+def test_entries_expire_after_ttl(clock, manifest):
+    cache = _cache(manifest, ttl=60)
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    clock.now += 59
+    assert cache.get_exact("Kapan buka?", "bahasa_indonesia") is not None
+    clock.now += 2
+    assert cache.get_similar([1.0, 0.0], DOCS, "bahasa_indonesia") is None
+    assert cache.get_exact("Kapan buka?", "bahasa_indonesia") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock, manifest):
+    cache = _cache(manifest, max_entries=2)
+    cache.put("satu", "english", DOCS, None, RESULT)
+    cache.put("dua", "english", DOCS, None, RESULT)
+    assert cache.get_exact("satu", "english") is not None
+    cache.put("tiga", "english", DOCS, None, RESULT)
+    
+    assert len(cache) == 2
+    assert cache.get_exact("dua", "english") is None
+    assert cache.get_exact("satu", "english") is not None
+
+
+def test_manifest_change_clears_the_cache(clock, manifest):
+    cache = _cache(manifest)
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    manifest.write_text('{"version": 2, "rebuilt": true}', encoding="utf-8")
+    assert cache.get_exact("Kapan buka?", "bahasa_indonesia") is None
+    assert len(cache) == 0
+
+
+def test_rewritten_identical_manifest_keeps_the_cache(clock, manifest):
+    cache = _cache(manifest)
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    manifest.write_text(manifest.read_text(encoding="utf-8") + " ", encoding="utf-8")
+    manifest.write_text('{"version": 1}', encoding="utf-8")
+    assert cache.get_exact("Kapan buka?", "bahasa_indonesia") is not None
+
+
+def test_persisted_entries_are_reloaded(clock, manifest, tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = _cache(manifest, db_path=db_path)
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    reloaded = _cache(manifest, db_path=db_path)
+    assert reloaded.get_exact("Kapan buka?", "bahasa_indonesia")["response"] == "Jam 08.00"
+    assert reloaded.get_similar([1.0, 0.05], DOCS, "bahasa_indonesia") is not None
+
+
+def test_persisted_entries_of_another_index_or_expired_are_dropped(clock, manifest, tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = _cache(manifest, db_path=db_path)
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    
+    clock.now += 61
+    assert len(_cache(manifest, db_path=db_path)) == 0
+    
+    clock.now -= 61
+    cache.put("Kapan buka?", "bahasa_indonesia", DOCS, [1.0, 0.0], RESULT)
+    manifest.write_text('{"version": 2, "rebuilt": true}', encoding="utf-8")
+    assert len(_cache(manifest, db_path=db_path)) == 0
@@ -0,0 +1,45 @@
+"""
+Tests for batch retrieval against per-query retrieval.
+"""
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from src.retriever import DocumentRetriever
+
+
+TEXTS = [f"Dokumen {i}: informasi perpustakaan nomor {i * 7 % 13}" for i in range(40)]
+QUERIES = ["jam buka perpustakaan", "cara meminjam buku", "fasilitas ruang baca", "Dokumen 3"]
+
+
+@pytest.fixture
+def retriever():
+    vectorstore = FAISS.from_texts(TEXTS, DeterministicFakeEmbedding(size=16),
+                                   metadatas=[{"source": f"doc{i}.txt"} for i in range(len(TEXTS))])
+    return DocumentRetriever(vectorstore)
+
+
+def test_batch_matches_per_query_retrieval(retriever):
+    batch = retriever.retrieve_batch(retriever.embed_queries(QUERIES), top_k=5)
+    
+    assert len(batch) == len(QUERIES)
+    for query, documents in zip(QUERIES, batch):
+        single = retriever.retrieve(query, top_k=5, query_embedding=retriever.embed_query(query))
+        assert [doc.page_content for doc in documents] == [doc.page_content for doc in single]
+        assert [doc.metadata for doc in documents] == [doc.metadata for doc in single]
+
+
+def test_batch_with_more_results_than_documents(retriever):
+    batch = retriever.retrieve_batch(retriever.embed_queries(QUERIES[:1]), top_k=len(TEXTS) + 5)
+    assert len(batch[0]) == len(TEXTS)
+
+
+def test_missing_document_raises_like_per_query_retrieval(retriever):
+    store = retriever.vectorstore
+    store.docstore.delete([store.index_to_docstore_id[0]])
+    embedding = retriever.embed_query(TEXTS[0])
+    
+    with pytest.raises(ValueError):
+        retriever.retrieve(TEXTS[0], top_k=3, query_embedding=embedding)
+    with pytest.raises(ValueError):
+        retriever.retrieve_batch(retriever.embed_queries([TEXTS[0]]), top_k=3)
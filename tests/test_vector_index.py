@@ -0,0 +1,35 @@
+"""
+Tests for reading saved FAISS indexes memory-mapped.
+"""
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from src.vector_index import INDEX_TYPES, build_faiss_index, mmap_flags
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_mmap_index_is_mapped_and_searches_the_same(tmp_path, monkeypatch, index_type):
+    import config
+    monkeypatch.setattr(config, "FAISS_IVF_NLIST", 8)
+    monkeypatch.setattr(config, "FAISS_PQ_M", 4)
+    vectors = np.random.default_rng(0).random((2000, 16), dtype=np.float32)
+    index = build_faiss_index(vectors, index_type)
+    index.add(vectors)
+    path = str(tmp_path / f"{index_type}.faiss")
+    faiss.write_index(index, path)
+    
+    flags = mmap_flags(path)
+    ivf = index_type.startswith("ivf")
+    assert flags & faiss.IO_FLAG_READ_ONLY
+    assert bool(flags & faiss.IO_FLAG_MMAP_IFC) != ivf
+    
+    mapped = faiss.read_index(path, flags)
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps", encoding="utf-8") as f:
+            assert path in f.read()
+    
+    expected = faiss.read_index(path).search(vectors[:5], 3)
+    np.testing.assert_array_equal(mapped.search(vectors[:5], 3)[1], expected[1])
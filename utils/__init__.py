@@ -3,14 +3,20 @@
 Utility functions for the Llama RAG chatbot.
 """
 
-# Import key functions from helpers to expose at package level
-from .helpers import (
-    setup_rag_pipeline,
-    time_function
-)
-
 # Define what gets imported with "from utils import *"
 __all__ = [
     'setup_rag_pipeline',
-    'time_function'
-]
\ No newline at end of file
+    'time_function',
+    'print_streamed_response'
+]
+
+
+def __getattr__(name):
+    # Expose the helpers at package level without importing the RAG stack
+    # until one of them is used
+    if name in __all__:
+        from . import helpers
+        value = getattr(helpers, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
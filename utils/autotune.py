@@ -0,0 +1,252 @@
+"""
+Autotuner for CPU deployments: measures prefill and decode speed of the locally
+available GGUF quantizations of the model at several thread counts, and writes
+the fastest configuration to the profile config.py loads on this machine.
+
+Usage:
+    python utils/autotune.py --threads 4 6 8 --min-quant Q4_0
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Tambahkan path ke root project
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+PROFILE_VERSION = 1
+
+# Quantizations from lowest to highest quality; files below --min-quant are
+# measured but never selected
+QUANT_ORDER = [
+    "Q2_K", "Q3_K_S", "Q3_K_M", "Q3_K_L", "Q4_0", "Q4_1", "Q4_K_S", "Q4_K_M",
+    "Q5_0", "Q5_1", "Q5_K_S", "Q5_K_M", "Q6_K", "Q8_0", "F16",
+]
+
+_QUANT_PATTERN = re.compile(r"\.(Q\d_[A-Z0-9_]+|Q\d_\d|F16|F32)\.gguf$", re.IGNORECASE)
+
+# Question used to build the benchmark prompt
+BENCHMARK_QUESTION = "Apa saja fasilitas yang terdapat di perpustakaan Universitas Brawijaya?"
+
+
+def quantization(path: str) -> Optional[str]:
+    """Return the quantization name in a GGUF file name, e.g. Q4_K_M."""
+    match = _QUANT_PATTERN.search(os.path.basename(path))
+    return match.group(1).upper() if match else None
+
+
+def find_model_files(extra_dirs: Optional[List[str]] = None) -> List[str]:
+    """
+    Find the downloaded quantizations of the configured model.
+    
+    Looks next to MODEL_PATH, in the Hugging Face cache snapshots of MODEL_ID
+    and in any extra directories, for files named like MODEL_FILE with a
+    different quantization.
+    
+    Args:
+        extra_dirs: Additional directories to search
+    
+    Returns:
+        Paths of the GGUF files, one per file name
+    """
+    family = _QUANT_PATTERN.sub("", config.MODEL_FILE)
+    hub_dir = os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub")
+    directories = [
+        os.path.dirname(config.MODEL_PATH),
+        os.path.join(hub_dir, config.MODEL_ID),
+        *glob.glob(os.path.join(hub_dir, "models--" + config.MODEL_ID.replace("/", "--"), "snapshots", "*")),
+        *(extra_dirs or []),
+    ]
+    
+    found: Dict[str, str] = {}
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, f"{family}.*.gguf"))):
+            if quantization(path):
+                found.setdefault(os.path.basename(path), os.path.realpath(path))
+    return sorted(found.values(), key=lambda path: QUANT_ORDER.index(quantization(path))
+                  if quantization(path) in QUANT_ORDER else len(QUANT_ORDER))
+
+
+def thread_candidates() -> List[int]:
+    """Thread counts worth measuring on this machine: powers of two, half and all cores."""
+    cores = config.CPU_CORES
+    candidates = {n for n in (1, 2, 4, 8, 16, 32) if n <= cores}
+    candidates.update({max(1, cores // 2), cores, config.THREADS})
+    return sorted(candidates)
+
+
+def build_prompt(llm) -> str:
+    """Build a RAG prompt that fills the context budget, like a real request."""
+    from src.tokenization import truncate_to_tokens
+    
+    with open(config.LIBRARY_INFO_PATH, "r", encoding="utf-8") as f:
+        text = f.read()
+    context = truncate_to_tokens(text, llm.context_budget(BENCHMARK_QUESTION), llm.count_tokens)
+    return llm.format_rag_prompt(BENCHMARK_QUESTION, context)
+
+
+def benchmark(path: str, threads: int, new_tokens: int, repeat: int) -> Dict:
+    """
+    Measure prefill and decode speed of one model file at one thread count.
+    
+    Args:
+        path: GGUF model file
+        threads: CPU threads
+        new_tokens: Tokens generated for the decode measurement
+        repeat: Runs, the median is reported
+    
+    Returns:
+        Dictionary with load time, prompt size and tokens per second
+    """
+    from src.llm import LlamaInterface
+    
+    start = time.perf_counter()
+    llm = LlamaInterface(model_path=path, threads=threads)
+    load_seconds = time.perf_counter() - start
+    prompt = build_prompt(llm)
+    tokens = llm.model.tokenize(prompt)
+    sampling = {
+        "temperature": config.TEMPERATURE,
+        "top_p": config.TOP_P,
+        "top_k": config.TOP_K,
+        "repetition_penalty": config.REPETITION_PENALTY,
+    }
+    
+    prefill_rates, decode_rates = [], []
+    for _ in range(repeat):
+        llm.reset_context()
+        start = time.perf_counter()
+        evaluated = llm.prefill(prompt)
+        prefill_rates.append(evaluated / (time.perf_counter() - start))
+        
+        # The prompt is already evaluated, so only generated tokens are timed
+        generated = 0
+        start = time.perf_counter()
+        for _ in llm.model.generate(tokens, **sampling):
+            generated += 1
+            if generated >= new_tokens:
+                break
+        decode_rates.append(generated / (time.perf_counter() - start))
+    
+    del llm
+    gc.collect()
+    return {
+        "model_file": os.path.basename(path),
+        "model_path": path,
+        "quantization": quantization(path),
+        "size_gb": os.path.getsize(path) / 1e9,
+        "threads": threads,
+        "load_seconds": load_seconds,
+        "prompt_tokens": len(tokens),
+        "prefill_tokens_per_second": statistics.median(prefill_rates),
+        "decode_tokens_per_second": statistics.median(decode_rates),
+    }
+
+
+def request_seconds(row: Dict) -> float:
+    """Estimated time of a full request: the benchmark prompt plus MAX_NEW_TOKENS of answer."""
+    return (row["prompt_tokens"] / row["prefill_tokens_per_second"]
+            + config.MAX_NEW_TOKENS / row["decode_tokens_per_second"])
+
+
+def write_profile(path: str, best: Dict, results: List[Dict]):
+    """Write the selected configuration and all measurements to the profile."""
+    profile = {
+        "version": PROFILE_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": config.machine_fingerprint(),
+        "model_file": best["model_file"],
+        "model_path": best["model_path"],
+        "threads": best["threads"],
+        "prefill_tokens_per_second": best["prefill_tokens_per_second"],
+        "decode_tokens_per_second": best["decode_tokens_per_second"],
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_autotune(model_files: List[str], threads: List[int], min_quant: str,
+                 new_tokens: int, repeat: int) -> Dict:
+    """
+    Measure every model file at every thread count.
+    
+    Returns:
+        Dictionary with the fastest setting at or above min_quant ("best",
+        None if there is none) and all measurements ("results")
+    """
+    # Prefill is measured over the whole prompt, so no prefix is kept evaluated
+    config.USE_PROMPT_PREFIX_CACHE = False
+    
+    allowed = set(QUANT_ORDER[QUANT_ORDER.index(min_quant):])
+    results = []
+    
+    print(f"Machine: {config.machine_fingerprint()}")
+    for path in model_files:
+        for thread_count in threads:
+            print(f"\nMeasuring {os.path.basename(path)} with {thread_count} threads...")
+            row = benchmark(path, thread_count, new_tokens, repeat)
+            row["request_seconds"] = request_seconds(row)
+            results.append(row)
+    
+    print("\nAutotune results")
+    print("=" * 50)
+    for row in sorted(results, key=lambda row: row["request_seconds"]):
+        flag = "" if row["quantization"] in allowed else f"  (below {min_quant})"
+        print(f"{row['model_file']:32s} threads={row['threads']:3d}  "
+              f"prefill={row['prefill_tokens_per_second']:7.1f} tok/s  "
+              f"decode={row['decode_tokens_per_second']:6.1f} tok/s  "
+              f"request={row['request_seconds']:6.1f}s{flag}")
+    
+    candidates = [row for row in results if row["quantization"] in allowed]
+    best = min(candidates, key=lambda row: row["request_seconds"], default=None)
+    return {"best": best, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest model quantization and thread count")
+    parser.add_argument("--models", nargs="+", help="GGUF files to measure (default: the downloaded quantizations)")
+    parser.add_argument("--model-dir", nargs="+", default=[], help="Extra directories to search for GGUF files")
+    parser.add_argument("--threads", nargs="+", type=int, help="Thread counts to measure")
+    parser.add_argument("--min-quant", default="Q4_0", choices=QUANT_ORDER,
+                        help="Lowest quantization that may be selected")
+    parser.add_argument("--new-tokens", type=int, default=32, help="Tokens generated per decode measurement")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per setting, the median is reported")
+    parser.add_argument("--profile", default=config.AUTOTUNE_PROFILE_PATH, help="Path of the profile to write")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing the profile")
+    args = parser.parse_args()
+    
+    model_files = args.models or find_model_files(args.model_dir)
+    if not model_files:
+        print(f"No GGUF files of {config.MODEL_FILE} found, download one or pass --models")
+        sys.exit(1)
+    
+    outcome = run_autotune(model_files, args.threads or thread_candidates(), args.min_quant,
+                           args.new_tokens, args.repeat)
+    best = outcome["best"]
+    if best is None:
+        print(f"\nNo measured file is at least {args.min_quant}, no profile written")
+        sys.exit(1)
+    
+    print(f"\nBest: {best['model_file']} with {best['threads']} threads "
+          f"({best['request_seconds']:.1f}s per request)")
+    if not args.dry_run:
+        write_profile(args.profile, best, outcome["results"])
+        print(f" Profile saved to: {args.profile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,37 +3,56 @@ Helper utility functions.
 """
 import os
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from src.document_loader import load_all_documents
-from src.chunking import split_documents
-from src.indexing import get_or_create_index
+from src.document_loader import get_source_paths, iter_all_documents, load_source_documents
+from src.catalogue import get_catalogue
+from src.chunking import iter_split_documents, split_documents
+from src.indexing import get_or_create_index, load_faiss_index, update_faiss_index
+from src.manifest import find_changed_sources, is_index_current, load_manifest, settings_match
+import config
 
 
-def setup_rag_pipeline() -> Tuple[bool, str, Any]:
+def setup_rag_pipeline(background_save: bool = True) -> Tuple[bool, str, Any]:
     """
     Set up the complete RAG pipeline.
     
+    Args:
+        background_save: Save an incrementally updated index in a background
+            thread, so serving starts before the write finishes. Pass False to
+            return only once the index is on disk.
+    
     Returns:
         Tuple of (success: bool, message: str, vectorstore: FAISS or None)
     """
     try:
-        # Step 1: Load documents
-        print("Loading documents...")
-        documents = load_all_documents()
+        # Fast path: the persisted index matches the sources, skip loading and chunking
+        if is_index_current(config.FAISS_INDEX_PATH, get_source_paths()):
+            print("Index manifest is current, loading vector index...")
+            vectorstore = load_faiss_index(config.FAISS_INDEX_PATH, mmap=config.FAISS_MMAP)
+            if vectorstore:
+                return _pipeline_ready(vectorstore)
         
-        if not documents:
-            return False, "No documents were loaded. Please check your data files.", None
+        # Incremental path: same settings, only some sources changed
+        if config.INCREMENTAL_INDEXING:
+            vectorstore = _update_index_incrementally(background_save)
+            if vectorstore:
+                return _pipeline_ready(vectorstore)
         
-        # Step 2: Split documents into chunks
-        print("Splitting documents into chunks...")
-        chunks = split_documents(documents)
+        # Step 1 and 2: Stream documents and split them into chunks as they are read
+        print("Loading documents and splitting them into chunks...")
+        chunks = iter_split_documents(iter_all_documents())
         
-        # Step 3: Create or load vector index
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return False, "No documents were loaded. Please check your data files.", None
+        
+        # Step 3: Create or load vector index, embedding the chunk stream in batches
         print("Creating/loading vector index...")
-        vectorstore = get_or_create_index(chunks)
+        vectorstore = get_or_create_index(chain([first_chunk], chunks))
         
-        return True, "RAG pipeline setup successfully", vectorstore
+        return _pipeline_ready(vectorstore)
     
     except Exception as e:
         error_message = f"Error setting up RAG pipeline: {str(e)}"
@@ -41,6 +60,64 @@ def setup_rag_pipeline() -> Tuple[bool, str, Any]:
         return False, error_message, None
 
 
+def _pipeline_ready(vectorstore: Any) -> Tuple[bool, str, Any]:
+    """
+    Finish ingest-time setup once the vector index is available.
+    
+    The catalogue index for shelf lookups is built or refreshed beside the
+    vector index here, so the first query does not pay for it.
+    """
+    if config.USE_CATALOGUE_LOOKUP:
+        get_catalogue()
+    return True, "RAG pipeline setup successfully", vectorstore
+
+
+def _update_index_incrementally(background_save: bool = True) -> Optional[Any]:
+    """
+    Re-index only the sources that changed since the persisted index was built.
+    
+    With FAISS_MMAP the updated index is saved before this returns and then
+    loaded again memory-mapped, so it is served from the file like an
+    unchanged index. Otherwise it is served from memory, and saved in a
+    background thread if background_save is set.
+    
+    Args:
+        background_save: Save the updated index in a background thread
+    
+    Returns:
+        Updated FAISS vector store, or None if a full rebuild is required
+    """
+    manifest = load_manifest(config.FAISS_INDEX_PATH)
+    if manifest is None or not settings_match(manifest):
+        return None
+    
+    changed, removed = find_changed_sources(manifest, get_source_paths())
+    vectorstore = load_faiss_index(config.FAISS_INDEX_PATH)
+    if vectorstore is None:
+        return None
+    
+    print(f"Updating vector index for {len(changed)} changed and {len(removed)} removed sources...")
+    documents = []
+    for path in changed:
+        documents.extend(load_source_documents(path))
+    chunks = split_documents(documents) if documents else []
+    
+    try:
+        update_faiss_index(vectorstore, chunks, changed + removed, config.FAISS_INDEX_PATH,
+                           background=background_save and not config.FAISS_MMAP)
+    except ValueError as e:
+        # e.g. approximate index types that cannot delete vectors in place
+        print(f"Incremental update not possible ({e}), rebuilding the index")
+        return None
+    
+    if config.FAISS_MMAP:
+        mapped = load_faiss_index(config.FAISS_INDEX_PATH, mmap=True)
+        if mapped:
+            return mapped
+        print("Serving the updated index from memory")
+    return vectorstore
+
+
 def time_function(func):
     """
     Decorator to measure execution time of a function.
@@ -57,4 +134,53 @@ def time_function(func):
         end_time = time.time()
         print(f"{func.__name__} executed in {end_time - start_time:.2f} seconds")
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def print_streamed_response(events: Iterator[Dict], prefix: str = "") -> Dict:
+    """
+    Print a streamed chatbot response to the console as tokens arrive.
+    
+    Args:
+        events: Events from LlamaRagChatbot.stream_query
+        prefix: Text printed before the first token
+        
+    Returns:
+        The final event, with the cleaned response and retrieval details
+    """
+    result = {}
+    print(prefix, end="", flush=True)
+    
+    for event in events:
+        if event["event"] == "token":
+            print(event["text"], end="", flush=True)
+        elif event["event"] == "end":
+            result = event
+    
+    print()
+    return result
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Measure the memory of a process.
+    
+    RSS counts shared pages in full in every process that maps them, so the
+    memory of forked workers is better summed as PSS (shared pages divided
+    among the processes sharing them) or USS (pages private to the process).
+    
+    Args:
+        pid: Process ID (default: the current process)
+        
+    Returns:
+        Dictionary with the PID and RSS, PSS and USS in MB; PSS and USS are
+        None where the OS does not report them
+    """
+    import psutil
+    
+    info = psutil.Process(pid).memory_full_info()
+    pss, uss = getattr(info, "pss", None), getattr(info, "uss", None)
+    return {
+        "pid": pid or os.getpid(),
+        "rss_mb": round(info.rss / 1e6, 1),
+        "pss_mb": round(pss / 1e6, 1) if pss is not None else None,
+        "uss_mb": round(uss / 1e6, 1) if uss is not None else None,
+    }